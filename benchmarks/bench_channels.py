@@ -0,0 +1,85 @@
+"""
+Measures per-RPC latency of opening a new channel for every call versus reusing a pooled channel.
+
+A sink server answers heartbeats and replica list pushes without doing any work, so the numbers
+are the cost of the channel: the TCP connect and HTTP/2 handshake a new channel pays on its first
+call, plus the call itself. --threads calls are made at once, as the leader's fan-out does.
+
+Usage (from the repository root):
+    python benchmarks/bench_channels.py --calls 2000 --threads 1 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent import futures
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import grpc
+import chat_pb2
+import chat_pb2_grpc
+from channel_pool import ChannelPool
+
+class SinkService(chat_pb2_grpc.ChatServiceServicer):
+    """Answers heartbeats and replica list pushes without doing anything."""
+
+    def Heartbeat(self, request, context):
+        return chat_pb2.HeartbeatResponse(success=True)
+
+    def SyncReplicaListFromLeader(self, request, context):
+        return chat_pb2.ReplicaListSyncResponse(success=True)
+
+def call_new_channel(address, method, request):
+    """One call over a channel opened and closed around it, as the servers and client did before pooling."""
+    with grpc.insecure_channel(address) as channel:
+        return getattr(chat_pb2_grpc.ChatServiceStub(channel), method)(request, timeout=5)
+
+def measure(call, address, method, request, calls, threads):
+    """Makes calls calls from threads threads and returns the latency of each call in ms."""
+    def timed(_):
+        start = time.perf_counter()
+        call(address, method, request)
+        return (time.perf_counter() - start) * 1000
+
+    with futures.ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(timed, range(calls)))
+
+def percentile(latencies, fraction):
+    """Returns the latency below which fraction of the calls finished."""
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-call channels against pooled channels.")
+    parser.add_argument("--calls", type=int, default=2000, help="Calls per configuration")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Concurrent callers")
+    args = parser.parse_args()
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(SinkService(), server)
+    address = f"127.0.0.1:{server.add_insecure_port('127.0.0.1:0')}"
+    server.start()
+
+    pool = ChannelPool()
+    pooled = lambda address, method, request: pool.call(address, method, request, timeout=5)
+    payloads = [
+        ("Heartbeat", chat_pb2.HeartbeatRequest(server_id="bench")),
+        ("SyncReplicaListFromLeader", chat_pb2.ReplicaListSyncRequest(replica_list=[f"127.0.0.1:{50051 + i}" for i in range(5)])),
+    ]
+
+    print(f"{'rpc':<28}{'threads':>8}{'channel':>10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'calls/s':>10}")
+    for method, request in payloads:
+        for threads in args.threads:
+            for name, call in (("new", call_new_channel), ("pooled", pooled)):
+                call(address, method, request)  # Warm up outside the measurement
+                start = time.perf_counter()
+                latencies = measure(call, address, method, request, args.calls, threads)
+                elapsed = time.perf_counter() - start
+                print(f"{method:<28}{threads:>8}{name:>10}{statistics.mean(latencies):>10.3f}{percentile(latencies, 0.5):>10.3f}"
+                      f"{percentile(latencies, 0.99):>10.3f}{args.calls / elapsed:>10.0f}")
+
+    pool.close()
+    server.stop(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Measures bytes on the wire and CPU time of the compressed RPC classes for each compression setting:
+ApplyOperations batches and InstallSnapshot chunks (replication, leader -> replica) and
+GetMessagesByMid and Bootstrap responses (bulk, server -> client).
+
+Stubs talk to a sink server through a TCP proxy that counts every byte, so the numbers include
+gRPC and HTTP/2 framing. Wire bytes are counted in the direction the payload travels. CPU time
+covers both ends (same process).
+
+Usage (from the repository root):
+    python benchmarks/bench_compression.py --messages 1000 10000 50000 --batch-sizes 1 16 128
+"""
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent import futures
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+import grpc
+import chat_pb2
+import chat_pb2_grpc
+from grpc_config import COMPRESSION_ALGORITHMS
+from model import User, Message
+from concurrency import SnapshotStore
+from controller.messages import get_inbox_summary
+from server_proto import snapshot_chunks
+
+WORDS = ("hey how are you doing today want to grab lunch later meeting moved to three "
+         "pm see you there thanks for the notes can you review my draft sounds good").split()
+MAX_MESSAGE_SIZE = 256 * 1024 * 1024  # Large enough for any --chunk-bytes or --page-size
+
+def build_dataset(num_users, num_messages, seed=0):
+    """Builds users and messages shaped like the server's runtime dicts, with chat-like texts."""
+    rng = random.Random(seed)
+    users_dict = dict()
+    for i in range(num_users):
+        user = User(username=f"user{i}", password=f"{rng.getrandbits(256):064x}")  # Passwords are SHA-256 hex
+        users_dict[user.uid] = user
+    uids = list(users_dict)
+
+    messages_dict = dict()
+    for i in range(num_messages):
+        sender, receiver = rng.sample(uids, 2)
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 40)))
+        message = Message(sender=sender, receiver=receiver, sender_username=users_dict[sender].username,
+                          receiver_username=users_dict[receiver].username, text=text,
+                          timestamp=f"2025-03-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+                          receiver_read=rng.random() < 0.5)
+        messages_dict[message.mid] = message
+        users_dict[sender].sent_messages.append(message.mid)
+        users_dict[receiver].received_messages.append(message.mid)
+    return users_dict, messages_dict
+
+def operation_batch(messages_dict, batch_size):
+    """Returns an OperationBatch replaying the first batch_size messages as send_message operations."""
+    operations = []
+    for seq, message in enumerate(list(messages_dict.values())[:batch_size], start=1):
+        op = chat_pb2.SendMessageOp(mid=message.mid, sender=message.sender, receiver_username=message.receiver_username,
+                                    text=message.text, timestamp=message.timestamp)
+        operations.append(chat_pb2.Operation(seq=seq, send_message=op))
+    return chat_pb2.OperationBatch(operations=operations, log_id="bench_log")
+
+def bootstrap_response(uid, users_dict, messages_dict, page_size):
+    """Returns the BootstrapResponse the server builds for uid."""
+    summary = get_inbox_summary(uid, users_dict, messages_dict, page_size)
+    return chat_pb2.BootstrapResponse(
+        unread_count=summary["unread_count"],
+        total_received=summary["total_received"],
+        total_sent=summary["total_sent"],
+        received_messages=[chat_pb2.MessageData(**vars(message)) for message in summary["received"]],
+        sent_messages=[chat_pb2.MessageData(**vars(message)) for message in summary["sent"]],
+    )
+
+class SinkService(chat_pb2_grpc.ChatServiceServicer):
+    """Accepts replication pushes without applying them, and answers bulk reads with prepared responses."""
+
+    def __init__(self):
+        self.responses = dict()  # Method -> response it returns
+        self.response_compression = grpc.Compression.NoCompression
+
+    def ApplyOperations(self, request, context):
+        return chat_pb2.ApplyOperationsResponse(success=True, applied_seq=request.operations[-1].seq)
+
+    def InstallSnapshot(self, request_iterator, context):
+        chunks = sum(1 for _ in request_iterator)
+        return chat_pb2.InstallSnapshotResponse(success=True, next_index=chunks)
+
+    def GetMessagesByMid(self, request, context):
+        context.set_compression(self.response_compression)
+        return self.responses["GetMessagesByMid"]
+
+    def Bootstrap(self, request, context):
+        context.set_compression(self.response_compression)
+        return self.responses["Bootstrap"]
+
+class ByteCountingProxy:
+    """Forwards TCP connections to a target address and counts the bytes sent in each direction."""
+
+    def __init__(self, target_port):
+        self.target_port = target_port
+        self.upstream_bytes = 0  # Client -> server
+        self.downstream_bytes = 0  # Server -> client
+        self.lock = threading.Lock()
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen()
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            client, _ = self.listener.accept()
+            upstream = socket.create_connection(("127.0.0.1", self.target_port))
+            threading.Thread(target=self.pump, args=(client, upstream, True), daemon=True).start()
+            threading.Thread(target=self.pump, args=(upstream, client, False), daemon=True).start()
+
+    def pump(self, source, destination, is_upstream):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                with self.lock:
+                    if is_upstream:
+                        self.upstream_bytes += len(data)
+                    else:
+                        self.downstream_bytes += len(data)
+                destination.sendall(data)
+        except OSError:
+            pass
+        finally:
+            destination.close()
+
+    def reset(self):
+        with self.lock:
+            self.upstream_bytes = 0
+            self.downstream_bytes = 0
+
+def measure(proxy, send, downstream, repeats):
+    """Calls send repeatedly and returns (wire bytes per call in the payload's direction, CPU ms per call, wall ms per call)."""
+    send()  # Warm up the connection outside the measurement
+    proxy.reset()
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    for _ in range(repeats):
+        send()
+    cpu, wall = time.process_time() - cpu_start, time.perf_counter() - wall_start
+    wire_bytes = proxy.downstream_bytes if downstream else proxy.upstream_bytes
+    return wire_bytes / repeats, cpu * 1000 / repeats, wall * 1000 / repeats
+
+def build_payloads(stub, sink, users_dict, messages_dict, args):
+    """
+    Returns (name, proto bytes, downstream, send) for every payload of a dataset, where send(algorithm) makes one call
+    with the payload compressed by algorithm.
+    """
+    payloads = []
+    for batch_size in args.batch_sizes:
+        batch = operation_batch(messages_dict, batch_size)
+        payloads.append((f"ops x{len(batch.operations)}", batch.ByteSize(), False,
+                         lambda algorithm, batch=batch: stub.ApplyOperations(batch, compression=algorithm)))
+
+    chunks = list(snapshot_chunks(SnapshotStore(users_dict, messages_dict).snapshot(), "bench", "bench_log", len(messages_dict), args.chunk_bytes))
+    payloads.append((f"snapshot x{len(chunks)}", sum(chunk.ByteSize() for chunk in chunks), False,
+                     lambda algorithm: stub.InstallSnapshot(iter(chunks), compression=algorithm)))
+
+    uid = max(users_dict, key=lambda uid: len(users_dict[uid].received_messages))  # The fullest mailbox
+    mids = users_dict[uid].received_messages[-args.page_size:]
+    sink.responses["GetMessagesByMid"] = chat_pb2.GetMessagesByMidResponse(messages=[chat_pb2.MessageData(**vars(messages_dict[mid])) for mid in mids])
+    sink.responses["Bootstrap"] = bootstrap_response(uid, users_dict, messages_dict, args.page_size)
+
+    def read(method, request):
+        def send(algorithm):
+            sink.response_compression = algorithm  # Bulk responses are compressed by the server
+            return getattr(stub, method)(request)
+        return send
+
+    payloads.append(("by_mid", sink.responses["GetMessagesByMid"].ByteSize(), True, read("GetMessagesByMid", chat_pb2.GetMessagesByMidRequest(mids=mids))))
+    payloads.append(("bootstrap", sink.responses["Bootstrap"].ByteSize(), True, read("Bootstrap", chat_pb2.BootstrapRequest(uid=uid, page_size=args.page_size))))
+    return payloads
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compression settings for the replication and bulk RPC classes.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[1000, 10000, 50000], help="Dataset sizes in messages")
+    parser.add_argument("--messages-per-user", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16, 128], help="Operations per ApplyOperations batch")
+    parser.add_argument("--chunk-bytes", type=int, default=1024 * 1024, help="InstallSnapshot chunk size, as snapshot_chunk_bytes in config.ini")
+    parser.add_argument("--page-size", type=int, default=20, help="Messages per GetMessagesByMid and Bootstrap mailbox page")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    options = [("grpc.max_receive_message_length", MAX_MESSAGE_SIZE), ("grpc.max_send_message_length", MAX_MESSAGE_SIZE)]
+    sink = SinkService()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4), options=options)
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(sink, server)
+    server_port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    proxy = ByteCountingProxy(server_port)
+
+    print(f"{'payload':<14}{'messages':>10}{'proto bytes':>14}{'compression':>13}{'wire bytes':>14}{'ratio':>8}{'cpu ms':>10}{'wall ms':>10}")
+    with grpc.insecure_channel(f"127.0.0.1:{proxy.port}", options=options) as channel:
+        stub = chat_pb2_grpc.ChatServiceStub(channel)
+        for num_messages in args.messages:
+            users_dict, messages_dict = build_dataset(max(2, num_messages // args.messages_per_user), num_messages)
+            for name, proto_bytes, downstream, send in build_payloads(stub, sink, users_dict, messages_dict, args):
+                for algorithm_name, algorithm in COMPRESSION_ALGORITHMS.items():
+                    wire_bytes, cpu_ms, wall_ms = measure(proxy, lambda: send(algorithm), downstream, args.repeats)
+                    print(f"{name:<14}{num_messages:>10}{proto_bytes:>14}{algorithm_name:>13}{wire_bytes:>14.0f}"
+                          f"{wire_bytes / proto_bytes:>8.2f}{cpu_ms:>10.1f}{wall_ms:>10.1f}")
+
+    server.stop(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the latency of SendMessage under each write concern, with a leader and real replicas in one process.
+
+Every server saves to JSON files in a temporary directory, so acknowledgements include the replica's
+save, as in production. --replica-delay-ms adds a random delay of up to that many ms to every push
+one replica applies, standing in for a slow disk or link. Majority then waits for the fast replica,
+while all waits for the slow one as well.
+
+Usage (from the repository root):
+    python benchmarks/bench_write_concern.py --replicas 2 --sends 500 --replica-delay-ms 20
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from concurrent import futures
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "server")))
+import grpc
+import chat_pb2
+import chat_pb2_grpc
+from channel_pool import ChannelPool
+from grpc_config import WRITE_CONCERNS
+from server_proto import ChatService, WRITE_CONCERN_METADATA
+
+def start_server(is_leader, leader_port=None, delay_ms=0):
+    """Starts a ChatService on a free port. Returns (service, server, address)."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    port = str(server.add_insecure_port("127.0.0.1:0"))
+    service = ChatService(is_leader, "127.0.0.1", port, "127.0.0.1", port if is_leader else leader_port, 1)
+    if delay_ms:
+        apply_operations = service.ApplyOperations
+        def slow_apply_operations(request, context):
+            time.sleep(random.uniform(0, delay_ms) / 1000)
+            return apply_operations(request, context)
+        service.ApplyOperations = slow_apply_operations  # Before registering, which looks the handler up once
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(service, server)
+    server.start()
+    return service, server, f"127.0.0.1:{port}"
+
+def percentile(latencies, fraction):
+    """Returns the latency below which fraction of the calls finished."""
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SendMessage latency for each write concern.")
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--sends", type=int, default=500, help="Messages sent per write concern")
+    parser.add_argument("--replica-delay-ms", type=float, default=20, help="Random delay of up to this many ms on the last replica's pushes")
+    args = parser.parse_args()
+
+    table = sys.stdout
+    sys.stdout = open(os.devnull, "w")  # The servers print every call
+    os.chdir(tempfile.mkdtemp())  # Servers save to server/data under the working directory
+    os.makedirs("server/data")
+    leader, leader_server, leader_address = start_server(True)
+    servers = [leader_server]
+    leader.replica_list = [leader_address]
+    for i in range(args.replicas):
+        delay_ms = args.replica_delay_ms if i == args.replicas - 1 else 0
+        _, server, address = start_server(False, leader.local_port, delay_ms)
+        servers.append(server)
+        leader.replica_list.append(address)
+        leader.push_full_state(address)  # What RegisterReplica does
+
+    pool = ChannelPool()
+    sender = pool.call(leader_address, "LoginPassword", chat_pb2.LoginPasswordRequest(username="bench_sender", password="pw")).uid
+    pool.call(leader_address, "LoginPassword", chat_pb2.LoginPasswordRequest(username="bench_receiver", password="pw"))
+
+    print(f"{'write concern':<15}{'servers':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}", file=table)
+    latencies = {concern: [] for concern in WRITE_CONCERNS}
+    for i in range(args.sends):  # Concerns take turns, so each sees the files at the same sizes
+        for concern in WRITE_CONCERNS:
+            request = chat_pb2.SendMessageRequest(sender=sender, receiver_username="bench_receiver", text=f"{concern} {i}", timestamp="t")
+            start = time.perf_counter()
+            pool.call(leader_address, "SendMessage", request, metadata=[(WRITE_CONCERN_METADATA, concern)])
+            latencies[concern].append((time.perf_counter() - start) * 1000)
+    for concern in WRITE_CONCERNS:
+        print(f"{concern:<15}{leader.required_acknowledgements(concern):>8}{statistics.mean(latencies[concern]):>10.2f}"
+              f"{percentile(latencies[concern], 0.5):>10.2f}{percentile(latencies[concern], 0.99):>10.2f}{max(latencies[concern]):>10.2f}", file=table)
+
+    pool.close()
+    for server in servers:
+        server.stop(None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import grpc
+import threading
+import chat_pb2_grpc
+
+# Errors after which a channel is replaced instead of reused. A channel that failed to connect waits out
+# gRPC's reconnect backoff (up to minutes) before trying again, while a new channel connects right away.
+EVICT_CODES = (grpc.StatusCode.UNAVAILABLE,)
+
+class ChannelPool:
+    """
+    Long-lived gRPC channels and stubs keyed by `ip:port`, shared by every thread.
+
+    A channel is created on first use and only connects when its first call is made. Channels
+    are kept open between calls, so a call skips the TCP and HTTP/2 handshake. A channel whose
+    call fails with UNAVAILABLE is dropped from the pool and replaced on next use. A dropped channel
+    is not closed, since other threads may still be calling on it, and is released once they are done.
+
+    Attributes:
+    ----------
+    options : list of tuple
+        gRPC options of every channel.
+    compression : grpc.Compression or None
+        Default compression of every channel.
+    evictions : int
+        Channels dropped, because a call on them failed or their server left.
+    """
+
+    def __init__(self, options=None, compression=None):
+        """
+        Initializes an empty pool.
+
+        Parameters:
+        ----------
+        options : list of tuple, optional
+            gRPC options of every channel.
+        compression : grpc.Compression, optional
+            Default compression of every channel.
+        """
+        self.options = options
+        self.compression = compression
+        self.channels = dict()  # address -> (channel, stub)
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def stub(self, address):
+        """Returns the ChatService stub for an address, opening its channel if there is none."""
+        with self.lock:
+            entry = self.channels.get(address)
+            if entry is None:
+                channel = grpc.insecure_channel(address, options=self.options, compression=self.compression)
+                entry = (channel, chat_pb2_grpc.ChatServiceStub(channel))
+                self.channels[address] = entry
+            return entry[1]
+
+    def call(self, address, method, request, **kwargs):
+        """Calls a unary method on an address over its pooled channel, evicting the channel if the server is unreachable."""
+        try:
+            return getattr(self.stub(address), method)(request, **kwargs)
+        except grpc.RpcError as e:
+            if e.code() in EVICT_CODES:
+                self.evict(address)
+            raise
+
+    def evict(self, address):
+        """Drops an address's channel from the pool, so its next call opens a new one. Calls already made on it finish."""
+        with self.lock:
+            if self.channels.pop(address, None) is not None:
+                self.evictions += 1
+
+    def close(self):
+        """Closes every channel. Only for shutting down, when no thread calls through the pool anymore."""
+        with self.lock:
+            entries, self.channels = list(self.channels.values()), dict()
+        for channel, _ in entries:
+            channel.close()
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04\x63hat\"\x07\n\x05\x45mpty\"C\n\x13ReplicaListResponse\x12\x16\n\x0eleader_address\x18\x01 \x01(\t\x12\x14\n\x0creplica_list\x18\x02 \x03(\t\":\n\x16RegisterReplicaRequest\x12\x12\n\nip_address\x18\x01 \x01(\t\x12\x0c\n\x04port\x18\x02 \x01(\x05\"*\n\x17RegisterReplicaResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"9\n\x12MessageSyncRequest\x12#\n\x08messages\x18\x01 \x03(\x0b\x32\x11.chat.MessageData\"&\n\x13MessageSyncResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"0\n\x0fUserSyncRequest\x12\x1d\n\x05users\x18\x01 \x03(\x0b\x32\x0e.chat.UserData\"#\n\x10UserSyncResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\".\n\x16ReplicaListSyncRequest\x12\x14\n\x0creplica_list\x18\x01 \x03(\t\"*\n\x17ReplicaListSyncResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"%\n\x10HeartbeatRequest\x12\x11\n\tserver_id\x18\x01 \x01(\t\"$\n\x11HeartbeatResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"5\n\x12\x45lectLeaderRequest\x12\x11\n\tserver_id\x18\x01 \x01(\t\x12\x0c\n\x04term\x18\x02 \x01(\x03\"=\n\x13\x45lectLeaderResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rnew_leader_id\x18\x02 \x01(\t\"(\n\x14LoginUsernameRequest\x12\x10\n\x08username\x18\x01 \x01(\t\">\n\x15LoginUsernameResponse\x12\x13\n\x0buser_exists\x18\x01 \x01(\x08\x12\x10\n\x08username\x18\x02 \x01(\t\":\n\x14LoginPasswordRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"5\n\x15LoginPasswordResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0b\n\x03uid\x18\x02 \x01(\t\"\xa8\x01\n\x0bMessageData\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x17\n\x0fsender_username\x18\x03 \x01(\t\x12\x19\n\x11receiver_username\x18\x04 \x01(\t\x12\x0c\n\x04text\x18\x05 \x01(\t\x12\x0b\n\x03mid\x18\x06 \x01(\t\x12\x11\n\ttimestamp\x18\x07 \x01(\t\x12\x15\n\rreceiver_read\x18\x08 \x01(\x08\"}\n\x08UserData\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08password\x18\x03 \x01(\t\x12\x19\n\x11received_messages\x18\x04 \x03(\t\x12\x15\n\rsent_messages\x18\x05 \x03(\t\x12\x0e\n\x06\x61\x63tive\x18\x06 \x01(\x08\"#\n\x14\x44\x65leteAccountRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\"(\n\x15\x44\x65leteAccountResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\'\n\x13ListAccountsRequest\x12\x10\n\x08wildcard\x18\x01 \x01(\t\"(\n\x14ListAccountsResponse\x12\x10\n\x08\x61\x63\x63ounts\x18\x01 \x03(\t\"`\n\x12SendMessageRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x19\n\x11receiver_username\x18\x02 \x01(\t\x12\x0c\n\x04text\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\t\"&\n\x13SendMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"!\n\x12GetMessagesRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\"#\n\x13GetMessagesResponse\x12\x0c\n\x04mids\x18\x01 \x03(\t\" \n\x11GetMessageRequest\x12\x0b\n\x03mid\x18\x01 \x01(\t\"\xaa\x01\n\x12GetMessageResponse\x12\x12\n\nsender_uid\x18\x01 \x01(\t\x12\x14\n\x0creceiver_uid\x18\x02 \x01(\t\x12\x17\n\x0fsender_username\x18\x03 \x01(\t\x12\x19\n\x11receiver_username\x18\x04 \x01(\t\x12\x0c\n\x04text\x18\x05 \x01(\t\x12\x11\n\ttimestamp\x18\x06 \x01(\t\x12\x15\n\rreceiver_read\x18\x07 \x01(\x08\"%\n\x16MarkMessageReadRequest\x12\x0b\n\x03mid\x18\x01 \x01(\t\"*\n\x17MarkMessageReadResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"2\n\x15\x44\x65leteMessagesRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0c\n\x04mids\x18\x02 \x03(\t\")\n\x16\x44\x65leteMessagesResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x32\xe8\t\n\x0b\x43hatService\x12H\n\rLoginUsername\x12\x1a.chat.LoginUsernameRequest\x1a\x1b.chat.LoginUsernameResponse\x12H\n\rLoginPassword\x12\x1a.chat.LoginPasswordRequest\x1a\x1b.chat.LoginPasswordResponse\x12H\n\rDeleteAccount\x12\x1a.chat.DeleteAccountRequest\x1a\x1b.chat.DeleteAccountResponse\x12\x45\n\x0cListAccounts\x12\x19.chat.ListAccountsRequest\x1a\x1a.chat.ListAccountsResponse\x12\x42\n\x0bSendMessage\x12\x18.chat.SendMessageRequest\x1a\x19.chat.SendMessageResponse\x12\x46\n\x0fGetSentMessages\x12\x18.chat.GetMessagesRequest\x1a\x19.chat.GetMessagesResponse\x12J\n\x13GetReceivedMessages\x12\x18.chat.GetMessagesRequest\x1a\x19.chat.GetMessagesResponse\x12\x44\n\x0fGetMessageByMid\x12\x17.chat.GetMessageRequest\x1a\x18.chat.GetMessageResponse\x12N\n\x0fMarkMessageRead\x12\x1c.chat.MarkMessageReadRequest\x1a\x1d.chat.MarkMessageReadResponse\x12K\n\x0e\x44\x65leteMessages\x12\x1b.chat.DeleteMessagesRequest\x1a\x1c.chat.DeleteMessagesResponse\x12N\n\x0fRegisterReplica\x12\x1c.chat.RegisterReplicaRequest\x1a\x1d.chat.RegisterReplicaResponse\x12M\n\x16SyncMessagesFromLeader\x12\x18.chat.MessageSyncRequest\x1a\x19.chat.MessageSyncResponse\x12\x44\n\x13SyncUsersFromLeader\x12\x15.chat.UserSyncRequest\x1a\x16.chat.UserSyncResponse\x12X\n\x19SyncReplicaListFromLeader\x12\x1c.chat.ReplicaListSyncRequest\x1a\x1d.chat.ReplicaListSyncResponse\x12<\n\tHeartbeat\x12\x16.chat.HeartbeatRequest\x1a\x17.chat.HeartbeatResponse\x12\x42\n\x0b\x45lectLeader\x12\x18.chat.ElectLeaderRequest\x1a\x19.chat.ElectLeaderResponse\x12\x38\n\x0eGetReplicaList\x12\x0b.chat.Empty\x1a\x19.chat.ReplicaListResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nchat.proto\x12\x04\x63hat\"\x07\n\x05\x45mpty\"C\n\x13ReplicaListResponse\x12\x16\n\x0eleader_address\x18\x01 \x01(\t\x12\x14\n\x0creplica_list\x18\x02 \x03(\t\"_\n\x16RegisterReplicaRequest\x12\x12\n\nip_address\x18\x01 \x01(\t\x12\x0c\n\x04port\x18\x02 \x01(\x05\x12\x0e\n\x06log_id\x18\x03 \x01(\t\x12\x13\n\x0b\x61pplied_seq\x18\x04 \x01(\x03\"*\n\x17RegisterReplicaResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\".\n\x16ReplicaListSyncRequest\x12\x14\n\x0creplica_list\x18\x01 \x03(\t\"*\n\x17ReplicaListSyncResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\xa9\x01\n\rSnapshotChunk\x12\x13\n\x0bsnapshot_id\x18\x01 \x01(\t\x12\x12\n\ncommit_seq\x18\x02 \x01(\x03\x12\r\n\x05index\x18\x03 \x01(\x05\x12\x1d\n\x05users\x18\x04 \x03(\x0b\x32\x0e.chat.UserData\x12#\n\x08messages\x18\x05 \x03(\x0b\x32\x11.chat.MessageData\x12\x0c\n\x04last\x18\x06 \x01(\x08\x12\x0e\n\x06log_id\x18\x07 \x01(\t\"R\n\x17InstallSnapshotResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\nnext_index\x18\x02 \x01(\x05\x12\x12\n\ncommit_seq\x18\x03 \x01(\x03\".\n\x17SnapshotProgressRequest\x12\x13\n\x0bsnapshot_id\x18\x01 \x01(\t\"A\n\x18SnapshotProgressResponse\x12\x12\n\nnext_index\x18\x01 \x01(\x05\x12\x11\n\tinstalled\x18\x02 \x01(\x08\"@\n\x10RangeHashRequest\x12\x0c\n\x04kind\x18\x01 \x01(\t\x12\r\n\x05\x64\x65pth\x18\x02 \x01(\x05\x12\x0f\n\x07indices\x18\x03 \x03(\x05\"7\n\x11RangeHashResponse\x12\x12\n\ncommit_seq\x18\x01 \x01(\x03\x12\x0e\n\x06hashes\x18\x02 \x03(\x06\"\x9b\x01\n\x12RangeRepairRequest\x12\x12\n\ncommit_seq\x18\x01 \x01(\x03\x12\x14\n\x0cuser_buckets\x18\x02 \x03(\x05\x12\x17\n\x0fmessage_buckets\x18\x03 \x03(\x05\x12\x1d\n\x05users\x18\x04 \x03(\x0b\x32\x0e.chat.UserData\x12#\n\x08messages\x18\x05 \x03(\x0b\x32\x11.chat.MessageData\"8\n\x13RangeRepairResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x10\n\x08repaired\x18\x02 \x01(\x03\"\x8f\x02\n\tOperation\x12\x0b\n\x03seq\x18\x01 \x01(\x03\x12/\n\x0e\x63reate_account\x18\x02 \x01(\x0b\x32\x15.chat.CreateAccountOpH\x00\x12\x37\n\x12\x64\x65\x61\x63tivate_account\x18\x03 \x01(\x0b\x32\x19.chat.DeactivateAccountOpH\x00\x12+\n\x0csend_message\x18\x04 \x01(\x0b\x32\x13.chat.SendMessageOpH\x00\x12%\n\tmark_read\x18\x05 \x01(\x0b\x32\x10.chat.MarkReadOpH\x00\x12\x31\n\x0f\x64\x65lete_messages\x18\x06 \x01(\x0b\x32\x16.chat.DeleteMessagesOpH\x00\x42\x04\n\x02op\"B\n\x0f\x43reateAccountOp\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08password\x18\x03 \x01(\t\"\"\n\x13\x44\x65\x61\x63tivateAccountOp\x12\x0b\n\x03uid\x18\x01 \x01(\t\"h\n\rSendMessageOp\x12\x0b\n\x03mid\x18\x01 \x01(\t\x12\x0e\n\x06sender\x18\x02 \x01(\t\x12\x19\n\x11receiver_username\x18\x03 \x01(\t\x12\x0c\n\x04text\x18\x04 \x01(\t\x12\x11\n\ttimestamp\x18\x05 \x01(\t\"\x19\n\nMarkReadOp\x12\x0b\n\x03mid\x18\x01 \x01(\t\"-\n\x10\x44\x65leteMessagesOp\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0c\n\x04mids\x18\x02 \x03(\t\"E\n\x0eOperationBatch\x12#\n\noperations\x18\x01 \x03(\x0b\x32\x0f.chat.Operation\x12\x0e\n\x06log_id\x18\x02 \x01(\t\"?\n\x17\x41pplyOperationsResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x13\n\x0b\x61pplied_seq\x18\x02 \x01(\x03\"%\n\x10HeartbeatRequest\x12\x11\n\tserver_id\x18\x01 \x01(\t\"9\n\x11HeartbeatResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x13\n\x0b\x61pplied_seq\x18\x02 \x01(\x03\"5\n\x12\x45lectLeaderRequest\x12\x11\n\tserver_id\x18\x01 \x01(\t\x12\x0c\n\x04term\x18\x02 \x01(\x03\"=\n\x13\x45lectLeaderResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x15\n\rnew_leader_id\x18\x02 \x01(\t\"(\n\x14LoginUsernameRequest\x12\x10\n\x08username\x18\x01 \x01(\t\">\n\x15LoginUsernameResponse\x12\x13\n\x0buser_exists\x18\x01 \x01(\x08\x12\x10\n\x08username\x18\x02 \x01(\t\":\n\x14LoginPasswordRequest\x12\x10\n\x08username\x18\x01 \x01(\t\x12\x10\n\x08password\x18\x02 \x01(\t\"I\n\x15LoginPasswordResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x0b\n\x03uid\x18\x02 \x01(\t\x12\x12\n\ncommit_seq\x18\x03 \x01(\x03\"2\n\x10\x42ootstrapRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x11\n\tpage_size\x18\x02 \x01(\x05\"\x8b\x02\n\x11\x42ootstrapResponse\x12\x14\n\x0cunread_count\x18\x01 \x01(\x05\x12\x16\n\x0etotal_received\x18\x02 \x01(\x05\x12\x12\n\ntotal_sent\x18\x03 \x01(\x05\x12,\n\x11received_messages\x18\x04 \x03(\x0b\x32\x11.chat.MessageData\x12(\n\rsent_messages\x18\x05 \x03(\x0b\x32\x11.chat.MessageData\x12\x17\n\x0fmailbox_version\x18\x06 \x01(\x03\x12\x15\n\rmailbox_epoch\x18\x07 \x01(\t\x12\x16\n\x0eleader_address\x18\x08 \x01(\t\x12\x14\n\x0creplica_list\x18\t \x03(\t\"\xa8\x01\n\x0bMessageData\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x10\n\x08receiver\x18\x02 \x01(\t\x12\x17\n\x0fsender_username\x18\x03 \x01(\t\x12\x19\n\x11receiver_username\x18\x04 \x01(\t\x12\x0c\n\x04text\x18\x05 \x01(\t\x12\x0b\n\x03mid\x18\x06 \x01(\t\x12\x11\n\ttimestamp\x18\x07 \x01(\t\x12\x15\n\rreceiver_read\x18\x08 \x01(\x08\"}\n\x08UserData\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x10\n\x08username\x18\x02 \x01(\t\x12\x10\n\x08password\x18\x03 \x01(\t\x12\x19\n\x11received_messages\x18\x04 \x03(\t\x12\x15\n\rsent_messages\x18\x05 \x03(\t\x12\x0e\n\x06\x61\x63tive\x18\x06 \x01(\x08\"#\n\x14\x44\x65leteAccountRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\"<\n\x15\x44\x65leteAccountResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\ncommit_seq\x18\x02 \x01(\x03\"8\n\x13ListAccountsRequest\x12\x10\n\x08wildcard\x18\x01 \x01(\t\x12\x0f\n\x07min_seq\x18\x02 \x01(\x03\"(\n\x14ListAccountsResponse\x12\x10\n\x08\x61\x63\x63ounts\x18\x01 \x03(\t\"`\n\x12SendMessageRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x19\n\x11receiver_username\x18\x02 \x01(\t\x12\x0c\n\x04text\x18\x03 \x01(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\t\":\n\x13SendMessageResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\ncommit_seq\x18\x02 \x01(\x03\"c\n\x13SendMessagesRequest\x12\x0e\n\x06sender\x18\x01 \x01(\t\x12\x1a\n\x12receiver_usernames\x18\x02 \x03(\t\x12\r\n\x05texts\x18\x03 \x03(\t\x12\x11\n\ttimestamp\x18\x04 \x01(\t\"K\n\x0fRecipientResult\x12\x19\n\x11receiver_username\x18\x01 \x01(\t\x12\x0f\n\x07success\x18\x02 \x01(\x08\x12\x0c\n\x04mids\x18\x03 \x03(\t\"c\n\x14SendMessagesResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12&\n\x07results\x18\x02 \x03(\x0b\x32\x15.chat.RecipientResult\x12\x12\n\ncommit_seq\x18\x03 \x01(\x03\"2\n\x12GetMessagesRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0f\n\x07min_seq\x18\x02 \x01(\x03\"#\n\x13GetMessagesResponse\x12\x0c\n\x04mids\x18\x01 \x03(\t\"A\n\x11GetMessageRequest\x12\x0b\n\x03mid\x18\x01 \x01(\t\x12\x0e\n\x06\x66ields\x18\x02 \x03(\t\x12\x0f\n\x07min_seq\x18\x03 \x01(\x03\"H\n\x17GetMessagesByMidRequest\x12\x0c\n\x04mids\x18\x01 \x03(\t\x12\x0e\n\x06\x66ields\x18\x02 \x03(\t\x12\x0f\n\x07min_seq\x18\x03 \x01(\x03\"?\n\x18GetMessagesByMidResponse\x12#\n\x08messages\x18\x01 \x03(\x0b\x32\x11.chat.MessageData\"\xaa\x01\n\x12GetMessageResponse\x12\x12\n\nsender_uid\x18\x01 \x01(\t\x12\x14\n\x0creceiver_uid\x18\x02 \x01(\t\x12\x17\n\x0fsender_username\x18\x03 \x01(\t\x12\x19\n\x11receiver_username\x18\x04 \x01(\t\x12\x0c\n\x04text\x18\x05 \x01(\t\x12\x11\n\ttimestamp\x18\x06 \x01(\t\x12\x15\n\rreceiver_read\x18\x07 \x01(\x08\"%\n\x16MarkMessageReadRequest\x12\x0b\n\x03mid\x18\x01 \x01(\t\">\n\x17MarkMessageReadResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\ncommit_seq\x18\x02 \x01(\x03\"2\n\x15\x44\x65leteMessagesRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0c\n\x04mids\x18\x02 \x03(\t\"=\n\x16\x44\x65leteMessagesResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x12\n\ncommit_seq\x18\x02 \x01(\x03\"G\n\x12SyncMailboxRequest\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x15\n\rsince_version\x18\x02 \x01(\x03\x12\r\n\x05\x65poch\x18\x03 \x01(\t\"\x99\x01\n\x13SyncMailboxResponse\x12\x0f\n\x07version\x18\x01 \x01(\x03\x12\r\n\x05\x65poch\x18\x02 \x01(\t\x12\x11\n\tfull_sync\x18\x03 \x01(\x08\x12\x12\n\nadded_mids\x18\x04 \x03(\t\x12\x14\n\x0cremoved_mids\x18\x05 \x03(\t\x12\x11\n\tread_mids\x18\x06 \x03(\t\x12\x12\n\ncommit_seq\x18\x07 \x01(\x03\"\xe8\x04\n\x0eSessionRequest\x12\x16\n\x0e\x63orrelation_id\x18\x01 \x01(\x03\x12\x0b\n\x03uid\x18\x02 \x01(\t\x12\x30\n\x0csend_message\x18\x03 \x01(\x0b\x32\x18.chat.SendMessageRequestH\x00\x12\x32\n\rsend_messages\x18\x04 \x01(\x0b\x32\x19.chat.SendMessagesRequestH\x00\x12\x39\n\x11mark_message_read\x18\x05 \x01(\x0b\x32\x1c.chat.MarkMessageReadRequestH\x00\x12\x36\n\x0f\x64\x65lete_messages\x18\x06 \x01(\x0b\x32\x1b.chat.DeleteMessagesRequestH\x00\x12\x35\n\x12get_message_by_mid\x18\x07 \x01(\x0b\x32\x17.chat.GetMessageRequestH\x00\x12\x39\n\x15get_received_messages\x18\x08 \x01(\x0b\x32\x18.chat.GetMessagesRequestH\x00\x12\x35\n\x11get_sent_messages\x18\t \x01(\x0b\x32\x18.chat.GetMessagesRequestH\x00\x12\x30\n\x0csync_mailbox\x18\n \x01(\x0b\x32\x18.chat.SyncMailboxRequestH\x00\x12\x32\n\rlist_accounts\x18\x0b \x01(\x0b\x32\x19.chat.ListAccountsRequestH\x00\x12<\n\x13get_messages_by_mid\x18\x0c \x01(\x0b\x32\x1d.chat.GetMessagesByMidRequestH\x00\x42\x0b\n\toperation\";\n\x0cMailboxEvent\x12\x0b\n\x03uid\x18\x01 \x01(\t\x12\x0f\n\x07version\x18\x02 \x01(\x03\x12\r\n\x05\x65poch\x18\x03 \x01(\t\"\x9f\x05\n\x0fSessionResponse\x12\x16\n\x0e\x63orrelation_id\x18\x01 \x01(\x03\x12\r\n\x05\x65rror\x18\x02 \x01(\t\x12\x31\n\x0csend_message\x18\x03 \x01(\x0b\x32\x19.chat.SendMessageResponseH\x00\x12\x33\n\rsend_messages\x18\x04 \x01(\x0b\x32\x1a.chat.SendMessagesResponseH\x00\x12:\n\x11mark_message_read\x18\x05 \x01(\x0b\x32\x1d.chat.MarkMessageReadResponseH\x00\x12\x37\n\x0f\x64\x65lete_messages\x18\x06 \x01(\x0b\x32\x1c.chat.DeleteMessagesResponseH\x00\x12\x36\n\x12get_message_by_mid\x18\x07 \x01(\x0b\x32\x18.chat.GetMessageResponseH\x00\x12:\n\x15get_received_messages\x18\x08 \x01(\x0b\x32\x19.chat.GetMessagesResponseH\x00\x12\x36\n\x11get_sent_messages\x18\t \x01(\x0b\x32\x19.chat.GetMessagesResponseH\x00\x12\x31\n\x0csync_mailbox\x18\n \x01(\x0b\x32\x19.chat.SyncMailboxResponseH\x00\x12\x33\n\rlist_accounts\x18\x0b \x01(\x0b\x32\x1a.chat.ListAccountsResponseH\x00\x12+\n\rmailbox_event\x18\x0c \x01(\x0b\x32\x12.chat.MailboxEventH\x00\x12=\n\x13get_messages_by_mid\x18\r \x01(\x0b\x32\x1e.chat.GetMessagesByMidResponseH\x00\x42\x08\n\x06result\"X\n\x16\x44\x65liverMessagesRequest\x12\x19\n\x11receiver_username\x18\x01 \x01(\t\x12#\n\x08messages\x18\x02 \x03(\x0b\x32\x11.chat.MessageData\"T\n\x17\x44\x65liverMessagesResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\x12\x14\n\x0creceiver_uid\x18\x02 \x01(\t\x12\x12\n\ncommit_seq\x18\x03 \x01(\x03\"\x95\x03\n\x13ServerStatsResponse\x12\x12\n\ncache_hits\x18\x01 \x01(\x03\x12\x14\n\x0c\x63\x61\x63he_misses\x18\x02 \x01(\x03\x12\x17\n\x0f\x63\x61\x63he_evictions\x18\x03 \x01(\x03\x12\x15\n\rcache_entries\x18\x04 \x01(\x03\x12\x16\n\x0e\x63\x61\x63he_hit_rate\x18\x05 \x01(\x01\x12\x15\n\rusers_version\x18\x06 \x01(\x03\x12\x15\n\rwrite_batches\x18\x07 \x01(\x03\x12\x18\n\x10writes_committed\x18\x08 \x01(\x03\x12\x1b\n\x13\x61nti_entropy_rounds\x18\t \x01(\x03\x12\x1c\n\x14\x61nti_entropy_skipped\x18\n \x01(\x03\x12\x18\n\x10\x64ivergent_ranges\x18\x0b \x01(\x03\x12\x18\n\x10repaired_records\x18\x0c \x01(\x03\x12\"\n\x08replicas\x18\r \x03(\x0b\x32\x10.chat.ReplicaLag\x12\x18\n\x10writes_throttled\x18\x0e \x01(\x03\x12\x17\n\x0fwrites_rejected\x18\x0f \x01(\x03\"\x88\x01\n\nReplicaLag\x12\x0f\n\x07\x61\x64\x64ress\x18\x01 \x01(\t\x12\x13\n\x0b\x61pplied_seq\x18\x02 \x01(\x03\x12\x15\n\rwrites_behind\x18\x03 \x01(\x03\x12\x14\n\x0c\x62ytes_behind\x18\x04 \x01(\x03\x12\x16\n\x0eseconds_behind\x18\x05 \x01(\x01\x12\x0f\n\x07\x62\x61\x63klog\x18\x06 \x01(\x03\x32\xa0\x0f\n\x0b\x43hatService\x12H\n\rLoginUsername\x12\x1a.chat.LoginUsernameRequest\x1a\x1b.chat.LoginUsernameResponse\x12H\n\rLoginPassword\x12\x1a.chat.LoginPasswordRequest\x1a\x1b.chat.LoginPasswordResponse\x12<\n\tBootstrap\x12\x16.chat.BootstrapRequest\x1a\x17.chat.BootstrapResponse\x12H\n\rDeleteAccount\x12\x1a.chat.DeleteAccountRequest\x1a\x1b.chat.DeleteAccountResponse\x12\x45\n\x0cListAccounts\x12\x19.chat.ListAccountsRequest\x1a\x1a.chat.ListAccountsResponse\x12\x42\n\x0bSendMessage\x12\x18.chat.SendMessageRequest\x1a\x19.chat.SendMessageResponse\x12\x45\n\x0cSendMessages\x12\x19.chat.SendMessagesRequest\x1a\x1a.chat.SendMessagesResponse\x12\x46\n\x0fGetSentMessages\x12\x18.chat.GetMessagesRequest\x1a\x19.chat.GetMessagesResponse\x12J\n\x13GetReceivedMessages\x12\x18.chat.GetMessagesRequest\x1a\x19.chat.GetMessagesResponse\x12\x44\n\x0fGetMessageByMid\x12\x17.chat.GetMessageRequest\x1a\x18.chat.GetMessageResponse\x12Q\n\x10GetMessagesByMid\x12\x1d.chat.GetMessagesByMidRequest\x1a\x1e.chat.GetMessagesByMidResponse\x12N\n\x0fMarkMessageRead\x12\x1c.chat.MarkMessageReadRequest\x1a\x1d.chat.MarkMessageReadResponse\x12K\n\x0e\x44\x65leteMessages\x12\x1b.chat.DeleteMessagesRequest\x1a\x1c.chat.DeleteMessagesResponse\x12\x42\n\x0bSyncMailbox\x12\x18.chat.SyncMailboxRequest\x1a\x19.chat.SyncMailboxResponse\x12:\n\x07Session\x12\x14.chat.SessionRequest\x1a\x15.chat.SessionResponse(\x01\x30\x01\x12N\n\x0fRegisterReplica\x12\x1c.chat.RegisterReplicaRequest\x1a\x1d.chat.RegisterReplicaResponse\x12X\n\x19SyncReplicaListFromLeader\x12\x1c.chat.ReplicaListSyncRequest\x1a\x1d.chat.ReplicaListSyncResponse\x12\x46\n\x0f\x41pplyOperations\x12\x14.chat.OperationBatch\x1a\x1d.chat.ApplyOperationsResponse\x12G\n\x0fInstallSnapshot\x12\x13.chat.SnapshotChunk\x1a\x1d.chat.InstallSnapshotResponse(\x01\x12Q\n\x10SnapshotProgress\x12\x1d.chat.SnapshotProgressRequest\x1a\x1e.chat.SnapshotProgressResponse\x12@\n\rCompareRanges\x12\x16.chat.RangeHashRequest\x1a\x17.chat.RangeHashResponse\x12\x43\n\x0cRepairRanges\x12\x18.chat.RangeRepairRequest\x1a\x19.chat.RangeRepairResponse\x12<\n\tHeartbeat\x12\x16.chat.HeartbeatRequest\x1a\x17.chat.HeartbeatResponse\x12\x42\n\x0b\x45lectLeader\x12\x18.chat.ElectLeaderRequest\x1a\x19.chat.ElectLeaderResponse\x12\x38\n\x0eGetReplicaList\x12\x0b.chat.Empty\x1a\x19.chat.ReplicaListResponse\x12\x38\n\x0eGetServerStats\x12\x0b.chat.Empty\x1a\x19.chat.ServerStatsResponse\x12N\n\x0f\x44\x65liverMessages\x12\x1c.chat.DeliverMessagesRequest\x1a\x1d.chat.DeliverMessagesResponseb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -36,69 +36,125 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_REPLICALISTRESPONSE']._serialized_start=29
   _globals['_REPLICALISTRESPONSE']._serialized_end=96
   _globals['_REGISTERREPLICAREQUEST']._serialized_start=98
-  _globals['_REGISTERREPLICAREQUEST']._serialized_end=156
-  _globals['_REGISTERREPLICARESPONSE']._serialized_start=158
-  _globals['_REGISTERREPLICARESPONSE']._serialized_end=200
-  _globals['_MESSAGESYNCREQUEST']._serialized_start=202
-  _globals['_MESSAGESYNCREQUEST']._serialized_end=259
-  _globals['_MESSAGESYNCRESPONSE']._serialized_start=261
-  _globals['_MESSAGESYNCRESPONSE']._serialized_end=299
-  _globals['_USERSYNCREQUEST']._serialized_start=301
-  _globals['_USERSYNCREQUEST']._serialized_end=349
-  _globals['_USERSYNCRESPONSE']._serialized_start=351
-  _globals['_USERSYNCRESPONSE']._serialized_end=386
-  _globals['_REPLICALISTSYNCREQUEST']._serialized_start=388
-  _globals['_REPLICALISTSYNCREQUEST']._serialized_end=434
-  _globals['_REPLICALISTSYNCRESPONSE']._serialized_start=436
-  _globals['_REPLICALISTSYNCRESPONSE']._serialized_end=478
-  _globals['_HEARTBEATREQUEST']._serialized_start=480
-  _globals['_HEARTBEATREQUEST']._serialized_end=517
-  _globals['_HEARTBEATRESPONSE']._serialized_start=519
-  _globals['_HEARTBEATRESPONSE']._serialized_end=555
-  _globals['_ELECTLEADERREQUEST']._serialized_start=557
-  _globals['_ELECTLEADERREQUEST']._serialized_end=610
-  _globals['_ELECTLEADERRESPONSE']._serialized_start=612
-  _globals['_ELECTLEADERRESPONSE']._serialized_end=673
-  _globals['_LOGINUSERNAMEREQUEST']._serialized_start=675
-  _globals['_LOGINUSERNAMEREQUEST']._serialized_end=715
-  _globals['_LOGINUSERNAMERESPONSE']._serialized_start=717
-  _globals['_LOGINUSERNAMERESPONSE']._serialized_end=779
-  _globals['_LOGINPASSWORDREQUEST']._serialized_start=781
-  _globals['_LOGINPASSWORDREQUEST']._serialized_end=839
-  _globals['_LOGINPASSWORDRESPONSE']._serialized_start=841
-  _globals['_LOGINPASSWORDRESPONSE']._serialized_end=894
-  _globals['_MESSAGEDATA']._serialized_start=897
-  _globals['_MESSAGEDATA']._serialized_end=1065
-  _globals['_USERDATA']._serialized_start=1067
-  _globals['_USERDATA']._serialized_end=1192
-  _globals['_DELETEACCOUNTREQUEST']._serialized_start=1194
-  _globals['_DELETEACCOUNTREQUEST']._serialized_end=1229
-  _globals['_DELETEACCOUNTRESPONSE']._serialized_start=1231
-  _globals['_DELETEACCOUNTRESPONSE']._serialized_end=1271
-  _globals['_LISTACCOUNTSREQUEST']._serialized_start=1273
-  _globals['_LISTACCOUNTSREQUEST']._serialized_end=1312
-  _globals['_LISTACCOUNTSRESPONSE']._serialized_start=1314
-  _globals['_LISTACCOUNTSRESPONSE']._serialized_end=1354
-  _globals['_SENDMESSAGEREQUEST']._serialized_start=1356
-  _globals['_SENDMESSAGEREQUEST']._serialized_end=1452
-  _globals['_SENDMESSAGERESPONSE']._serialized_start=1454
-  _globals['_SENDMESSAGERESPONSE']._serialized_end=1492
-  _globals['_GETMESSAGESREQUEST']._serialized_start=1494
-  _globals['_GETMESSAGESREQUEST']._serialized_end=1527
-  _globals['_GETMESSAGESRESPONSE']._serialized_start=1529
-  _globals['_GETMESSAGESRESPONSE']._serialized_end=1564
-  _globals['_GETMESSAGEREQUEST']._serialized_start=1566
-  _globals['_GETMESSAGEREQUEST']._serialized_end=1598
-  _globals['_GETMESSAGERESPONSE']._serialized_start=1601
-  _globals['_GETMESSAGERESPONSE']._serialized_end=1771
-  _globals['_MARKMESSAGEREADREQUEST']._serialized_start=1773
-  _globals['_MARKMESSAGEREADREQUEST']._serialized_end=1810
-  _globals['_MARKMESSAGEREADRESPONSE']._serialized_start=1812
-  _globals['_MARKMESSAGEREADRESPONSE']._serialized_end=1854
-  _globals['_DELETEMESSAGESREQUEST']._serialized_start=1856
-  _globals['_DELETEMESSAGESREQUEST']._serialized_end=1906
-  _globals['_DELETEMESSAGESRESPONSE']._serialized_start=1908
-  _globals['_DELETEMESSAGESRESPONSE']._serialized_end=1949
-  _globals['_CHATSERVICE']._serialized_start=1952
-  _globals['_CHATSERVICE']._serialized_end=3208
+  _globals['_REGISTERREPLICAREQUEST']._serialized_end=193
+  _globals['_REGISTERREPLICARESPONSE']._serialized_start=195
+  _globals['_REGISTERREPLICARESPONSE']._serialized_end=237
+  _globals['_REPLICALISTSYNCREQUEST']._serialized_start=239
+  _globals['_REPLICALISTSYNCREQUEST']._serialized_end=285
+  _globals['_REPLICALISTSYNCRESPONSE']._serialized_start=287
+  _globals['_REPLICALISTSYNCRESPONSE']._serialized_end=329
+  _globals['_SNAPSHOTCHUNK']._serialized_start=332
+  _globals['_SNAPSHOTCHUNK']._serialized_end=501
+  _globals['_INSTALLSNAPSHOTRESPONSE']._serialized_start=503
+  _globals['_INSTALLSNAPSHOTRESPONSE']._serialized_end=585
+  _globals['_SNAPSHOTPROGRESSREQUEST']._serialized_start=587
+  _globals['_SNAPSHOTPROGRESSREQUEST']._serialized_end=633
+  _globals['_SNAPSHOTPROGRESSRESPONSE']._serialized_start=635
+  _globals['_SNAPSHOTPROGRESSRESPONSE']._serialized_end=700
+  _globals['_RANGEHASHREQUEST']._serialized_start=702
+  _globals['_RANGEHASHREQUEST']._serialized_end=766
+  _globals['_RANGEHASHRESPONSE']._serialized_start=768
+  _globals['_RANGEHASHRESPONSE']._serialized_end=823
+  _globals['_RANGEREPAIRREQUEST']._serialized_start=826
+  _globals['_RANGEREPAIRREQUEST']._serialized_end=981
+  _globals['_RANGEREPAIRRESPONSE']._serialized_start=983
+  _globals['_RANGEREPAIRRESPONSE']._serialized_end=1039
+  _globals['_OPERATION']._serialized_start=1042
+  _globals['_OPERATION']._serialized_end=1313
+  _globals['_CREATEACCOUNTOP']._serialized_start=1315
+  _globals['_CREATEACCOUNTOP']._serialized_end=1381
+  _globals['_DEACTIVATEACCOUNTOP']._serialized_start=1383
+  _globals['_DEACTIVATEACCOUNTOP']._serialized_end=1417
+  _globals['_SENDMESSAGEOP']._serialized_start=1419
+  _globals['_SENDMESSAGEOP']._serialized_end=1523
+  _globals['_MARKREADOP']._serialized_start=1525
+  _globals['_MARKREADOP']._serialized_end=1550
+  _globals['_DELETEMESSAGESOP']._serialized_start=1552
+  _globals['_DELETEMESSAGESOP']._serialized_end=1597
+  _globals['_OPERATIONBATCH']._serialized_start=1599
+  _globals['_OPERATIONBATCH']._serialized_end=1668
+  _globals['_APPLYOPERATIONSRESPONSE']._serialized_start=1670
+  _globals['_APPLYOPERATIONSRESPONSE']._serialized_end=1733
+  _globals['_HEARTBEATREQUEST']._serialized_start=1735
+  _globals['_HEARTBEATREQUEST']._serialized_end=1772
+  _globals['_HEARTBEATRESPONSE']._serialized_start=1774
+  _globals['_HEARTBEATRESPONSE']._serialized_end=1831
+  _globals['_ELECTLEADERREQUEST']._serialized_start=1833
+  _globals['_ELECTLEADERREQUEST']._serialized_end=1886
+  _globals['_ELECTLEADERRESPONSE']._serialized_start=1888
+  _globals['_ELECTLEADERRESPONSE']._serialized_end=1949
+  _globals['_LOGINUSERNAMEREQUEST']._serialized_start=1951
+  _globals['_LOGINUSERNAMEREQUEST']._serialized_end=1991
+  _globals['_LOGINUSERNAMERESPONSE']._serialized_start=1993
+  _globals['_LOGINUSERNAMERESPONSE']._serialized_end=2055
+  _globals['_LOGINPASSWORDREQUEST']._serialized_start=2057
+  _globals['_LOGINPASSWORDREQUEST']._serialized_end=2115
+  _globals['_LOGINPASSWORDRESPONSE']._serialized_start=2117
+  _globals['_LOGINPASSWORDRESPONSE']._serialized_end=2190
+  _globals['_BOOTSTRAPREQUEST']._serialized_start=2192
+  _globals['_BOOTSTRAPREQUEST']._serialized_end=2242
+  _globals['_BOOTSTRAPRESPONSE']._serialized_start=2245
+  _globals['_BOOTSTRAPRESPONSE']._serialized_end=2512
+  _globals['_MESSAGEDATA']._serialized_start=2515
+  _globals['_MESSAGEDATA']._serialized_end=2683
+  _globals['_USERDATA']._serialized_start=2685
+  _globals['_USERDATA']._serialized_end=2810
+  _globals['_DELETEACCOUNTREQUEST']._serialized_start=2812
+  _globals['_DELETEACCOUNTREQUEST']._serialized_end=2847
+  _globals['_DELETEACCOUNTRESPONSE']._serialized_start=2849
+  _globals['_DELETEACCOUNTRESPONSE']._serialized_end=2909
+  _globals['_LISTACCOUNTSREQUEST']._serialized_start=2911
+  _globals['_LISTACCOUNTSREQUEST']._serialized_end=2967
+  _globals['_LISTACCOUNTSRESPONSE']._serialized_start=2969
+  _globals['_LISTACCOUNTSRESPONSE']._serialized_end=3009
+  _globals['_SENDMESSAGEREQUEST']._serialized_start=3011
+  _globals['_SENDMESSAGEREQUEST']._serialized_end=3107
+  _globals['_SENDMESSAGERESPONSE']._serialized_start=3109
+  _globals['_SENDMESSAGERESPONSE']._serialized_end=3167
+  _globals['_SENDMESSAGESREQUEST']._serialized_start=3169
+  _globals['_SENDMESSAGESREQUEST']._serialized_end=3268
+  _globals['_RECIPIENTRESULT']._serialized_start=3270
+  _globals['_RECIPIENTRESULT']._serialized_end=3345
+  _globals['_SENDMESSAGESRESPONSE']._serialized_start=3347
+  _globals['_SENDMESSAGESRESPONSE']._serialized_end=3446
+  _globals['_GETMESSAGESREQUEST']._serialized_start=3448
+  _globals['_GETMESSAGESREQUEST']._serialized_end=3498
+  _globals['_GETMESSAGESRESPONSE']._serialized_start=3500
+  _globals['_GETMESSAGESRESPONSE']._serialized_end=3535
+  _globals['_GETMESSAGEREQUEST']._serialized_start=3537
+  _globals['_GETMESSAGEREQUEST']._serialized_end=3602
+  _globals['_GETMESSAGESBYMIDREQUEST']._serialized_start=3604
+  _globals['_GETMESSAGESBYMIDREQUEST']._serialized_end=3676
+  _globals['_GETMESSAGESBYMIDRESPONSE']._serialized_start=3678
+  _globals['_GETMESSAGESBYMIDRESPONSE']._serialized_end=3741
+  _globals['_GETMESSAGERESPONSE']._serialized_start=3744
+  _globals['_GETMESSAGERESPONSE']._serialized_end=3914
+  _globals['_MARKMESSAGEREADREQUEST']._serialized_start=3916
+  _globals['_MARKMESSAGEREADREQUEST']._serialized_end=3953
+  _globals['_MARKMESSAGEREADRESPONSE']._serialized_start=3955
+  _globals['_MARKMESSAGEREADRESPONSE']._serialized_end=4017
+  _globals['_DELETEMESSAGESREQUEST']._serialized_start=4019
+  _globals['_DELETEMESSAGESREQUEST']._serialized_end=4069
+  _globals['_DELETEMESSAGESRESPONSE']._serialized_start=4071
+  _globals['_DELETEMESSAGESRESPONSE']._serialized_end=4132
+  _globals['_SYNCMAILBOXREQUEST']._serialized_start=4134
+  _globals['_SYNCMAILBOXREQUEST']._serialized_end=4205
+  _globals['_SYNCMAILBOXRESPONSE']._serialized_start=4208
+  _globals['_SYNCMAILBOXRESPONSE']._serialized_end=4361
+  _globals['_SESSIONREQUEST']._serialized_start=4364
+  _globals['_SESSIONREQUEST']._serialized_end=4980
+  _globals['_MAILBOXEVENT']._serialized_start=4982
+  _globals['_MAILBOXEVENT']._serialized_end=5041
+  _globals['_SESSIONRESPONSE']._serialized_start=5044
+  _globals['_SESSIONRESPONSE']._serialized_end=5715
+  _globals['_DELIVERMESSAGESREQUEST']._serialized_start=5717
+  _globals['_DELIVERMESSAGESREQUEST']._serialized_end=5805
+  _globals['_DELIVERMESSAGESRESPONSE']._serialized_start=5807
+  _globals['_DELIVERMESSAGESRESPONSE']._serialized_end=5891
+  _globals['_SERVERSTATSRESPONSE']._serialized_start=5894
+  _globals['_SERVERSTATSRESPONSE']._serialized_end=6299
+  _globals['_REPLICALAG']._serialized_start=6302
+  _globals['_REPLICALAG']._serialized_end=6438
+  _globals['_CHATSERVICE']._serialized_start=6441
+  _globals['_CHATSERVICE']._serialized_end=8393
 # @@protoc_insertion_point(module_scope)
@@ -44,6 +44,11 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.LoginPasswordRequest.SerializeToString,
                 response_deserializer=chat__pb2.LoginPasswordResponse.FromString,
                 _registered_method=True)
+        self.Bootstrap = channel.unary_unary(
+                '/chat.ChatService/Bootstrap',
+                request_serializer=chat__pb2.BootstrapRequest.SerializeToString,
+                response_deserializer=chat__pb2.BootstrapResponse.FromString,
+                _registered_method=True)
         self.DeleteAccount = channel.unary_unary(
                 '/chat.ChatService/DeleteAccount',
                 request_serializer=chat__pb2.DeleteAccountRequest.SerializeToString,
@@ -59,6 +64,11 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.SendMessageRequest.SerializeToString,
                 response_deserializer=chat__pb2.SendMessageResponse.FromString,
                 _registered_method=True)
+        self.SendMessages = channel.unary_unary(
+                '/chat.ChatService/SendMessages',
+                request_serializer=chat__pb2.SendMessagesRequest.SerializeToString,
+                response_deserializer=chat__pb2.SendMessagesResponse.FromString,
+                _registered_method=True)
         self.GetSentMessages = channel.unary_unary(
                 '/chat.ChatService/GetSentMessages',
                 request_serializer=chat__pb2.GetMessagesRequest.SerializeToString,
@@ -74,6 +84,11 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.GetMessageRequest.SerializeToString,
                 response_deserializer=chat__pb2.GetMessageResponse.FromString,
                 _registered_method=True)
+        self.GetMessagesByMid = channel.unary_unary(
+                '/chat.ChatService/GetMessagesByMid',
+                request_serializer=chat__pb2.GetMessagesByMidRequest.SerializeToString,
+                response_deserializer=chat__pb2.GetMessagesByMidResponse.FromString,
+                _registered_method=True)
         self.MarkMessageRead = channel.unary_unary(
                 '/chat.ChatService/MarkMessageRead',
                 request_serializer=chat__pb2.MarkMessageReadRequest.SerializeToString,
@@ -84,26 +99,51 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.DeleteMessagesRequest.SerializeToString,
                 response_deserializer=chat__pb2.DeleteMessagesResponse.FromString,
                 _registered_method=True)
+        self.SyncMailbox = channel.unary_unary(
+                '/chat.ChatService/SyncMailbox',
+                request_serializer=chat__pb2.SyncMailboxRequest.SerializeToString,
+                response_deserializer=chat__pb2.SyncMailboxResponse.FromString,
+                _registered_method=True)
+        self.Session = channel.stream_stream(
+                '/chat.ChatService/Session',
+                request_serializer=chat__pb2.SessionRequest.SerializeToString,
+                response_deserializer=chat__pb2.SessionResponse.FromString,
+                _registered_method=True)
         self.RegisterReplica = channel.unary_unary(
                 '/chat.ChatService/RegisterReplica',
                 request_serializer=chat__pb2.RegisterReplicaRequest.SerializeToString,
                 response_deserializer=chat__pb2.RegisterReplicaResponse.FromString,
                 _registered_method=True)
-        self.SyncMessagesFromLeader = channel.unary_unary(
-                '/chat.ChatService/SyncMessagesFromLeader',
-                request_serializer=chat__pb2.MessageSyncRequest.SerializeToString,
-                response_deserializer=chat__pb2.MessageSyncResponse.FromString,
-                _registered_method=True)
-        self.SyncUsersFromLeader = channel.unary_unary(
-                '/chat.ChatService/SyncUsersFromLeader',
-                request_serializer=chat__pb2.UserSyncRequest.SerializeToString,
-                response_deserializer=chat__pb2.UserSyncResponse.FromString,
-                _registered_method=True)
         self.SyncReplicaListFromLeader = channel.unary_unary(
                 '/chat.ChatService/SyncReplicaListFromLeader',
                 request_serializer=chat__pb2.ReplicaListSyncRequest.SerializeToString,
                 response_deserializer=chat__pb2.ReplicaListSyncResponse.FromString,
                 _registered_method=True)
+        self.ApplyOperations = channel.unary_unary(
+                '/chat.ChatService/ApplyOperations',
+                request_serializer=chat__pb2.OperationBatch.SerializeToString,
+                response_deserializer=chat__pb2.ApplyOperationsResponse.FromString,
+                _registered_method=True)
+        self.InstallSnapshot = channel.stream_unary(
+                '/chat.ChatService/InstallSnapshot',
+                request_serializer=chat__pb2.SnapshotChunk.SerializeToString,
+                response_deserializer=chat__pb2.InstallSnapshotResponse.FromString,
+                _registered_method=True)
+        self.SnapshotProgress = channel.unary_unary(
+                '/chat.ChatService/SnapshotProgress',
+                request_serializer=chat__pb2.SnapshotProgressRequest.SerializeToString,
+                response_deserializer=chat__pb2.SnapshotProgressResponse.FromString,
+                _registered_method=True)
+        self.CompareRanges = channel.unary_unary(
+                '/chat.ChatService/CompareRanges',
+                request_serializer=chat__pb2.RangeHashRequest.SerializeToString,
+                response_deserializer=chat__pb2.RangeHashResponse.FromString,
+                _registered_method=True)
+        self.RepairRanges = channel.unary_unary(
+                '/chat.ChatService/RepairRanges',
+                request_serializer=chat__pb2.RangeRepairRequest.SerializeToString,
+                response_deserializer=chat__pb2.RangeRepairResponse.FromString,
+                _registered_method=True)
         self.Heartbeat = channel.unary_unary(
                 '/chat.ChatService/Heartbeat',
                 request_serializer=chat__pb2.HeartbeatRequest.SerializeToString,
@@ -119,6 +159,16 @@ class ChatServiceStub(object):
                 request_serializer=chat__pb2.Empty.SerializeToString,
                 response_deserializer=chat__pb2.ReplicaListResponse.FromString,
                 _registered_method=True)
+        self.GetServerStats = channel.unary_unary(
+                '/chat.ChatService/GetServerStats',
+                request_serializer=chat__pb2.Empty.SerializeToString,
+                response_deserializer=chat__pb2.ServerStatsResponse.FromString,
+                _registered_method=True)
+        self.DeliverMessages = channel.unary_unary(
+                '/chat.ChatService/DeliverMessages',
+                request_serializer=chat__pb2.DeliverMessagesRequest.SerializeToString,
+                response_deserializer=chat__pb2.DeliverMessagesResponse.FromString,
+                _registered_method=True)
 
 
 class ChatServiceServicer(object):
@@ -139,6 +189,13 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Bootstrap(self, request, context):
+        """Everything the home page needs right after login
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def DeleteAccount(self, request, context):
         """Account flow
         """
@@ -159,6 +216,13 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SendMessages(self, request, context):
+        """Every text to every recipient in one batch
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def GetSentMessages(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -177,6 +241,13 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetMessagesByMid(self, request, context):
+        """Batch fetch
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def MarkMessageRead(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -189,6 +260,21 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def SyncMailbox(self, request, context):
+        """Mailbox changes since a client-held version
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Session(self, request_iterator, context):
+        """Session flow
+        One long-lived stream multiplexing a client's operations
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def RegisterReplica(self, request, context):
         """Replicas
         """
@@ -196,20 +282,43 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
-    def SyncMessagesFromLeader(self, request, context):
+    def SyncReplicaListFromLeader(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
-    def SyncUsersFromLeader(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+    def ApplyOperations(self, request, context):
+        """Leader's writes since the replica's last applied seq
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
-    def SyncReplicaListFromLeader(self, request, context):
-        """Missing associated documentation comment in .proto file."""
+    def InstallSnapshot(self, request_iterator, context):
+        """Leader's full state in bounded chunks
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def SnapshotProgress(self, request, context):
+        """Where an interrupted InstallSnapshot resumes
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def CompareRanges(self, request, context):
+        """Hash tree nodes, to find the key ranges a replica differs in
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RepairRanges(self, request, context):
+        """Leader's records in the key ranges that differ
+        """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
@@ -233,6 +342,22 @@ class ChatServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetServerStats(self, request, context):
+        """Admin
+        Runtime counters for monitoring
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def DeliverMessages(self, request, context):
+        """Shards
+        Sender's shard -> receiver's shard
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_ChatServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -246,6 +371,11 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.LoginPasswordRequest.FromString,
                     response_serializer=chat__pb2.LoginPasswordResponse.SerializeToString,
             ),
+            'Bootstrap': grpc.unary_unary_rpc_method_handler(
+                    servicer.Bootstrap,
+                    request_deserializer=chat__pb2.BootstrapRequest.FromString,
+                    response_serializer=chat__pb2.BootstrapResponse.SerializeToString,
+            ),
             'DeleteAccount': grpc.unary_unary_rpc_method_handler(
                     servicer.DeleteAccount,
                     request_deserializer=chat__pb2.DeleteAccountRequest.FromString,
@@ -261,6 +391,11 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.SendMessageRequest.FromString,
                     response_serializer=chat__pb2.SendMessageResponse.SerializeToString,
             ),
+            'SendMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.SendMessages,
+                    request_deserializer=chat__pb2.SendMessagesRequest.FromString,
+                    response_serializer=chat__pb2.SendMessagesResponse.SerializeToString,
+            ),
             'GetSentMessages': grpc.unary_unary_rpc_method_handler(
                     servicer.GetSentMessages,
                     request_deserializer=chat__pb2.GetMessagesRequest.FromString,
@@ -276,6 +411,11 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.GetMessageRequest.FromString,
                     response_serializer=chat__pb2.GetMessageResponse.SerializeToString,
             ),
+            'GetMessagesByMid': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetMessagesByMid,
+                    request_deserializer=chat__pb2.GetMessagesByMidRequest.FromString,
+                    response_serializer=chat__pb2.GetMessagesByMidResponse.SerializeToString,
+            ),
             'MarkMessageRead': grpc.unary_unary_rpc_method_handler(
                     servicer.MarkMessageRead,
                     request_deserializer=chat__pb2.MarkMessageReadRequest.FromString,
@@ -286,26 +426,51 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.DeleteMessagesRequest.FromString,
                     response_serializer=chat__pb2.DeleteMessagesResponse.SerializeToString,
             ),
+            'SyncMailbox': grpc.unary_unary_rpc_method_handler(
+                    servicer.SyncMailbox,
+                    request_deserializer=chat__pb2.SyncMailboxRequest.FromString,
+                    response_serializer=chat__pb2.SyncMailboxResponse.SerializeToString,
+            ),
+            'Session': grpc.stream_stream_rpc_method_handler(
+                    servicer.Session,
+                    request_deserializer=chat__pb2.SessionRequest.FromString,
+                    response_serializer=chat__pb2.SessionResponse.SerializeToString,
+            ),
             'RegisterReplica': grpc.unary_unary_rpc_method_handler(
                     servicer.RegisterReplica,
                     request_deserializer=chat__pb2.RegisterReplicaRequest.FromString,
                     response_serializer=chat__pb2.RegisterReplicaResponse.SerializeToString,
             ),
-            'SyncMessagesFromLeader': grpc.unary_unary_rpc_method_handler(
-                    servicer.SyncMessagesFromLeader,
-                    request_deserializer=chat__pb2.MessageSyncRequest.FromString,
-                    response_serializer=chat__pb2.MessageSyncResponse.SerializeToString,
-            ),
-            'SyncUsersFromLeader': grpc.unary_unary_rpc_method_handler(
-                    servicer.SyncUsersFromLeader,
-                    request_deserializer=chat__pb2.UserSyncRequest.FromString,
-                    response_serializer=chat__pb2.UserSyncResponse.SerializeToString,
-            ),
             'SyncReplicaListFromLeader': grpc.unary_unary_rpc_method_handler(
                     servicer.SyncReplicaListFromLeader,
                     request_deserializer=chat__pb2.ReplicaListSyncRequest.FromString,
                     response_serializer=chat__pb2.ReplicaListSyncResponse.SerializeToString,
             ),
+            'ApplyOperations': grpc.unary_unary_rpc_method_handler(
+                    servicer.ApplyOperations,
+                    request_deserializer=chat__pb2.OperationBatch.FromString,
+                    response_serializer=chat__pb2.ApplyOperationsResponse.SerializeToString,
+            ),
+            'InstallSnapshot': grpc.stream_unary_rpc_method_handler(
+                    servicer.InstallSnapshot,
+                    request_deserializer=chat__pb2.SnapshotChunk.FromString,
+                    response_serializer=chat__pb2.InstallSnapshotResponse.SerializeToString,
+            ),
+            'SnapshotProgress': grpc.unary_unary_rpc_method_handler(
+                    servicer.SnapshotProgress,
+                    request_deserializer=chat__pb2.SnapshotProgressRequest.FromString,
+                    response_serializer=chat__pb2.SnapshotProgressResponse.SerializeToString,
+            ),
+            'CompareRanges': grpc.unary_unary_rpc_method_handler(
+                    servicer.CompareRanges,
+                    request_deserializer=chat__pb2.RangeHashRequest.FromString,
+                    response_serializer=chat__pb2.RangeHashResponse.SerializeToString,
+            ),
+            'RepairRanges': grpc.unary_unary_rpc_method_handler(
+                    servicer.RepairRanges,
+                    request_deserializer=chat__pb2.RangeRepairRequest.FromString,
+                    response_serializer=chat__pb2.RangeRepairResponse.SerializeToString,
+            ),
             'Heartbeat': grpc.unary_unary_rpc_method_handler(
                     servicer.Heartbeat,
                     request_deserializer=chat__pb2.HeartbeatRequest.FromString,
@@ -321,6 +486,16 @@ def add_ChatServiceServicer_to_server(servicer, server):
                     request_deserializer=chat__pb2.Empty.FromString,
                     response_serializer=chat__pb2.ReplicaListResponse.SerializeToString,
             ),
+            'GetServerStats': grpc.unary_unary_rpc_method_handler(
+                    servicer.GetServerStats,
+                    request_deserializer=chat__pb2.Empty.FromString,
+                    response_serializer=chat__pb2.ServerStatsResponse.SerializeToString,
+            ),
+            'DeliverMessages': grpc.unary_unary_rpc_method_handler(
+                    servicer.DeliverMessages,
+                    request_deserializer=chat__pb2.DeliverMessagesRequest.FromString,
+                    response_serializer=chat__pb2.DeliverMessagesResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'chat.ChatService', rpc_method_handlers)
@@ -386,6 +561,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def Bootstrap(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/Bootstrap',
+            chat__pb2.BootstrapRequest.SerializeToString,
+            chat__pb2.BootstrapResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def DeleteAccount(request,
             target,
@@ -467,6 +669,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def SendMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/SendMessages',
+            chat__pb2.SendMessagesRequest.SerializeToString,
+            chat__pb2.SendMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def GetSentMessages(request,
             target,
@@ -548,6 +777,33 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def GetMessagesByMid(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/GetMessagesByMid',
+            chat__pb2.GetMessagesByMidRequest.SerializeToString,
+            chat__pb2.GetMessagesByMidResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def MarkMessageRead(request,
             target,
@@ -602,6 +858,60 @@ class ChatService(object):
             metadata,
             _registered_method=True)
 
+    @staticmethod
+    def SyncMailbox(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/SyncMailbox',
+            chat__pb2.SyncMailboxRequest.SerializeToString,
+            chat__pb2.SyncMailboxResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Session(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/chat.ChatService/Session',
+            chat__pb2.SessionRequest.SerializeToString,
+            chat__pb2.SessionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
     @staticmethod
     def RegisterReplica(request,
             target,
@@ -630,7 +940,7 @@ class ChatService(object):
             _registered_method=True)
 
     @staticmethod
-    def SyncMessagesFromLeader(request,
+    def SyncReplicaListFromLeader(request,
             target,
             options=(),
             channel_credentials=None,
@@ -643,9 +953,9 @@ class ChatService(object):
         return grpc.experimental.unary_unary(
             request,
             target,
-            '/chat.ChatService/SyncMessagesFromLeader',
-            chat__pb2.MessageSyncRequest.SerializeToString,
-            chat__pb2.MessageSyncResponse.FromString,
+            '/chat.ChatService/SyncReplicaListFromLeader',
+            chat__pb2.ReplicaListSyncRequest.SerializeToString,
+            chat__pb2.ReplicaListSyncResponse.FromString,
             options,
             channel_credentials,
             insecure,
@@ -657,7 +967,7 @@ class ChatService(object):
             _registered_method=True)
 
     @staticmethod
-    def SyncUsersFromLeader(request,
+    def ApplyOperations(request,
             target,
             options=(),
             channel_credentials=None,
@@ -670,9 +980,9 @@ class ChatService(object):
         return grpc.experimental.unary_unary(
             request,
             target,
-            '/chat.ChatService/SyncUsersFromLeader',
-            chat__pb2.UserSyncRequest.SerializeToString,
-            chat__pb2.UserSyncResponse.FromString,
+            '/chat.ChatService/ApplyOperations',
+            chat__pb2.OperationBatch.SerializeToString,
+            chat__pb2.ApplyOperationsResponse.FromString,
             options,
             channel_credentials,
             insecure,
@@ -684,7 +994,34 @@ class ChatService(object):
             _registered_method=True)
 
     @staticmethod
-    def SyncReplicaListFromLeader(request,
+    def InstallSnapshot(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_unary(
+            request_iterator,
+            target,
+            '/chat.ChatService/InstallSnapshot',
+            chat__pb2.SnapshotChunk.SerializeToString,
+            chat__pb2.InstallSnapshotResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def SnapshotProgress(request,
             target,
             options=(),
             channel_credentials=None,
@@ -697,9 +1034,63 @@ class ChatService(object):
         return grpc.experimental.unary_unary(
             request,
             target,
-            '/chat.ChatService/SyncReplicaListFromLeader',
-            chat__pb2.ReplicaListSyncRequest.SerializeToString,
-            chat__pb2.ReplicaListSyncResponse.FromString,
+            '/chat.ChatService/SnapshotProgress',
+            chat__pb2.SnapshotProgressRequest.SerializeToString,
+            chat__pb2.SnapshotProgressResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def CompareRanges(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/CompareRanges',
+            chat__pb2.RangeHashRequest.SerializeToString,
+            chat__pb2.RangeHashResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def RepairRanges(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/RepairRanges',
+            chat__pb2.RangeRepairRequest.SerializeToString,
+            chat__pb2.RangeRepairResponse.FromString,
             options,
             channel_credentials,
             insecure,
@@ -790,3 +1181,57 @@ class ChatService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def GetServerStats(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/GetServerStats',
+            chat__pb2.Empty.SerializeToString,
+            chat__pb2.ServerStatsResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def DeliverMessages(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/chat.ChatService/DeliverMessages',
+            chat__pb2.DeliverMessagesRequest.SerializeToString,
+            chat__pb2.DeliverMessagesResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -2,6 +2,8 @@ import tkinter as tk
 from tkinter import messagebox, Scrollbar
 import grpc
 from controller import client_login, communication, client_messages, accounts
+from controller.session import ChatSession
+from controller.read_balancer import ReadBalancer
 from datetime import datetime
 import sys
 import argparse
@@ -11,6 +13,7 @@ import chat_pb2
 import chat_pb2_grpc
 import configparser
 import hashlib
+import threading
 
 # Load config
 config = configparser.ConfigParser()
@@ -20,6 +23,7 @@ config.read("config.ini")
 parser = argparse.ArgumentParser(description="Start the Chat Client with optional parameters.")
 parser.add_argument("--server-address", type=str, default="10.250.248.221:60000", help="Specify the server IP address")
 parser.add_argument("--poll-frequency", type=int, default=5000, help="Set the polling frequency in milliseconds")
+parser.add_argument("--use-session", action="store_true", help="Multiplex all operations over one streaming session after login")
 
 args = parser.parse_args()
 
@@ -27,13 +31,14 @@ args = parser.parse_args()
 SERVER_ADDRESS = args.server_address
 HOST, PORT = SERVER_ADDRESS.split(":")
 POLL_FREQUENCY = args.poll_frequency if args.poll_frequency else 10000  # Default to 10s polling
+SESSION_EVENT_FREQUENCY = 200  # How often (ms) the UI checks for mailbox events pushed over the session
 
 def hash_password(password):
     """Hashes a password using SHA-256 before sending to the server."""
     return hashlib.sha256(password.encode()).hexdigest()
 
 class ChatApp:
-    def __init__(self, root, leader_address):
+    def __init__(self, root, leader_address, use_session=False):
         self.root = root
         self.root.title("Message App")
         self.root.geometry("600x400")
@@ -47,6 +52,8 @@ class ChatApp:
         self.selected_recipient = tk.StringVar()  # Store selected recipient for new messages
         self.received_message_cache = {}  # Cache for received messages (key: mid, value: message object)
         self.sent_message_cache = {}  # Cache for sent messages (key: mid, value: message object)
+        self.mailbox_version = 0  # Last received mailbox version synced from the server
+        self.mailbox_epoch = ""  # Server epoch the mailbox version belongs to
 
         self.displayed_mids = set()  # Tracks messages currently displayed in the UI
         # Counters
@@ -54,6 +61,11 @@ class ChatApp:
         self.unfetched_unread_count = 0
         self.leader_address = leader_address
         self.replica_list = [self.leader_address]
+        self.read_balancer = ReadBalancer(self.leader_address)  # Spreads reads over the leader and replicas
+        self.use_session = use_session
+        self.session = None  # Streaming session carrying operations once logged in
+        self.mailbox_event_pending = threading.Event()  # Set by the session thread when the server pushes a mailbox change
+        self.bootstrapped = False  # True while the caches hold the Bootstrap page and have not been refetched
 
         self.create_login_screen()
 
@@ -83,10 +95,8 @@ class ChatApp:
             messagebox.showerror("Error", "Username cannot contain commas.")
             return
 
-        with grpc.insecure_channel(self.leader_address) as channel:
-            stub = chat_pb2_grpc.ChatServiceStub(channel)
-            request = chat_pb2.LoginUsernameRequest(username=username)
-            response = stub.LoginUsername(request)
+        request = chat_pb2.LoginUsernameRequest(username=username)
+        response = communication.unary_call(self.leader_address, "LoginUsername", request)
 
         self.user_exists = response.user_exists
         self.create_password_screen()
@@ -117,21 +127,65 @@ class ChatApp:
         username = self.username.get()
         hashed_password = hash_password(password)
 
-        with grpc.insecure_channel(self.leader_address) as channel:
-            stub = chat_pb2_grpc.ChatServiceStub(channel)
-            request = chat_pb2.LoginPasswordRequest(username=username, password=hashed_password)
-            
-            try:
-                response = stub.LoginPassword(request)
-                if response.success:
-                    self.client_uid = response.uid
-                    messagebox.showinfo("Success", "Login successful!")
-                    self.load_home_page()
-                else:
-                    messagebox.showerror("Error", "Incorrect password.")
-            except grpc.RpcError as e:
-                print("GRPC ERROR", e.details())
-                messagebox.showerror("Error", "Login failed. Please check your credentials.")
+        request = chat_pb2.LoginPasswordRequest(username=username, password=hashed_password)
+
+        try:
+            response = communication.unary_call(self.leader_address, "LoginPassword", request)
+            if response.success:
+                self.client_uid = response.uid
+                messagebox.showinfo("Success", "Login successful!")
+                self.bootstrap_inbox()
+                self.open_session()
+                self.load_home_page()
+            else:
+                messagebox.showerror("Error", "Incorrect password.")
+        except grpc.RpcError as e:
+            print("GRPC ERROR", e.details())
+            messagebox.showerror("Error", "Login failed. Please check your credentials.")
+
+    def bootstrap_inbox(self):
+        """Seeds the message caches, unread counter and replica list from a single Bootstrap call."""
+        summary = communication.bootstrap(self.leader_address, self.client_uid)
+        self.leader_address = summary["leader_address"]
+        self.replica_list = summary["replica_list"]
+        self.read_balancer.update(self.leader_address, self.replica_list)
+        self.received_message_cache = {message["mid"]: message for message in summary["received_messages"]}
+        self.sent_message_cache = {message["mid"]: message for message in summary["sent_messages"]}
+        self.total_unread_count = summary["unread_count"]
+
+        # If the first page held the whole mailbox the next sync can be a delta, otherwise it fills in the rest
+        if summary["total_received"] == len(summary["received_messages"]):
+            self.mailbox_version = summary["mailbox_version"]
+            self.mailbox_epoch = summary["mailbox_epoch"]
+        else:
+            self.mailbox_epoch = ""
+        self.bootstrapped = True
+
+    def open_session(self):
+        """Opens the streaming session to the leader if sessions are enabled."""
+        if not self.use_session:
+            return
+        first_session = self.session is None
+        if self.session is not None:
+            self.session.close()
+        try:
+            self.session = ChatSession(self.leader_address, self.client_uid, on_event=lambda event: self.mailbox_event_pending.set(),
+                                       compression=communication.channel_compression(communication.COMPRESSION),
+                                       options=communication.CHANNEL_OPTIONS)
+            self.session_leader_address = self.leader_address
+            if first_session:
+                self.root.after(SESSION_EVENT_FREQUENCY, self.check_session_events)
+        except grpc.RpcError as e:
+            print("Could not open session, falling back to unary calls:", e)
+            self.session = None
+
+    def check_session_events(self):
+        """Syncs the received mailbox as soon as the server pushes a change, instead of waiting for the next poll."""
+        if self.mailbox_event_pending.is_set():
+            self.mailbox_event_pending.clear()
+            if self.current_page == "received":
+                self.sync_received_messages()
+        self.root.after(SESSION_EVENT_FREQUENCY, self.check_session_events)
 
     def load_home_page(self):
         """Loads the main page after successful login."""
@@ -141,7 +195,8 @@ class ChatApp:
         self.home_frame = tk.Frame(self.root)
         self.home_frame.pack(fill=tk.BOTH, expand=True)
         
-        self.load_received_messages()  # Default page
+        self.load_received_messages(from_bootstrap=self.bootstrapped)  # Default page
+        self.bootstrapped = False
 
     def create_nav_buttons(self):
         """Creates persistent navigation buttons."""
@@ -162,7 +217,7 @@ class ChatApp:
 
     def delete_account(self):
         """Deletes the user account and closes the application."""
-        response = communication.delete_account(self.leader_address, self.client_uid)
+        response = communication.delete_account(self.leader_address, self.client_uid, session=self.session, balancer=self.read_balancer)
         if response["success"]:
             messagebox.showinfo("Success", "Account successfully deleted. Closing application.")
             self.root.quit()  # Close the entire Tkinter app
@@ -193,7 +248,7 @@ class ChatApp:
 
         tk.Button(search_frame, text="List", command=self.list_accounts).pack(side=tk.LEFT)
 
-        self.recipient_listbox = tk.Listbox(self.root, height=5)
+        self.recipient_listbox = tk.Listbox(self.root, height=5, selectmode=tk.EXTENDED)  # Shift/ctrl-click to pick several recipients
         self.recipient_listbox.pack(pady=5, expand=True, fill=tk.BOTH)
 
         scrollbar = Scrollbar(self.root)
@@ -215,19 +270,19 @@ class ChatApp:
     def list_accounts(self):
         """Fetches and displays accounts based on wildcard search."""
         wildcard = self.search_entry.get().strip() or "*"
-        response = communication.list_accounts(self.leader_address, wildcard)
+        response = communication.list_accounts(self.leader_address, wildcard, session=self.session, balancer=self.read_balancer)
         self.recipient_listbox.delete(0, tk.END)
         for account in response["accounts"]:
             self.recipient_listbox.insert(tk.END, account)
 
     def send_message(self):
-        """Sends a message to the selected recipient with a 280-character limit."""
-        selected_index = self.recipient_listbox.curselection()
-        if not selected_index:
+        """Sends a message to the selected recipients with a 280-character limit."""
+        selected_indices = self.recipient_listbox.curselection()
+        if not selected_indices:
             messagebox.showerror("Error", "Please select a recipient.")
             return
 
-        recipient = self.recipient_listbox.get(selected_index)
+        recipients = [self.recipient_listbox.get(index) for index in selected_indices]
         message_text = self.message_entry.get("1.0", tk.END).strip()
 
         if not message_text:
@@ -238,8 +293,16 @@ class ChatApp:
             messagebox.showerror("Error", "Message exceeds 280 characters.")
             return
 
-        communication.send_message(self.leader_address, self.client_uid, recipient, message_text, str(datetime.now()))
-        
+        if len(recipients) == 1:
+            communication.send_message(self.leader_address, self.client_uid, recipients[0], message_text, str(datetime.now()), session=self.session, balancer=self.read_balancer)
+        else:
+            # One request for all recipients instead of one per recipient
+            response = communication.send_messages(self.leader_address, self.client_uid, recipients, [message_text], str(datetime.now()), session=self.session, balancer=self.read_balancer)
+            failed = [recipient for recipient, success in response["results"].items() if not success]
+            if failed:
+                messagebox.showerror("Error", f"Message could not be sent to: {', '.join(failed)}")
+                return
+
         messagebox.showinfo("Success", "Message sent successfully!")
         self.load_received_messages()
 
@@ -248,45 +311,60 @@ class ChatApp:
         # Initially get the replica list from the known leader            
         for replica in self.replica_list:
             try:
-                with grpc.insecure_channel(replica) as channel:
-                    stub = chat_pb2_grpc.ChatServiceStub(channel)
-                    response = stub.GetReplicaList(chat_pb2.Empty())
-                    # Update leader address and replica list from what the response said
-                    self.leader_address = response.leader_address
-                    self.replica_list = list(response.replica_list)
-                    print(f"Got info from {replica}, leader:", self.leader_address, self.replica_list)
-                    break
+                response = communication.unary_call(replica, "GetReplicaList", chat_pb2.Empty())
+                # Update leader address and replica list from what the response said
+                self.leader_address = response.leader_address
+                self.replica_list = list(response.replica_list)
+                self.read_balancer.update(self.leader_address, self.replica_list)
+                print(f"Got info from {replica}, leader:", self.leader_address, self.replica_list)
+                break
             except grpc.RpcError as e:
                 print(f"{replica} not reachable")
                 continue
 
+        # Reopen the session if the leader changed
+        if self.session is not None and self.session_leader_address != self.leader_address:
+            self.open_session()
+
         if self.current_page == "received":
-            response = communication.get_messages(self.leader_address, self.client_uid, True)
-            mids = response["mids"]
+            self.sync_received_messages()
 
-            # Remove messages from cache that no longer exist on server
-            cached_mids = set(self.received_message_cache.keys())
-            server_mids = set(mids)
+        self.root.after(POLL_FREQUENCY, self.poll_for_new_messages)
 
-            for mid in cached_mids - server_mids:
-                del self.received_message_cache[mid]
-                self.displayed_mids.discard(mid)  # Remove from displayed tracking
+    def sync_received_messages(self):
+        """Applies the received mailbox changes since the last sync to the cache and unread counters."""
+        # Only download what changed since the last poll
+        changes = communication.sync_mailbox(self.leader_address, self.client_uid, self.mailbox_version, self.mailbox_epoch, session=self.session, balancer=self.read_balancer)
+        self.mailbox_version = changes["version"]
+        self.mailbox_epoch = changes["epoch"]
 
-            # Fetch new messages
-            new_mids = [mid for mid in mids if mid not in self.received_message_cache]
-            for mid in new_mids:
-                self.received_message_cache[mid] = communication.get_message_by_mid(self.leader_address, mid)
+        if changes["full_sync"]:
+            # Server could not compute a delta, so remove messages from cache that no longer exist on server
+            removed_mids = set(self.received_message_cache.keys()) - set(changes["added_mids"])
+        else:
+            removed_mids = changes["removed_mids"]
 
-            # Update unread message counters correctly
-            self.total_unread_count = sum(1 for msg in self.received_message_cache.values() if not msg["receiver_read"])
-            
-            # Unfetched count should track messages that are unread but not yet displayed
-            self.unfetched_unread_count = sum(1 for mid in mids if mid not in self.displayed_mids and not self.received_message_cache[mid]["receiver_read"])
-            self.unread_label.config(text=f"{self.total_unread_count} unread messages ({self.unfetched_unread_count} unfetched)")
+        for mid in removed_mids:
+            self.received_message_cache.pop(mid, None)
+            self.displayed_mids.discard(mid)  # Remove from displayed tracking
 
-        self.root.after(POLL_FREQUENCY, self.poll_for_new_messages)
+        for mid in changes["read_mids"]:
+            if mid in self.received_message_cache:
+                self.received_message_cache[mid]["receiver_read"] = True
 
-    def load_received_messages(self):
+        # Fetch new messages without their bodies, which are only needed once displayed
+        new_mids = [mid for mid in changes["added_mids"] if mid not in self.received_message_cache]
+        self.received_message_cache.update(communication.get_messages_by_mid(self.leader_address, new_mids, session=self.session, balancer=self.read_balancer, fields=communication.METADATA_FIELDS))
+        mids = list(self.received_message_cache.keys())
+
+        # Update unread message counters correctly
+        self.total_unread_count = sum(1 for msg in self.received_message_cache.values() if not msg["receiver_read"])
+        
+        # Unfetched count should track messages that are unread but not yet displayed
+        self.unfetched_unread_count = sum(1 for mid in mids if mid not in self.displayed_mids and not self.received_message_cache[mid]["receiver_read"])
+        self.unread_label.config(text=f"{self.total_unread_count} unread messages ({self.unfetched_unread_count} unfetched)")
+
+    def load_received_messages(self, from_bootstrap=False):
         """Fetch and display only read messages. Resets fetch tracking when switching to 'Received'."""
         print("load_received_messages")
         self.clear_screen()
@@ -300,22 +378,24 @@ class ChatApp:
         # **Reset tracking every time the user switches to Received**
         self.displayed_mids.clear()
 
-        # Fetch all received message IDs
-        response = communication.get_messages(self.leader_address, self.client_uid, True)
-        mids = response["mids"]
+        if not from_bootstrap:
+            # Fetch all received message IDs
+            response = communication.get_messages(self.leader_address, self.client_uid, True, session=self.session, balancer=self.read_balancer)
+            mids = response["mids"]
 
-        # Reset caches to ensure fresh data is stored
-        self.received_message_cache.clear()
+            # Reset caches to ensure fresh data is stored
+            self.received_message_cache.clear()
+            self.mailbox_epoch = ""  # Next poll starts over with a full sync
 
-        # Fetch messages by MID and store them in the cache
-        for mid in mids:
-            self.received_message_cache[mid] = communication.get_message_by_mid(self.leader_address, mid)
+            # Fetch message metadata by MID and store it in the cache
+            self.received_message_cache.update(communication.get_messages_by_mid(self.leader_address, mids, session=self.session, balancer=self.read_balancer, fields=communication.METADATA_FIELDS))
 
         # Sort messages by timestamp (latest first)
         sorted_messages = sorted(self.received_message_cache.values(), key=lambda x: x["timestamp"], reverse=True)
 
         # **Correctly update unread message counters**
-        self.total_unread_count = sum(1 for msg in sorted_messages if not msg["receiver_read"])
+        if not from_bootstrap:  # Bootstrap already reported the count for the whole mailbox
+            self.total_unread_count = sum(1 for msg in sorted_messages if not msg["receiver_read"])
         self.unfetched_unread_count = self.total_unread_count  # Ensure fetch count resets correctly
 
         # UI Controls for fetching unread messages
@@ -366,12 +446,16 @@ class ChatApp:
         canvas.itemconfig(canvas_frame, width=messages_container.winfo_width())
 
         # **Show only read messages initially**
-        for message in sorted_messages:
-            if message["receiver_read"]:
-                self.display_message(self.messages_frame, message, received=True)
-
-        # Ensure polling continues
-        self.poll_for_new_messages()
+        read_messages = [message for message in sorted_messages if message["receiver_read"]]
+        self.fill_message_texts(read_messages)
+        for message in read_messages:
+            self.display_message(self.messages_frame, message, received=True)
+
+        # Ensure polling continues, after the first page is on screen when coming from Bootstrap
+        if from_bootstrap:
+            self.root.after_idle(self.poll_for_new_messages)
+        else:
+            self.poll_for_new_messages()
 
     def fetch_unread_messages(self):
         """Fetches unread messages and displays them, while ensuring proper tracking."""
@@ -382,13 +466,12 @@ class ChatApp:
             return
 
         # **Refetch received messages to ensure up-to-date data**
-        response = communication.get_messages(self.leader_address, self.client_uid, True)
+        response = communication.get_messages(self.leader_address, self.client_uid, True, session=self.session, balancer=self.read_balancer)
         mids = response["mids"]
 
         # **Ensure message cache is up-to-date before fetching unread**
-        for mid in mids:
-            if mid not in self.received_message_cache:
-                self.received_message_cache[mid] = communication.get_message_by_mid(self.leader_address, mid)
+        missing_mids = [mid for mid in mids if mid not in self.received_message_cache]
+        self.received_message_cache.update(communication.get_messages_by_mid(self.leader_address, missing_mids, session=self.session, balancer=self.read_balancer, fields=communication.METADATA_FIELDS))
 
         # **Get only unread messages that are NOT already displayed**
         unread_messages = sorted(
@@ -397,6 +480,7 @@ class ChatApp:
         )
 
         messages_to_display = unread_messages[:num_to_fetch]
+        self.fill_message_texts(messages_to_display)
 
         if messages_to_display:
             for message in messages_to_display:
@@ -425,7 +509,7 @@ class ChatApp:
 
         tk.Button(control_frame, text="Delete Selected", command=self.delete_selected_messages, bg="red").pack(side=tk.RIGHT, padx=5)
 
-        response = communication.get_messages(self.leader_address, self.client_uid, False)
+        response = communication.get_messages(self.leader_address, self.client_uid, False, session=self.session, balancer=self.read_balancer)
         mids = response["mids"]
 
         new_messages = []
@@ -433,8 +517,7 @@ class ChatApp:
             if mid not in self.sent_message_cache:  # Only fetch new messages
                 new_messages.append(mid)
 
-        for mid in new_messages:
-            self.sent_message_cache[mid] = communication.get_message_by_mid(self.leader_address, mid)
+        self.sent_message_cache.update(communication.get_messages_by_mid(self.leader_address, new_messages, session=self.session, balancer=self.read_balancer))
 
         # Sort messages so newest appear first
         sorted_messages = sorted(self.sent_message_cache.values(), key=lambda x: x["timestamp"], reverse=True)
@@ -459,6 +542,15 @@ class ChatApp:
         for message in sorted_messages:
             self.display_message(self.messages_frame, message, received=False)
 
+    def fill_message_texts(self, messages):
+        """Fetches the bodies of cached messages that were fetched as metadata only."""
+        missing = {message["mid"]: message for message in messages if message["text"] is None}
+        if not missing:
+            return
+        fetched = communication.get_messages_by_mid(self.leader_address, list(missing), session=self.session, balancer=self.read_balancer, fields=["text"])
+        for mid, message in fetched.items():
+            missing[mid]["text"] = message["text"]
+
     def display_message(self, parent, message, received=True):
         """Displays a single message in the UI and tracks its ID for selective updates."""
         frame = tk.Frame(parent, bg="lightgray", padx=5, pady=5)
@@ -502,6 +594,7 @@ class ChatApp:
             widget.destroy()
 
         sorted_messages = sorted(messages, key=lambda x: x["timestamp"], reverse=True)
+        self.fill_message_texts(sorted_messages)
 
         for message in sorted_messages:
             self.display_message(self.messages_frame, message, received=(self.current_page == "received"))
@@ -512,7 +605,7 @@ class ChatApp:
             messagebox.showerror("Error", "No messages selected for deletion.")
             return
 
-        communication.delete_messages(self.leader_address, self.client_uid, list(self.selected_messages))
+        communication.delete_messages(self.leader_address, self.client_uid, list(self.selected_messages), session=self.session, balancer=self.read_balancer)
 
         # Remove from local cache
         for mid in self.selected_messages:
@@ -528,7 +621,7 @@ class ChatApp:
 
     def mark_message_read(self, mid):
         """Marks a message as read on both the client and server without refreshing everything."""
-        communication.mark_message_read(self.leader_address, mid)
+        communication.mark_message_read(self.leader_address, mid, session=self.session, balancer=self.read_balancer)
 
         if mid in self.received_message_cache:
             self.received_message_cache[mid]["receiver_read"] = True
@@ -563,5 +656,5 @@ if __name__ == "__main__":
         print(f"Starting ChatApp with default server from config: {HOST}:{PORT}")
     
     root = tk.Tk()
-    app = ChatApp(root, SERVER_ADDRESS)
+    app = ChatApp(root, SERVER_ADDRESS, use_session=args.use_session)
     root.mainloop()
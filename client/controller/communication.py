@@ -2,9 +2,23 @@ from utils import send_request, receive_response
 import sys
 import grpc
 import os
+import configparser
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 import chat_pb2
 import chat_pb2_grpc
+from grpc_config import load_compression_settings, compression_for, channel_compression, load_server_settings, channel_options
+from channel_pool import ChannelPool
+
+config = configparser.ConfigParser()
+config.read("config.ini")
+COMPRESSION = load_compression_settings(config)
+CHANNEL_OPTIONS = channel_options(load_server_settings(config))  # Message size limits must match the server's for bulk fetches
+CHANNEL_POOL = ChannelPool(CHANNEL_OPTIONS, channel_compression(COMPRESSION))  # One channel per server, reused by every call and thread
+READ_TIMEOUT = 2  # Seconds before a read fails over to another replica
+# Reads any replica can answer from its synced state
+READ_RPCS = {"GetMessageByMid", "GetMessagesByMid", "GetReceivedMessages", "GetSentMessages", "ListAccounts"}
+# Calls whose responses carry the commit_seq later reads must see: writes, and mailbox syncs whose added messages are fetched next
+COMMIT_SEQ_RPCS = {"SendMessage", "SendMessages", "MarkMessageRead", "DeleteMessages", "DeleteAccount", "LoginPassword", "SyncMailbox"}
 
 def build_and_send_task(sock, task, use_wire_protocol, **kwargs):
     """
@@ -15,96 +29,174 @@ def build_and_send_task(sock, task, use_wire_protocol, **kwargs):
     send_request(sock, message, use_wire_protocol)
     return receive_response(sock, use_wire_protocol)
 
-def delete_messages(server_address, uid, mids):
+def call_rpc(server_address, method, request, session=None, balancer=None):
+    """
+    Makes a unary call. Reads go to the next healthy replica if there is a balancer, other calls
+    go over the open session if there is one, and everything else over the pooled channel to server_address.
+    """
+    if balancer is not None and method in READ_RPCS:
+        request.min_seq = balancer.min_seq  # Read at least this client's own writes
+        return balancer.call(lambda address: unary_call(address, method, request, timeout=READ_TIMEOUT))
+    if session is not None and session.supports(method):
+        response = session.call(method, request).result()
+    else:
+        response = unary_call(server_address, method, request)
+    if balancer is not None and method in COMMIT_SEQ_RPCS:
+        balancer.observe_commit(response.commit_seq)
+    return response
+
+def unary_call(server_address, method, request, timeout=None):
+    """Makes a unary call over the pooled channel to server_address."""
+    return CHANNEL_POOL.call(server_address, method, request, timeout=timeout, compression=compression_for(method, COMPRESSION))
+
+def delete_messages(server_address, uid, mids, session=None, balancer=None):
     """Sends a request to delete multiple messages for a user."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.DeleteMessagesRequest(uid=uid, mids=mids)
-        response = stub.DeleteMessages(request)
+    request = chat_pb2.DeleteMessagesRequest(uid=uid, mids=mids)
+    response = call_rpc(server_address, "DeleteMessages", request, session, balancer)
 
-        response_dict = dict()
-        response_dict["success"] = response.success
+    response_dict = dict()
+    response_dict["success"] = response.success
+    response_dict["commit_seq"] = response.commit_seq
 
-        return response_dict
+    return response_dict
 
-def send_message(server_address, sender, receiver_username, text, timestamp):
+def send_message(server_address, sender, receiver_username, text, timestamp, session=None, balancer=None):
     """Sends a message from one user to another via the server."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.SendMessageRequest(sender=sender, receiver_username=receiver_username, text=text, timestamp=timestamp)
-        response = stub.SendMessage(request)
+    request = chat_pb2.SendMessageRequest(sender=sender, receiver_username=receiver_username, text=text, timestamp=timestamp)
+    response = call_rpc(server_address, "SendMessage", request, session, balancer)
+
+    response_dict = dict()
+    response_dict["success"] = response.success
+    response_dict["commit_seq"] = response.commit_seq
+
+    return response_dict
 
-        response_dict = dict()
-        response_dict["success"] = response.success
+def send_messages(server_address, sender, receiver_usernames, texts, timestamp, session=None, balancer=None):
+    """Sends every text to every recipient in a single batched request."""
+    request = chat_pb2.SendMessagesRequest(sender=sender, receiver_usernames=receiver_usernames, texts=texts, timestamp=timestamp)
+    response = call_rpc(server_address, "SendMessages", request, session, balancer)
 
-        return response_dict
+    response_dict = dict()
+    response_dict["success"] = response.success
+    response_dict["commit_seq"] = response.commit_seq
+    response_dict["results"] = {result.receiver_username: result.success for result in response.results}
 
-def list_accounts(server_address, wildcard):
+    return response_dict
+
+def list_accounts(server_address, wildcard, session=None, balancer=None):
     """Requests a list of accounts matching a wildcard search."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.ListAccountsRequest(wildcard=wildcard)
-        response = stub.ListAccounts(request)
+    request = chat_pb2.ListAccountsRequest(wildcard=wildcard)
+    response = call_rpc(server_address, "ListAccounts", request, session, balancer)
+
+    response_dict = dict()
+    response_dict["accounts"] = response.accounts
 
-        response_dict = dict()
-        response_dict["accounts"] = response.accounts
+    return response_dict
 
-        return response_dict
-    
-def delete_account(server_address, uid):
+def delete_account(server_address, uid, session=None, balancer=None):
     """Sends a request to delete a user account."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.DeleteAccountRequest(uid=uid)
-        response = stub.DeleteAccount(request)
+    request = chat_pb2.DeleteAccountRequest(uid=uid)
+    response = call_rpc(server_address, "DeleteAccount", request, session, balancer)
+
+    response_dict = dict()
+    response_dict["success"] = response.success
+    response_dict["commit_seq"] = response.commit_seq
 
-        response_dict = dict()
-        response_dict["success"] = response.success
+    return response_dict
 
-        return response_dict
-    
-def mark_message_read(server_address, mid):
+def mark_message_read(server_address, mid, session=None, balancer=None):
     """Marks a specific message as read on the server."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.MarkMessageReadRequest(mid=mid)
-        response = stub.MarkMessageRead(request)
+    request = chat_pb2.MarkMessageReadRequest(mid=mid)
+    response = call_rpc(server_address, "MarkMessageRead", request, session, balancer)
 
-        response_dict = dict()
-        response_dict["success"] = response.success
+    response_dict = dict()
+    response_dict["success"] = response.success
+    response_dict["commit_seq"] = response.commit_seq
 
-        return response_dict
+    return response_dict
 
-def get_messages(server_address, client_uid, is_receive):
+def get_messages(server_address, client_uid, is_receive, session=None, balancer=None):
     """Retrieves a list of sent or received message IDs for a user."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.GetMessagesRequest(uid=client_uid)
-
-        response = stub.GetReceivedMessages(request)
-        if not is_receive:
-            response = stub.GetSentMessages(request)
-        
-        message = dict()
-        message["mids"] = response.mids
-
-        return message
-
-def get_message_by_mid(server_address, mid):
-    """Fetches the details of a message using its message ID."""
-    with grpc.insecure_channel(server_address) as channel:
-        stub = chat_pb2_grpc.ChatServiceStub(channel)
-        request = chat_pb2.GetMessageRequest(mid=mid)
-        response = stub.GetMessageByMid(request)
-
-        message = dict()
-        message["sender"] = response.sender_uid
-        message["receiver"] = response.receiver_uid
-        message["mid"] = mid
-        message["timestamp"] = response.timestamp
-        message["receiver_read"] = response.receiver_read
-        message["sender_username"] = response.sender_username
-        message["receiver_username"] = response.receiver_username
-        message["text"] = response.text
-        
-        return message
\ No newline at end of file
+    request = chat_pb2.GetMessagesRequest(uid=client_uid)
+    response = call_rpc(server_address, "GetReceivedMessages" if is_receive else "GetSentMessages", request, session, balancer)
+
+    message = dict()
+    message["mids"] = response.mids
+
+    return message
+
+def sync_mailbox(server_address, client_uid, since_version, epoch, session=None, balancer=None):
+    """Retrieves the changes to a user's received mailbox since a previously synced version."""
+    request = chat_pb2.SyncMailboxRequest(uid=client_uid, since_version=since_version, epoch=epoch)
+    response = call_rpc(server_address, "SyncMailbox", request, session, balancer)
+
+    changes = dict()
+    changes["version"] = response.version
+    changes["epoch"] = response.epoch
+    changes["full_sync"] = response.full_sync
+    changes["added_mids"] = list(response.added_mids)
+    changes["removed_mids"] = list(response.removed_mids)
+    changes["read_mids"] = list(response.read_mids)
+
+    return changes
+
+def message_data_to_dict(message_data):
+    """Converts a MessageData into the message dict cached by the client."""
+    return {field.name: getattr(message_data, field.name) for field in message_data.DESCRIPTOR.fields}
+
+def bootstrap(server_address, client_uid, page_size=0):
+    """Fetches the unread count, newest messages and replica list right after login in one round trip."""
+    request = chat_pb2.BootstrapRequest(uid=client_uid, page_size=page_size)
+    response = call_rpc(server_address, "Bootstrap", request)
+
+    summary = dict()
+    summary["unread_count"] = response.unread_count
+    summary["total_received"] = response.total_received
+    summary["total_sent"] = response.total_sent
+    summary["received_messages"] = [message_data_to_dict(message) for message in response.received_messages]
+    summary["sent_messages"] = [message_data_to_dict(message) for message in response.sent_messages]
+    summary["mailbox_version"] = response.mailbox_version
+    summary["mailbox_epoch"] = response.mailbox_epoch
+    summary["leader_address"] = response.leader_address
+    summary["replica_list"] = list(response.replica_list)
+
+    return summary
+
+def message_response_to_dict(mid, response):
+    """Converts a GetMessageResponse into the message dict cached by the client."""
+    message = dict()
+    message["sender"] = response.sender_uid
+    message["receiver"] = response.receiver_uid
+    message["mid"] = mid
+    message["timestamp"] = response.timestamp
+    message["receiver_read"] = response.receiver_read
+    message["sender_username"] = response.sender_username
+    message["receiver_username"] = response.receiver_username
+    message["text"] = response.text
+
+    return message
+
+# Everything but the body, enough for unread counts and ordering
+METADATA_FIELDS = ["sender", "receiver", "sender_username", "receiver_username", "timestamp", "receiver_read"]
+
+def get_message_by_mid(server_address, mid, session=None, fields=None, balancer=None):
+    """Fetches the details of a message using its message ID. fields are MessageData names, like METADATA_FIELDS; the rest come back as defaults."""
+    request = chat_pb2.GetMessageRequest(mid=mid, fields=fields or [])
+    response = call_rpc(server_address, "GetMessageByMid", request, session, balancer)
+    return message_response_to_dict(mid, response)
+
+def get_messages_by_mid(server_address, mids, session=None, fields=None, balancer=None):
+    """Fetches the details of several messages in one call. Texts not requested are set to None."""
+    if not mids:
+        return dict()
+    request = chat_pb2.GetMessagesByMidRequest(mids=mids, fields=fields or [])
+    response = call_rpc(server_address, "GetMessagesByMid", request, session, balancer)
+
+    messages = dict()
+    for message_data in response.messages:
+        message = message_data_to_dict(message_data)
+        if fields and "text" not in fields:
+            message["text"] = None  # Fetched later, only if the message is displayed
+        messages[message["mid"]] = message
+
+    return messages
@@ -0,0 +1,102 @@
+import grpc
+import threading
+import time
+
+# Errors that mean the server could not answer, so another replica may; anything else is the answer
+FAILOVER_CODES = (grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.DEADLINE_EXCEEDED)
+# Errors from a replica that the leader may not give: it is behind the session token, or lacks a message it has not applied
+REDIRECT_CODES = (grpc.StatusCode.FAILED_PRECONDITION, grpc.StatusCode.NOT_FOUND)
+
+class ReadBalancer:
+    """
+    Spreads read RPCs over the leader and its replicas in round robin order.
+
+    A server that fails a read is skipped for `cooldown` seconds and the read is retried on
+    the next server, so a crashed replica costs one failed call instead of every Nth read.
+
+    The balancer also holds the client's session token: the highest commit sequence of the
+    client's own writes and of the mailbox changes it has synced from the leader. Reads carry
+    it as min_seq so a replica that has not applied them yet waits or redirects the read to
+    the leader, and the client always reads its writes and the messages it was told about.
+    A replica that does not have a requested message redirects the read to the leader too.
+    """
+
+    def __init__(self, leader_address, replica_list=None, cooldown=5.0):
+        """
+        Initializes the balancer with the servers it may read from.
+
+        Parameters:
+        ----------
+        leader_address : str
+            The `ip:port` of the leader, used when no replica is healthy.
+        replica_list : list of str, optional
+            Every server that can serve reads, the leader included.
+        cooldown : float, optional
+            Seconds a server that failed a read is skipped for.
+        """
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.down_until = dict()  # address -> time.monotonic() until which it is skipped
+        self.min_seq = 0  # Highest commit sequence of this client's writes and mailbox syncs
+        self.leader_address = leader_address
+        self.update(leader_address, replica_list)
+
+    def update(self, leader_address, replica_list=None):
+        """Replaces the servers to read from, e.g. after polling GetReplicaList."""
+        with self.lock:
+            if leader_address != self.leader_address:
+                self.min_seq = 0  # A new leader numbers its commits from what it had applied, so old tokens mean nothing
+            self.leader_address = leader_address
+            self.addresses = list(replica_list) if replica_list else [leader_address]
+
+    def candidates(self):
+        """Returns the healthy servers starting at the next one in round robin order, then the leader as a last resort."""
+        with self.lock:
+            now = time.monotonic()
+            start = self.next_index % len(self.addresses)
+            self.next_index += 1
+            ordered = self.addresses[start:] + self.addresses[:start]
+            healthy = [address for address in ordered if self.down_until.get(address, 0) <= now]
+            if self.leader_address not in healthy:
+                healthy.append(self.leader_address)
+            return healthy
+
+    def observe_commit(self, commit_seq):
+        """Raises the session token after one of the client's writes is acknowledged or its mailbox is synced."""
+        with self.lock:
+            self.min_seq = max(self.min_seq, commit_seq)
+
+    def mark_down(self, address):
+        """Skips a server for the cooldown period."""
+        with self.lock:
+            self.down_until[address] = time.monotonic() + self.cooldown
+        print(f"{address} failed a read, skipping it for {self.cooldown}s")
+
+    def call(self, invoke):
+        """
+        Calls invoke(address) on healthy servers in turn until one answers.
+        A replica that is behind the session token or does not have what was asked for redirects the read to the leader.
+
+        Parameters:
+        ----------
+        invoke : callable
+            Makes the read against the given `ip:port` and returns its response.
+
+        Returns:
+        -------
+        object
+            The first response, or raises the last server's error if every server failed.
+        """
+        error = None
+        for address in self.candidates():
+            try:
+                return invoke(address)
+            except grpc.RpcError as e:
+                if e.code() in REDIRECT_CODES and address != self.leader_address:
+                    return invoke(self.leader_address)
+                if e.code() not in FAILOVER_CODES:
+                    raise
+                error = e
+                self.mark_down(address)
+        raise error
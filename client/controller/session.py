@@ -0,0 +1,115 @@
+import sys
+import os
+import grpc
+import queue
+import threading
+import itertools
+from concurrent.futures import Future
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+import chat_pb2
+import chat_pb2_grpc
+
+# RPC name -> SessionRequest/SessionResponse oneof field carrying it
+SESSION_OPERATIONS = {
+    "SendMessage": "send_message",
+    "SendMessages": "send_messages",
+    "MarkMessageRead": "mark_message_read",
+    "DeleteMessages": "delete_messages",
+    "GetMessageByMid": "get_message_by_mid",
+    "GetReceivedMessages": "get_received_messages",
+    "GetSentMessages": "get_sent_messages",
+    "SyncMailbox": "sync_mailbox",
+    "ListAccounts": "list_accounts",
+    "GetMessagesByMid": "get_messages_by_mid",
+}
+
+class ChatSession:
+    """
+    Keeps one bidirectional stream open to the server for a logged-in user.
+
+    Requests are tagged with correlation ids so many can be in flight at once, and the
+    server pushes mailbox events for the user back on the same stream.
+    """
+
+    def __init__(self, server_address, uid, on_event=None, compression=None, options=None):
+        """
+        Opens the stream and subscribes it to the user's mailbox events.
+
+        Parameters:
+        ----------
+        server_address : str
+            The `ip:port` of the server to keep the session with.
+        uid : str
+            The logged-in user whose mailbox events should be pushed.
+        on_event : callable, optional
+            Called with each MailboxEvent, from the session's reader thread.
+        compression : grpc.Compression, optional
+            Compression for the session's stream.
+        options : list of tuple, optional
+            gRPC channel options, such as message size limits and keepalive.
+        """
+        self.server_address = server_address
+        self.on_event = on_event
+        self.channel = grpc.insecure_channel(server_address, options=options, compression=compression)
+        self.stub = chat_pb2_grpc.ChatServiceStub(self.channel)
+        self.correlation_ids = itertools.count(1)
+        self.pending = dict()  # correlation id -> Future waiting for its response
+        self.lock = threading.Lock()
+        self.closed = False
+
+        self.requests = queue.Queue()
+        self.requests.put(chat_pb2.SessionRequest(uid=uid))
+        self.responses = self.stub.Session(iter(self.requests.get, None))
+        threading.Thread(target=self.read_responses, daemon=True).start()
+
+    def supports(self, method):
+        """Returns whether the RPC can be sent over the session."""
+        return method in SESSION_OPERATIONS and not self.closed
+
+    def call(self, method, request):
+        """Sends a request over the stream without waiting and returns a Future for its response."""
+        future = Future()
+        with self.lock:
+            if self.closed:
+                future.set_exception(ConnectionError(f"Session with {self.server_address} is closed"))
+                return future
+            correlation_id = next(self.correlation_ids)
+            self.pending[correlation_id] = future
+        self.requests.put(chat_pb2.SessionRequest(correlation_id=correlation_id, **{SESSION_OPERATIONS[method]: request}))
+        return future
+
+    def read_responses(self):
+        """Resolves pending requests and dispatches server events as responses arrive."""
+        try:
+            for response in self.responses:
+                if response.WhichOneof("result") == "mailbox_event":
+                    if self.on_event:
+                        self.on_event(response.mailbox_event)
+                    continue
+                with self.lock:
+                    future = self.pending.pop(response.correlation_id, None)
+                if future is None:
+                    continue
+                result = response.WhichOneof("result")
+                if response.error or result is None:
+                    future.set_exception(RuntimeError(response.error or f"Session response {response.correlation_id} carried no result"))
+                else:
+                    future.set_result(getattr(response, result))
+        except grpc.RpcError as e:
+            print(f"Session with {self.server_address} ended: {e.code()}")
+        finally:
+            self.fail_pending()
+
+    def fail_pending(self):
+        """Marks the session closed and fails every request still waiting for a response."""
+        with self.lock:
+            self.closed = True
+            pending, self.pending = self.pending, dict()
+        for future in pending.values():
+            future.set_exception(ConnectionError(f"Session with {self.server_address} is closed"))
+
+    def close(self):
+        """Ends the stream and releases the channel."""
+        self.requests.put(None)
+        self.channel.close()
+        self.fail_pending()
@@ -219,3 +219,25 @@ def test_get_message_by_mid(grpc_stub):
     assert response.receiver_username == "Bob"
     assert response.text == "Hello, Bob!"
     assert response.receiver_read is True
+
+
+# ---------------- TESTS FOR sync_mailbox() USING gRPC ---------------- #
+
+def test_sync_mailbox(grpc_stub):
+    """
+    Test if sync_mailbox() retrieves only the mailbox changes since a version.
+    """
+    grpc_stub.SyncMailbox = MagicMock()
+    grpc_stub.SyncMailbox.return_value = chat_pb2.SyncMailboxResponse(
+        version=7, epoch="epoch1", full_sync=False, added_mids=["msg3"], removed_mids=["msg1"], read_mids=["msg2"]
+    )
+
+    request = chat_pb2.SyncMailboxRequest(uid="alice_uid", since_version=5, epoch="epoch1")
+    response = grpc_stub.SyncMailbox(request)
+
+    grpc_stub.SyncMailbox.assert_called_once_with(request)
+    assert response.version == 7
+    assert not response.full_sync
+    assert response.added_mids == ["msg3"]
+    assert response.removed_mids == ["msg1"]
+    assert response.read_mids == ["msg2"]
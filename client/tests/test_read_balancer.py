@@ -0,0 +1,119 @@
+import pytest
+import grpc
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from controller.read_balancer import ReadBalancer
+
+class FakeRpcError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+# ---------------- TESTS FOR ReadBalancer ---------------- #
+
+def test_round_robin_over_replicas():
+    """
+    Test that consecutive reads go to each server in turn.
+    """
+    balancer = ReadBalancer("leader:1", ["leader:1", "replica:2", "replica:3"])
+
+    addresses = [balancer.call(lambda address: address) for _ in range(6)]
+
+    assert addresses == ["leader:1", "replica:2", "replica:3"] * 2
+
+def test_failed_replica_is_skipped():
+    """
+    Test that an unreachable replica fails over to the next server and is skipped afterwards.
+    """
+    balancer = ReadBalancer("leader:1", ["leader:1", "replica:2"], cooldown=60)
+    attempts = []
+
+    def invoke(address):
+        attempts.append(address)
+        if address == "replica:2":
+            raise FakeRpcError(grpc.StatusCode.UNAVAILABLE)
+        return address
+
+    results = [balancer.call(invoke) for _ in range(4)]
+
+    assert results == ["leader:1"] * 4
+    assert attempts.count("replica:2") == 1
+
+def test_application_errors_do_not_fail_over():
+    """
+    Test that an error from a healthy server is raised instead of retried elsewhere.
+    """
+    balancer = ReadBalancer("leader:1", ["leader:1", "replica:2"])
+
+    def invoke(address):
+        raise FakeRpcError(grpc.StatusCode.UNKNOWN)
+
+    with pytest.raises(grpc.RpcError):
+        balancer.call(invoke)
+
+def test_all_down_falls_back_to_leader():
+    """
+    Test that the leader is still tried when every server is in its cooldown.
+    """
+    balancer = ReadBalancer("leader:1", ["leader:1", "replica:2"], cooldown=60)
+    balancer.mark_down("leader:1")
+    balancer.mark_down("replica:2")
+
+    assert balancer.call(lambda address: address) == "leader:1"
+
+def test_update_replaces_servers():
+    """
+    Test that a new replica list is used by the next reads.
+    """
+    balancer = ReadBalancer("leader:1")
+    balancer.update("leader:1", ["replica:2"])
+
+    assert balancer.call(lambda address: address) == "replica:2"
+
+def test_lagging_replica_redirects_to_leader():
+    """
+    Test that a replica behind the session token sends the read to the leader without being marked down.
+    """
+    balancer = ReadBalancer("leader:1", ["replica:2", "leader:1"])
+    balancer.observe_commit(7)
+    balancer.observe_commit(3)
+
+    def invoke(address):
+        if address == "replica:2":
+            raise FakeRpcError(grpc.StatusCode.FAILED_PRECONDITION)
+        return address
+
+    assert balancer.min_seq == 7
+    assert balancer.call(invoke) == "leader:1"
+    assert "replica:2" not in balancer.down_until
+
+def test_replica_missing_message_redirects_to_leader():
+    """
+    Test that a replica without the requested message sends the read to the leader without being marked down.
+    """
+    balancer = ReadBalancer("leader:1", ["replica:2", "leader:1"])
+
+    def invoke(address):
+        if address == "replica:2":
+            raise FakeRpcError(grpc.StatusCode.NOT_FOUND)
+        return address
+
+    assert balancer.call(invoke) == "leader:1"
+    assert "replica:2" not in balancer.down_until
+
+def test_new_leader_resets_session_token():
+    """
+    Test that a leader change drops the session token issued by the old leader.
+    """
+    balancer = ReadBalancer("leader:1")
+    balancer.observe_commit(7)
+    balancer.update("leader:1", ["leader:1", "replica:2"])
+    assert balancer.min_seq == 7
+
+    balancer.update("replica:2", ["replica:2"])
+    assert balancer.min_seq == 0
@@ -0,0 +1,100 @@
+import pytest
+import grpc
+import sys
+import os
+from concurrent import futures
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+
+import chat_pb2
+import chat_pb2_grpc
+from controller.session import ChatSession
+
+# ---------------- TEST FIXTURES ---------------- #
+
+class FakeSessionService(chat_pb2_grpc.ChatServiceServicer):
+    """
+    Answers session operations from canned data and pushes one mailbox event per subscription.
+    """
+
+    def Session(self, request_iterator, context):
+        for request in request_iterator:
+            if request.uid:
+                yield chat_pb2.SessionResponse(mailbox_event=chat_pb2.MailboxEvent(uid=request.uid, version=3, epoch="e"))
+            operation = request.WhichOneof("operation")
+            if operation == "get_message_by_mid":
+                mid = request.get_message_by_mid.mid
+                yield chat_pb2.SessionResponse(correlation_id=request.correlation_id, get_message_by_mid=chat_pb2.GetMessageResponse(text=f"text of {mid}"))
+            elif operation == "mark_message_read":
+                yield chat_pb2.SessionResponse(correlation_id=request.correlation_id, error="boom")
+            elif operation == "delete_messages":
+                yield chat_pb2.SessionResponse(correlation_id=request.correlation_id)  # Neither a result nor an error
+
+@pytest.fixture(scope="module")
+def fake_server():
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(FakeSessionService(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    yield f"127.0.0.1:{port}"
+    server.stop(None)
+
+# ---------------- TESTS FOR ChatSession ---------------- #
+
+def test_session_resolves_pipelined_requests(fake_server):
+    """
+    Test if requests sent back to back over a session are matched to their responses.
+    """
+    session = ChatSession(fake_server, "alice_uid")
+
+    # Send every request before waiting for any response
+    futures = [session.call("GetMessageByMid", chat_pb2.GetMessageRequest(mid=mid)) for mid in ["msg1", "msg2", "msg3"]]
+
+    assert [future.result(timeout=5).text for future in futures] == ["text of msg1", "text of msg2", "text of msg3"]
+    session.close()
+
+def test_session_delivers_events(fake_server):
+    """
+    Test if server-pushed mailbox events reach the event callback.
+    """
+    events = []
+    session = ChatSession(fake_server, "alice_uid", on_event=events.append)
+
+    session.call("GetMessageByMid", chat_pb2.GetMessageRequest(mid="msg1")).result(timeout=5)
+
+    assert events[0].uid == "alice_uid" and events[0].version == 3
+    session.close()
+
+def test_session_reports_operation_errors(fake_server):
+    """
+    Test if an operation error from the server fails only that request's future.
+    """
+    session = ChatSession(fake_server, "alice_uid")
+
+    with pytest.raises(RuntimeError):
+        session.call("MarkMessageRead", chat_pb2.MarkMessageReadRequest(mid="msg1")).result(timeout=5)
+    assert session.call("GetMessageByMid", chat_pb2.GetMessageRequest(mid="msg2")).result(timeout=5).text == "text of msg2"
+    session.close()
+
+def test_session_reports_response_without_result(fake_server):
+    """
+    Test if a response carrying neither a result nor an error fails that request's future without ending the session.
+    """
+    session = ChatSession(fake_server, "alice_uid")
+
+    with pytest.raises(RuntimeError):
+        session.call("DeleteMessages", chat_pb2.DeleteMessagesRequest(uid="alice_uid", mids=["msg1"])).result(timeout=5)
+    assert session.call("GetMessageByMid", chat_pb2.GetMessageRequest(mid="msg2")).result(timeout=5).text == "text of msg2"
+    session.close()
+
+def test_closed_session_falls_back(fake_server):
+    """
+    Test if a closed session no longer claims to support operations.
+    """
+    session = ChatSession(fake_server, "alice_uid")
+    session.close()
+
+    assert not session.supports("GetMessageByMid")
+    with pytest.raises(ConnectionError):
+        session.call("GetMessageByMid", chat_pb2.GetMessageRequest(mid="msg1")).result(timeout=5)
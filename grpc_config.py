@@ -0,0 +1,190 @@
+import grpc
+
+COMPRESSION_ALGORITHMS = {
+    "none": grpc.Compression.NoCompression,
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+
+# RPC -> compression class it is configured under in config.ini. Anything not listed uses "default".
+RPC_COMPRESSION_CLASSES = {
+    "SyncReplicaListFromLeader": "replication",
+    "ApplyOperations": "replication",
+    "InstallSnapshot": "replication",
+    "RepairRanges": "replication",
+    "Bootstrap": "bulk",
+    "GetMessagesByMid": "bulk",
+    "SendMessages": "bulk",
+    "GetReceivedMessages": "bulk",
+    "GetSentMessages": "bulk",
+}
+
+def load_compression_settings(config):
+    """
+    Reads the [compression] section of config.ini into compression class -> grpc.Compression.
+
+    Parameters:
+    ----------
+    config : configparser.ConfigParser
+        The parsed config.ini. A missing section or key means no compression.
+
+    Returns:
+    -------
+    dict
+        Maps "default", "replication", "bulk" and any other configured class to a grpc.Compression value.
+    """
+    settings = {"default": grpc.Compression.NoCompression}
+    if config.has_section("compression"):
+        for rpc_class, algorithm in config["compression"].items():
+            if algorithm.lower() not in COMPRESSION_ALGORITHMS:
+                raise ValueError(f"Unknown compression '{algorithm}' for {rpc_class}, expected one of {list(COMPRESSION_ALGORITHMS)}")
+            settings[rpc_class] = COMPRESSION_ALGORITHMS[algorithm.lower()]
+    return settings
+
+def compression_for(rpc_name, settings):
+    """Returns the call-level compression configured for an RPC."""
+    rpc_class = RPC_COMPRESSION_CLASSES.get(rpc_name, "default")
+    return settings.get(rpc_class, settings["default"])
+
+def channel_compression(settings):
+    """Returns the channel-level compression used for calls without a more specific setting."""
+    return settings["default"]
+
+def parse_bool(value):
+    """Parses a config or command line boolean such as true/false, yes/no or 1/0."""
+    if isinstance(value, bool):
+        return value
+    if value.strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if value.strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Expected a boolean, got '{value}'")
+
+WRITE_CONCERNS = ("leader", "majority", "all")  # Servers, the leader included, that must have a write before it is acknowledged
+
+def parse_write_concern(value):
+    """Parses a write concern: leader, majority or all."""
+    concern = value.strip().lower()
+    if concern not in WRITE_CONCERNS:
+        raise ValueError(f"Unknown write concern '{value}', expected one of {list(WRITE_CONCERNS)}")
+    return concern
+
+BACKPRESSURE_MODES = ("off", "throttle", "reject")  # What a write does while a replica is past the lag limits
+
+def parse_backpressure(value):
+    """Parses a backpressure mode: off, throttle or reject."""
+    mode = value.strip().lower()
+    if mode not in BACKPRESSURE_MODES:
+        raise ValueError(f"Unknown backpressure mode '{value}', expected one of {list(BACKPRESSURE_MODES)}")
+    return mode
+
+# [server] key -> (parser, default). 0 means unlimited for maximum_concurrent_rpcs and max_concurrent_streams.
+SERVER_SETTINGS = {
+    "max_workers": (int, 10),
+    "maximum_concurrent_rpcs": (int, 0),
+    "max_concurrent_streams": (int, 0),
+    "keepalive_time_ms": (int, 60000),
+    "keepalive_timeout_ms": (int, 20000),
+    "keepalive_permit_without_calls": (parse_bool, True),
+    "http2_min_ping_interval_without_data_ms": (int, 30000),
+    "max_send_message_length": (int, 64 * 1024 * 1024),
+    "max_receive_message_length": (int, 64 * 1024 * 1024),
+    "http2_bdp_probe": (parse_bool, True),
+    "http2_max_frame_size": (int, 16384),
+    "http2_lookahead_bytes": (int, 0),
+    "response_cache_size": (int, 1024),
+    "single_writer": (parse_bool, False),
+    "write_batch_size": (int, 128),
+    "replication_backlog": (int, 64),
+    "replication_retry_ms": (int, 100),
+    "replication_retry_max_ms": (int, 5000),
+    "replica_timeout_ms": (int, 5000),
+    "write_concern": (parse_write_concern, "leader"),
+    "write_concern_timeout_ms": (int, 5000),
+    "snapshot_chunk_bytes": (int, 1024 * 1024),
+    "operation_log_size": (int, 100000),
+    "anti_entropy_interval_ms": (int, 30000),
+    "backpressure": (parse_backpressure, "off"),
+    "backpressure_max_lag_writes": (int, 10000),
+    "backpressure_max_lag_ms": (int, 10000),
+    "backpressure_timeout_ms": (int, 1000),
+    "phi_threshold": (float, 8.0),
+    "phi_window": (int, 100),
+    "phi_min_std_ms": (int, 100),
+    "phi_acceptable_pause_ms": (int, 1000),
+    "shards": (int, 1),
+    "shard_port_base": (int, 61000),
+}
+
+# [server] key -> gRPC channel argument it sets
+GRPC_OPTION_NAMES = {
+    "max_concurrent_streams": "grpc.max_concurrent_streams",
+    "keepalive_time_ms": "grpc.keepalive_time_ms",
+    "keepalive_timeout_ms": "grpc.keepalive_timeout_ms",
+    "keepalive_permit_without_calls": "grpc.keepalive_permit_without_calls",
+    "http2_min_ping_interval_without_data_ms": "grpc.http2.min_ping_interval_without_data_ms",
+    "max_send_message_length": "grpc.max_send_message_length",
+    "max_receive_message_length": "grpc.max_receive_message_length",
+    "http2_bdp_probe": "grpc.http2.bdp_probe",
+    "http2_max_frame_size": "grpc.http2.max_frame_size",
+    "http2_lookahead_bytes": "grpc.http2.lookahead_bytes",
+}
+
+# Settings that also apply to outgoing channels, so large pushes and responses fit and idle links are probed
+CHANNEL_SETTINGS = ("keepalive_time_ms", "keepalive_timeout_ms", "max_send_message_length",
+                    "max_receive_message_length", "http2_bdp_probe", "http2_max_frame_size", "http2_lookahead_bytes")
+
+def load_server_settings(config, overrides=None):
+    """
+    Reads the [server] section of config.ini, with command line values taking precedence.
+
+    Parameters:
+    ----------
+    config : configparser.ConfigParser
+        The parsed config.ini. Missing keys keep the defaults in SERVER_SETTINGS.
+    overrides : dict, optional
+        Setting -> value from the command line. None values are ignored.
+
+    Returns:
+    -------
+    dict
+        Every key of SERVER_SETTINGS mapped to its effective value.
+    """
+    settings = {key: default for key, (_, default) in SERVER_SETTINGS.items()}
+    if config.has_section("server"):
+        for key, value in config["server"].items():
+            if key not in SERVER_SETTINGS:
+                raise ValueError(f"Unknown server setting '{key}', expected one of {list(SERVER_SETTINGS)}")
+            settings[key] = SERVER_SETTINGS[key][0](value)
+    for key, value in (overrides or dict()).items():
+        if key in SERVER_SETTINGS and value is not None:
+            settings[key] = SERVER_SETTINGS[key][0](value) if isinstance(value, str) else value
+    if settings["max_workers"] < 1:
+        raise ValueError(f"max_workers must be at least 1, got {settings['max_workers']}")
+    if settings["write_batch_size"] < 1:
+        raise ValueError(f"write_batch_size must be at least 1, got {settings['write_batch_size']}")
+    if settings["snapshot_chunk_bytes"] < 1:
+        raise ValueError(f"snapshot_chunk_bytes must be at least 1, got {settings['snapshot_chunk_bytes']}")
+    if settings["shards"] < 1:
+        raise ValueError(f"shards must be at least 1, got {settings['shards']}")
+    return settings
+
+def server_options(settings):
+    """Returns the gRPC options for a server. Zero-valued limits and lookahead are left at gRPC's defaults."""
+    return [(GRPC_OPTION_NAMES[key], int(settings[key])) for key in GRPC_OPTION_NAMES
+            if not (key in ("max_concurrent_streams", "http2_lookahead_bytes") and settings[key] == 0)]
+
+def channel_options(settings):
+    """Returns the gRPC options for outgoing channels."""
+    return [(GRPC_OPTION_NAMES[key], int(settings[key])) for key in CHANNEL_SETTINGS
+            if not (key == "http2_lookahead_bytes" and settings[key] == 0)]
+
+def max_concurrent_rpcs(settings):
+    """Returns the server's maximum_concurrent_rpcs argument, None when unlimited."""
+    return settings["maximum_concurrent_rpcs"] or None
+
+def log_server_settings(settings):
+    """Prints the effective runtime settings at startup."""
+    print("Server settings:")
+    for key, value in settings.items():
+        print(f"    {key} = {value}")
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    Bounded LRU cache of RPC responses, each tagged with the data version it was computed from.
+
+    A lookup only hits if the entry's version matches the caller's current version, so bumping
+    the version invalidates every entry at once without walking the cache.
+
+    Attributes:
+    ----------
+    max_entries : int
+        The most responses kept before the least recently used one is evicted.
+    hits : int
+        Lookups answered from the cache.
+    misses : int
+        Lookups that found no entry or a stale one.
+    evictions : int
+        Entries dropped to stay within max_entries.
+    """
+
+    def __init__(self, max_entries=1024):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+        ----------
+        max_entries : int, optional
+            The most responses kept. 0 disables caching.
+        """
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (version, response), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, version, compute):
+        """
+        Returns the cached response for key at version, computing and storing it on a miss.
+
+        Parameters:
+        ----------
+        key : hashable
+            The RPC name and its arguments.
+        version : int
+            The current version of the data the response is derived from. Read it before computing,
+            so a change made during the computation leaves the entry stale.
+        compute : callable
+            Builds the response when it is not cached.
+
+        Returns:
+        -------
+        object
+            The response.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        response = compute()  # Outside the lock so slow computations do not serialize other lookups
+        if self.max_entries > 0:
+            with self.lock:
+                self.entries[key] = (version, response)
+                self.entries.move_to_end(key)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return response
+
+    def stats(self):
+        """Returns the hit, miss and eviction counters, the entry count and the hit rate."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,272 @@
+import copy
+import queue
+import threading
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import Future
+from types import MappingProxyType
+
+class ReadWriteLock:
+    """
+    Lock that lets any number of readers in at once, or a single writer.
+
+    Writers are preferred: once a writer is waiting, new readers wait behind it, so a steady
+    stream of reads cannot starve account creation.
+    """
+
+    def __init__(self):
+        """Initializes an unlocked lock."""
+        self.condition = threading.Condition()
+        self.readers = 0  # Readers currently holding the lock
+        self.writer = False  # Whether a writer currently holds the lock
+        self.waiting_writers = 0
+
+    def acquire_read(self):
+        """Blocks until no writer holds or is waiting for the lock, then enters as a reader."""
+        with self.condition:
+            self.condition.wait_for(lambda: not self.writer and self.waiting_writers == 0)
+            self.readers += 1
+
+    def release_read(self):
+        """Leaves as a reader, waking a waiting writer if this was the last reader."""
+        with self.condition:
+            self.readers -= 1
+            if self.readers == 0:
+                self.condition.notify_all()
+
+    def acquire_write(self):
+        """Blocks until no reader or writer holds the lock, then holds it exclusively."""
+        with self.condition:
+            self.waiting_writers += 1
+            self.condition.wait_for(lambda: not self.writer and self.readers == 0)
+            self.waiting_writers -= 1
+            self.writer = True
+
+    def release_write(self):
+        """Releases exclusive ownership and wakes every waiter."""
+        with self.condition:
+            self.writer = False
+            self.condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        """Holds the lock as a reader for the duration of a with block."""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        """Holds the lock exclusively for the duration of a with block."""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+class LockStripes:
+    """
+    Fixed pool of locks that keys (e.g. uids) hash onto.
+
+    Operations on different users usually land on different stripes and run in parallel, while
+    memory stays bounded no matter how many users exist. Several keys are always locked in stripe
+    order, so two operations locking the same users in a different order cannot deadlock.
+
+    Attributes:
+    ----------
+    stripes : list of threading.Lock
+        The locks keys are hashed onto.
+    """
+
+    def __init__(self, num_stripes=64):
+        """
+        Initializes the stripes.
+
+        Parameters:
+        ----------
+        num_stripes : int, optional
+            Number of locks. More stripes mean fewer unrelated users sharing a lock.
+        """
+        self.stripes = [threading.Lock() for _ in range(num_stripes)]
+
+    def stripe_index(self, key):
+        """Returns the index of the stripe a key maps to, stable across processes."""
+        return zlib.crc32(str(key).encode()) % len(self.stripes)
+
+    @contextmanager
+    def locked(self, *keys):
+        """Holds the stripes of every key (each stripe once, in index order) for the duration of a with block."""
+        indices = sorted({self.stripe_index(key) for key in keys if key is not None})
+        for index in indices:
+            self.stripes[index].acquire()
+        try:
+            yield
+        finally:
+            for index in reversed(indices):
+                self.stripes[index].release()
+
+def frozen_copy(obj):
+    """Returns a copy of a User or Message whose list attributes are copied too, so later in-place changes to obj do not show."""
+    clone = copy.copy(obj)
+    for key, value in vars(clone).items():
+        if isinstance(value, list):
+            setattr(clone, key, list(value))
+    return clone
+
+class Snapshot:
+    """
+    Immutable view of users and messages as of one published version.
+
+    Attributes:
+    ----------
+    version : int
+        Number of changes published before this snapshot was built.
+    users : types.MappingProxyType
+        uid -> User. Read only; the User objects must not be modified either.
+    messages : types.MappingProxyType
+        mid -> Message. Read only; the Message objects must not be modified either.
+    """
+
+    def __init__(self, version, users, messages):
+        self.version = version
+        self.users = MappingProxyType(users)
+        self.messages = MappingProxyType(messages)
+
+class SnapshotStore:
+    """
+    Publishes copy-on-write snapshots of users and messages for readers that must not block writers.
+
+    Writers record copies of the objects they changed while still holding the locks that protect
+    them, which costs O(changed objects). The next reader folds every recorded change into a new
+    snapshot at once, so a burst of writes pays for one rebuild. The rebuild copies the whole state,
+    so it runs outside the lock writers record under: a write never waits for it. Readers then scan
+    the snapshot without any lock: it never changes, so it can never be seen half-updated.
+    """
+
+    def __init__(self, users_dict, messages_dict):
+        """
+        Initializes the store with a first snapshot of the given state.
+
+        Parameters:
+        ----------
+        users_dict : dict
+            uid -> User, the live state writers modify.
+        messages_dict : dict
+            mid -> Message, the live state writers modify.
+        """
+        self.lock = threading.Lock()  # Guards version, pending and current; held only for O(1) steps
+        self.build_lock = threading.Lock()  # Serializes rebuilds and replaces; writers never take it
+        self.version = 0
+        self.pending = []  # (users, messages) changes recorded since the current snapshot was built
+        self.current = None
+        self.replace(users_dict, messages_dict)
+
+    def record(self, users=(), messages=()):
+        """
+        Records the live objects a write changed. Call it while holding the locks that protect them.
+
+        Parameters:
+        ----------
+        users : iterable of User, optional
+            Users whose fields or mailboxes changed.
+        messages : iterable of Message, optional
+            Messages that were created or changed.
+        """
+        change = ({user.uid: frozen_copy(user) for user in users}, {message.mid: frozen_copy(message) for message in messages})
+        with self.lock:
+            self.pending.append(change)
+            self.version += 1
+
+    def replace(self, users_dict=None, messages_dict=None):
+        """Publishes a snapshot of whole new users and/or messages, e.g. after a full sync from the leader."""
+        users = {uid: frozen_copy(user) for uid, user in users_dict.items()} if users_dict is not None else None
+        messages = {mid: frozen_copy(message) for mid, message in messages_dict.items()} if messages_dict is not None else None
+        with self.build_lock:
+            if self.current is not None:
+                latest = self.build()  # Changes recorded before the replace must not land on top of it
+                users = users if users is not None else latest.users  # Shared, not copied: snapshots never change
+                messages = messages if messages is not None else latest.messages
+            with self.lock:
+                self.version += 1
+                self.current = Snapshot(self.version, users, messages)
+
+    def build(self):
+        """
+        Folds the pending changes into a new current snapshot and returns it. Requires self.build_lock.
+
+        Only taking the pending changes and publishing the result hold self.lock; the copy in
+        between does not, so writers keep recording while it runs. Changes recorded meanwhile stay
+        pending for the next rebuild.
+        """
+        with self.lock:
+            if not self.pending:
+                return self.current
+            base, changes, version = self.current, self.pending, self.version
+            self.pending = []
+        users, messages = dict(base.users), dict(base.messages)
+        for changed_users, changed_messages in changes:
+            users.update(changed_users)
+            messages.update(changed_messages)
+        snapshot = Snapshot(version, users, messages)
+        with self.lock:
+            self.current = snapshot  # Nothing else publishes while we hold self.build_lock
+        return snapshot
+
+    def snapshot(self):
+        """Returns the latest snapshot, including every change recorded before the call."""
+        with self.build_lock:
+            return self.build()
+
+class CommandQueue:
+    """
+    Funnels commands from many threads to one applier thread that handles them in batches.
+
+    Callers get a Future per command. The applier takes whatever has queued up (at most
+    max_batch commands) and hands the batch to commit_batch, which must resolve every future.
+    """
+
+    def __init__(self, commit_batch, max_batch=128):
+        """
+        Starts the applier thread.
+
+        Parameters:
+        ----------
+        commit_batch : callable
+            Called on the applier thread with a list of (apply, request, future) commands, in submission order.
+        max_batch : int, optional
+            The most commands handed to commit_batch at once. Must be at least 1.
+        """
+        if max_batch < 1:
+            raise ValueError(f"max_batch must be at least 1, got {max_batch}")
+        self.commit_batch = commit_batch
+        self.max_batch = max_batch
+        self.commands = queue.Queue()
+        self.batches = 0  # Batches committed, for stats
+        self.committed = 0  # Commands committed, for stats
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, apply, request):
+        """Queues a command and returns the Future its response will be set on."""
+        future = Future()
+        self.commands.put((apply, request, future))
+        return future
+
+    def run(self):
+        """Applier loop: blocks for one command, then takes every command already waiting behind it."""
+        while True:
+            batch = [self.commands.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.commands.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.commit_batch(batch)
+            except Exception as e:  # Keep the applier alive; callers still waiting get the error
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            self.batches += 1
+            self.committed += len(batch)
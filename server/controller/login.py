@@ -17,15 +17,15 @@ def check_username_password(uid: str, password: str, users_dict: dict):
     print("Calling check_username_password")
     return users_dict[uid].password == password
 
-def create_account(username: str, password: str, users_dict: dict):
+def create_account(username: str, password: str, users_dict: dict, uid: str = None):
     """
-    Creates a new user account with the given username and password.
+    Creates a new user account with the given username and password, and the given uid if one is passed.
     """
     print("Calling create_account")
     if check_username_exists(username, users_dict):
         return None
 
-    user = User(username, password) 
+    user = User(username, password, uid=uid)
     users_dict[user.uid] = user
     return user.uid
 
@@ -1,9 +1,12 @@
+import heapq
 from model import Message
 from utils import object_to_dict_recursive
+from controller.sync import record_mailbox_change
 
-def send_message(sender_uid, receiver_username, text, users_dict, messages_dict, timestamp, connected_clients=None): 
+def send_message(sender_uid, receiver_username, text, users_dict, messages_dict, timestamp, connected_clients=None, mailbox_changes=None, mid=None):
     """
     Sends a message from a sender to a recipient. If the recipient is online, they are notified immediately.
+    Pass mid to reproduce a message sent elsewhere, e.g. when a replica replays the leader's write.
     """
     print("Calling send message", receiver_username)
     receiver_uid = None
@@ -17,17 +20,84 @@ def send_message(sender_uid, receiver_username, text, users_dict, messages_dict,
         return False
 
     # Create message object, receiver_read is False by default
-    message = Message(sender=sender_uid, receiver=receiver_uid, sender_username=sender_username, receiver_username=receiver_username, text=text, timestamp=timestamp)
+    message = Message(sender=sender_uid, receiver=receiver_uid, sender_username=sender_username, receiver_username=receiver_username, text=text, timestamp=timestamp, mid=mid)
     print("Message id:", message.mid)
 
     # Update runtime storage
     messages_dict[message.mid] = message
     users_dict[sender_uid].sent_messages.append(message.mid)
     users_dict[receiver_uid].received_messages.append(message.mid)
+    if mailbox_changes is not None:
+        record_mailbox_change(mailbox_changes, receiver_uid, "added", message.mid)
 
     return True
 
-def delete_messages(users_dict, messages_dict, mids, uid):
+def send_messages(sender_uid, receiver_usernames, texts, users_dict, messages_dict, timestamp, mailbox_changes=None):
+    """
+    Sends every text to every recipient as one batch. Returns a dict of receiver username to the list of new mids,
+    or None for recipients that do not exist. Nothing is stored if the sender is unknown or there is nothing to send.
+    """
+    print("Calling send messages", receiver_usernames)
+    results = {username: None for username in receiver_usernames}
+    if sender_uid not in users_dict or not texts:
+        return results
+
+    # One pass over users instead of one per recipient
+    active_uids = {user.username: uid for uid, user in users_dict.items() if user.active}
+    sender_username = users_dict[sender_uid].username
+
+    # Build the whole batch before touching runtime storage
+    batch = []
+    for receiver_username in results:
+        receiver_uid = active_uids.get(receiver_username)
+        if receiver_uid is None:
+            print(f"Receiver {receiver_username} does not exist.")
+            continue
+        messages = [Message(sender=sender_uid, receiver=receiver_uid, sender_username=sender_username, receiver_username=receiver_username, text=text, timestamp=timestamp) for text in texts]
+        batch.append((receiver_username, receiver_uid, messages))
+
+    # Update runtime storage
+    for receiver_username, receiver_uid, messages in batch:
+        for message in messages:
+            messages_dict[message.mid] = message
+            users_dict[sender_uid].sent_messages.append(message.mid)
+            users_dict[receiver_uid].received_messages.append(message.mid)
+            if mailbox_changes is not None:
+                record_mailbox_change(mailbox_changes, receiver_uid, "added", message.mid)
+        results[receiver_username] = [message.mid for message in messages]
+
+    return results
+
+def deliver_messages(receiver_username, messages, users_dict, messages_dict, mailbox_changes=None):
+    """
+    Stores messages built elsewhere (e.g. by the sender's shard) and adds them to the receiver's received messages.
+    Returns the receiver's uid, or None if the receiver does not exist.
+    """
+    receiver_uid = None
+    for uid, user in users_dict.items():
+        if user.username == receiver_username and user.active:
+            receiver_uid = uid
+    if receiver_uid is None:
+        print("Receiver does not exist.")
+        return None
+
+    for message in messages:
+        message.receiver = receiver_uid
+        messages_dict[message.mid] = message
+        users_dict[receiver_uid].received_messages.append(message.mid)
+        if mailbox_changes is not None:
+            record_mailbox_change(mailbox_changes, receiver_uid, "added", message.mid)
+    return receiver_uid
+
+def record_sent_messages(sender_uid, messages, users_dict, messages_dict):
+    """
+    Adds delivered messages to the sender's sent messages, storing the sender's copy of any not stored yet.
+    """
+    for message in messages:
+        messages_dict.setdefault(message.mid, message)
+        users_dict[sender_uid].sent_messages.append(message.mid)
+
+def delete_messages(users_dict, messages_dict, mids, uid, mailbox_changes=None):
     """
     Deletes messages from a user's sent and received messages lists.
     """
@@ -42,6 +112,8 @@ def delete_messages(users_dict, messages_dict, mids, uid):
             # Remove message if found in received
             if mid in users_dict[uid].received_messages:
                 users_dict[uid].received_messages.remove(mid)
+                if mailbox_changes is not None:
+                    record_mailbox_change(mailbox_changes, uid, "removed", mid)
 
             deleted_mids.append(mid)
         else:
@@ -50,11 +122,13 @@ def delete_messages(users_dict, messages_dict, mids, uid):
 
     return success, deleted_mids
 
-def mark_message_read(messages_dict, mid):
+def mark_message_read(messages_dict, mid, mailbox_changes=None):
     """
     Marks a message as read by updating its read status.
     """
     if mid in messages_dict:
+        if mailbox_changes is not None and not messages_dict[mid].receiver_read:
+            record_mailbox_change(mailbox_changes, messages_dict[mid].receiver, "read", mid)
         messages_dict[mid].receiver_read = True
         return True
     else:
@@ -82,3 +156,18 @@ def get_received_messages_id(uid, users_dict):
     Retrieves the message IDs of all messages received by a specific user.
     """
     return users_dict[uid].received_messages
+
+def get_inbox_summary(uid, users_dict, messages_dict, page_size):
+    """
+    Retrieves a user's unread count and their newest received and sent messages, newest first.
+    """
+    received = [messages_dict[mid] for mid in users_dict[uid].received_messages if mid in messages_dict]
+    sent = [messages_dict[mid] for mid in users_dict[uid].sent_messages if mid in messages_dict]
+
+    return {
+        "unread_count": sum(1 for message in received if not message.receiver_read),
+        "total_received": len(received),
+        "total_sent": len(sent),
+        "received": heapq.nlargest(page_size, received, key=lambda message: message.timestamp),
+        "sent": heapq.nlargest(page_size, sent, key=lambda message: message.timestamp),
+    }
@@ -0,0 +1,56 @@
+from collections import deque
+
+MAX_MAILBOX_CHANGES = 1000  # Changes retained per mailbox before clients fall back to a full sync
+
+def record_mailbox_change(mailbox_changes: dict, uid: str, change: str, mid: str):
+    """
+    Records an "added", "removed" or "read" change to a user's received mailbox and returns the new mailbox version.
+    """
+    mailbox = mailbox_changes.setdefault(uid, {"version": 0, "changes": deque(maxlen=MAX_MAILBOX_CHANGES)})
+    mailbox["version"] += 1
+    mailbox["changes"].append((mailbox["version"], change, mid))
+    return mailbox["version"]
+
+def get_mailbox_version(mailbox_changes: dict, uid: str):
+    """
+    Returns the current version of a user's mailbox.
+    """
+    if uid not in mailbox_changes:
+        return 0
+    return mailbox_changes[uid]["version"]
+
+def get_mailbox_changes(mailbox_changes: dict, uid: str, since_version: int, users_dict: dict, full_sync: bool = False):
+    """
+    Collapses the changes to a user's mailbox after since_version into added, removed and read mids.
+    Falls back to a full sync when requested, or when since_version is ahead of the server or older than the retained changes.
+    """
+    version = get_mailbox_version(mailbox_changes, uid)
+    changes = mailbox_changes[uid]["changes"] if uid in mailbox_changes else []
+
+    if full_sync or since_version > version or (changes and since_version < changes[0][0] - 1):
+        return {"version": version, "full_sync": True, "added": list(users_dict[uid].received_messages), "removed": [], "read": []}
+
+    # Walk back from the newest change so the cost is proportional to the number of new changes
+    new_changes = []
+    for change_version, change, mid in reversed(changes):
+        if change_version <= since_version:
+            break
+        new_changes.append((change, mid))
+
+    added, removed, read = [], [], []
+    for change, mid in reversed(new_changes):
+        if change == "added":
+            if mid in removed:
+                removed.remove(mid)
+            added.append(mid)
+        elif change == "removed":
+            if mid in added:
+                added.remove(mid)  # Client never saw it
+            else:
+                removed.append(mid)
+            if mid in read:
+                read.remove(mid)
+        elif change == "read" and mid not in added and mid not in read:
+            read.append(mid)  # Newly added mids are fetched with their read flag already set
+
+    return {"version": version, "full_sync": False, "added": added, "removed": removed, "read": read}
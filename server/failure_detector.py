@@ -0,0 +1,64 @@
+import math
+import threading
+import time
+from collections import deque
+
+class PhiAccrualDetector:
+    """
+    Suspicion that a server has failed, from the arrival times of its heartbeats (the phi accrual detector of Hayashibara et al.).
+
+    Instead of a fixed number of missed heartbeats, the detector fits a normal distribution to the
+    recent intervals between heartbeats and reports phi = -log10(probability that the next heartbeat
+    is still on its way). phi grows the longer a heartbeat is overdue compared to how regular the
+    heartbeats have been, so a crashed server is suspected within a few intervals, while a server whose
+    heartbeats are usually late or jittery (GC pauses, a busy link) is given proportionally more slack.
+    """
+
+    def __init__(self, expected_interval, threshold=8.0, window=100, min_std=0.1, acceptable_pause=1.0, now=None):
+        """
+        Starts the detector as if a heartbeat had just arrived.
+
+        Parameters:
+        ----------
+        expected_interval : float
+            Seconds between heartbeats assumed before any interval is observed.
+        threshold : float, optional
+            phi at or above which the server is suspected. 8 means about one false suspicion in 10^8 checks if intervals are normal.
+        window : int, optional
+            The most recent intervals kept.
+        min_std : float, optional
+            Lower bound, in seconds, on the standard deviation, so perfectly regular heartbeats do not make a small delay look fatal.
+        acceptable_pause : float, optional
+            Seconds added to the mean interval, a pause that is never suspicious on its own.
+        now : float, optional
+            time.monotonic() of the starting heartbeat.
+        """
+        self.threshold = threshold
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.intervals = deque(maxlen=max(2, window))
+        # Bootstrap with two intervals around the expected one, so the first real heartbeats already have a distribution to fall in
+        self.intervals.extend((expected_interval - expected_interval / 4, expected_interval + expected_interval / 4))
+        self.last_heartbeat = time.monotonic() if now is None else now
+        self.lock = threading.Lock()
+
+    def heartbeat(self, now=None):
+        """Records a heartbeat arriving at now (time.monotonic())."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            self.intervals.append(max(0.0, now - self.last_heartbeat))
+            self.last_heartbeat = now
+
+    def phi(self, now=None):
+        """Returns the current suspicion: -log10 of the probability that a heartbeat this late would still arrive."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            elapsed = now - self.last_heartbeat
+            mean = sum(self.intervals) / len(self.intervals)
+            std = max(self.min_std, math.sqrt(sum((interval - mean) ** 2 for interval in self.intervals) / len(self.intervals)))
+        later = 0.5 * math.erfc((elapsed - mean - self.acceptable_pause) / (std * math.sqrt(2)))
+        return -math.log10(max(later, 1e-300))
+
+    def is_available(self, now=None):
+        """Returns whether phi is still below the threshold."""
+        return self.phi(now) < self.threshold
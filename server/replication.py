@@ -0,0 +1,394 @@
+import functools
+import hashlib
+import heapq
+import json
+import operator
+import threading
+import time
+from collections import deque
+from concurrent import futures
+
+MAX_MERGED_OPERATIONS = 1000  # Past this many operations a merged update is sent as full state instead
+HASH_TREE_BUCKETS = 256  # Key ranges (leaves) a RangeHashTree splits the keys into
+HASH_TREE_FANOUT_BITS = 4  # Tree levels descended per comparison call, so 256 leaves take at most 3 calls
+
+class ReplicaUpdate:
+    """
+    One push of the leader's writes to a replica, as operations to replay or as full state.
+
+    Attributes:
+    ----------
+    push_users : bool
+        Whether the replica needs the users.
+    push_messages : bool
+        Whether the replica needs the messages.
+    commit_seq : int
+        The leader's commit sequence the replica reaches once the push is applied.
+    snapshot : concurrency.Snapshot
+        The state after the update, pushed if the operations cannot be.
+    operations : list of chat_pb2.Operation or None
+        The writes in seq order, or None to push the snapshot.
+    ticket : int
+        Set by the outbox: the number of updates enqueued up to and including this one.
+    nbytes : int
+        Set by the outbox: the serialized size of the operations, 0 for a full-state push.
+    enqueued_at : float
+        Set by the outbox: time.monotonic() when the update, or the oldest one merged into it, was enqueued.
+    """
+
+    def __init__(self, push_users, push_messages, commit_seq, snapshot, operations=None):
+        self.push_users = push_users
+        self.push_messages = push_messages
+        self.commit_seq = commit_seq
+        self.snapshot = snapshot
+        self.operations = operations
+        self.ticket = 0
+        self.nbytes = 0
+        self.enqueued_at = 0.0
+
+    def merge(self, newer):
+        """
+        Folds a newer update into this one: operations are concatenated, and the newer snapshot covers both
+        updates if either has to be pushed as full state or there are too many operations.
+        """
+        self.push_users = self.push_users or newer.push_users
+        self.push_messages = self.push_messages or newer.push_messages
+        self.commit_seq = max(self.commit_seq, newer.commit_seq)
+        self.nbytes += newer.nbytes
+        self.snapshot = newer.snapshot
+        if self.operations is None or newer.operations is None or len(self.operations) + len(newer.operations) > MAX_MERGED_OPERATIONS:
+            self.operations = None
+        else:
+            self.operations.extend(newer.operations)
+        self.ticket = newer.ticket
+
+class ReplicaOutbox:
+    """
+    Bounded queue of updates for one replica, sent in order by the outbox's own thread.
+
+    Writers only enqueue, so a client's reply never waits on a replica. A failed send is retried
+    with exponential backoff until it succeeds or the outbox is closed. Once max_backlog updates
+    are waiting, a new update is merged into the newest waiting one instead of growing the queue.
+
+    Attributes:
+    ----------
+    address : str
+        The replica's `ip:port`.
+    acked_seq : int
+        Highest commit_seq the replica has acknowledged.
+    sent_ticket : int
+        Ticket of the last update sent, so every update enqueued up to it has reached the replica.
+    coalesced : int
+        Updates merged into a waiting one because the backlog was full.
+    unacked_bytes : int
+        Serialized size of the operations enqueued but not acknowledged yet.
+    """
+
+    def __init__(self, address, send, max_backlog=64, retry_base=0.1, retry_max=5.0, on_ack=None):
+        """
+        Starts the outbox's sender thread.
+
+        Parameters:
+        ----------
+        address : str
+            The replica's `ip:port`.
+        send : callable
+            send(address, update) pushes one update, raising on failure.
+        max_backlog : int, optional
+            The most updates waiting to be sent.
+        retry_base : float, optional
+            Seconds before the first retry of a failed send, doubled after each failure.
+        retry_max : float, optional
+            The longest wait between retries.
+        on_ack : callable, optional
+            Called with no arguments after each update the replica acknowledges, e.g. to wake writes waiting on a write concern.
+        """
+        self.address = address
+        self.send = send
+        self.max_backlog = max(1, max_backlog)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.on_ack = on_ack
+        self.pending = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.enqueued = 0
+        self.sent_ticket = 0
+        self.acked_seq = 0
+        self.coalesced = 0
+        self.unacked_bytes = 0
+        self.in_flight = None  # The update being sent, off the queue but not acknowledged yet
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def enqueue(self, update):
+        """Queues an update without waiting for it to be sent."""
+        update.nbytes = sum(operation.ByteSize() for operation in update.operations) if update.operations is not None else 0
+        update.enqueued_at = time.monotonic()
+        with self.condition:
+            self.enqueued += 1
+            update.ticket = self.enqueued
+            self.unacked_bytes += update.nbytes
+            if len(self.pending) >= self.max_backlog:
+                self.pending[-1].merge(update)
+                self.coalesced += 1
+            else:
+                self.pending.append(update)
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until every update enqueued so far has been sent. Returns False on timeout or if the outbox closed first."""
+        with self.condition:
+            target = self.enqueued
+            return self.condition.wait_for(lambda: self.sent_ticket >= target or self.closed, timeout=timeout) and self.sent_ticket >= target
+
+    def backlog(self):
+        """Returns the number of updates waiting to be sent."""
+        with self.condition:
+            return len(self.pending)
+
+    def seconds_behind(self):
+        """Returns how long the oldest update not acknowledged yet has been waiting, or 0 if there is none."""
+        with self.condition:
+            oldest = self.in_flight or (self.pending[0] if self.pending else None)
+            return time.monotonic() - oldest.enqueued_at if oldest is not None else 0.0
+
+    def close(self):
+        """Stops the sender thread, dropping anything not sent yet."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def run(self):
+        """Sender loop: sends the oldest waiting update, retrying with backoff until it goes through."""
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if self.closed:
+                    return
+                update = self.pending.popleft()  # Off the queue while in flight, so nothing is merged into a push already sent
+                self.in_flight = update
+
+            delay = self.retry_base
+            while True:
+                try:
+                    self.send(self.address, update)
+                    break
+                except Exception as e:
+                    print(f"Push to replica {self.address} failed, retrying in {delay}s: {e}")
+                    with self.condition:
+                        if self.condition.wait_for(lambda: self.closed, timeout=delay):
+                            return
+                    delay = min(delay * 2, self.retry_max)
+
+            with self.condition:
+                self.sent_ticket = update.ticket
+                self.acked_seq = max(self.acked_seq, update.commit_seq)
+                self.unacked_bytes -= update.nbytes
+                self.in_flight = None
+                self.condition.notify_all()
+            if self.on_ack is not None:
+                self.on_ack()
+
+class OperationLog:
+    """
+    The leader's most recent writes as operations, kept so a rejoining replica only gets the writes it missed.
+
+    At most max_operations operations are kept; the oldest writes are compacted away first. A write
+    without operations can only reach replicas as full state, so it compacts away everything up to it.
+
+    Attributes:
+    ----------
+    compacted_seq : int
+        The log holds every write after this commit_seq.
+    """
+
+    def __init__(self, max_operations=100000, compacted_seq=0):
+        """
+        Initializes an empty log.
+
+        Parameters:
+        ----------
+        max_operations : int, optional
+            The most operations kept.
+        compacted_seq : int, optional
+            The commit_seq of the last write before the log starts.
+        """
+        self.max_operations = max_operations
+        self.compacted_seq = compacted_seq
+        self.writes = dict()  # commit_seq -> the write's operations
+        self.seqs = []  # Heap of the commit_seqs in writes, since concurrent writes may be appended out of order
+        self.size = 0  # Operations in writes
+        self.lock = threading.Lock()
+
+    def append(self, commit_seq, operations):
+        """Records a committed write's operations, or None if it can only be replicated as full state."""
+        with self.lock:
+            if operations is None:
+                self.compact(commit_seq)
+                return
+            if commit_seq <= self.compacted_seq:
+                return
+            self.writes[commit_seq] = list(operations)
+            heapq.heappush(self.seqs, commit_seq)
+            self.size += len(operations)
+            while self.size > self.max_operations:
+                self.compact(self.seqs[0])
+
+    def compact(self, commit_seq):
+        """Drops every write up to commit_seq. Requires self.lock."""
+        self.compacted_seq = max(self.compacted_seq, commit_seq)
+        while self.seqs and self.seqs[0] <= self.compacted_seq:
+            self.size -= len(self.writes.pop(heapq.heappop(self.seqs)))
+
+    def since(self, commit_seq):
+        """Returns the operations of every write after commit_seq in seq order, or None if some of them were compacted away."""
+        with self.lock:
+            if commit_seq < self.compacted_seq:
+                return None
+            return [operation for seq in sorted(seq for seq in self.writes if seq > commit_seq) for operation in self.writes[seq]]
+
+class SnapshotInstall:
+    """
+    A snapshot a replica is receiving in chunks. Chunks are kept until the last one arrives, so a
+    transfer cut off midway resumes from next_index instead of starting over.
+
+    Attributes:
+    ----------
+    snapshot_id : str
+        The snapshot's id, the same in every chunk of it.
+    log_id : str
+        The leader's log commit_seq belongs to.
+    commit_seq : int
+        The leader's commit sequence the snapshot was taken at.
+    next_index : int
+        The number of chunks received so far, which is the index of the next one expected.
+    users : dict
+        uid -> User received so far.
+    messages : dict
+        mid -> Message received so far.
+    """
+
+    def __init__(self, snapshot_id, log_id, commit_seq):
+        self.snapshot_id = snapshot_id
+        self.log_id = log_id
+        self.commit_seq = commit_seq
+        self.next_index = 0
+        self.users = dict()
+        self.messages = dict()
+
+    def add(self, index, users, messages):
+        """Adds the users and messages of chunk index. Ignores a chunk already received. Returns False if earlier chunks are missing."""
+        if index > self.next_index:
+            return False
+        if index == self.next_index:
+            self.users.update(users)
+            self.messages.update(messages)
+            self.next_index += 1
+        return True
+
+def fan_out(executor, addresses, call, timeout):
+    """
+    Calls call(address) for every address concurrently on executor, waiting at most timeout seconds in total.
+
+    Parameters:
+    ----------
+    executor : concurrent.futures.Executor
+        Runs the calls.
+    addresses : list of str
+        The servers to call.
+    call : callable
+        call(address) makes one call. It should carry its own deadline, so a hung server frees its thread.
+    timeout : float
+        Seconds to wait for the slowest call.
+
+    Returns:
+    -------
+    dict
+        address -> the call's result, the exception it raised, or a TimeoutError if it had not finished in time.
+    """
+    pending = {executor.submit(call, address): address for address in addresses}
+    done, _ = futures.wait(pending, timeout=timeout)
+    results = dict()
+    for future, address in pending.items():
+        if future not in done:
+            results[address] = TimeoutError(f"{address} did not answer within {timeout}s")
+        elif future.exception() is not None:
+            results[address] = future.exception()
+        else:
+            results[address] = future.result()
+    return results
+
+def key_bucket(key, buckets=HASH_TREE_BUCKETS):
+    """Returns the key range (leaf) a uid or mid falls in."""
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:4], "big") % buckets
+
+def record_digest(record):
+    """Returns a 64-bit hash of every field of a User or Message."""
+    return int.from_bytes(hashlib.sha256(json.dumps(vars(record), sort_keys=True).encode()).digest()[:8], "big")
+
+class RangeHashTree:
+    """
+    Hashes of a users or messages dict over key ranges, arranged as a binary tree so two servers can find
+    the ranges they disagree on by comparing a few node hashes instead of every record.
+
+    A leaf is the XOR of the digests of the records whose key falls in it, and a node the XOR of its
+    leaves, so a changed record only updates its own leaf. Refreshing from a snapshot only rehashes the
+    records replaced since the last refresh, which are the ones that are new objects.
+
+    Attributes:
+    ----------
+    depth : int
+        Depth of the leaves. Node (depth, index) covers leaves index << (self.depth - depth) onwards.
+    """
+
+    def __init__(self, buckets=HASH_TREE_BUCKETS):
+        """
+        Initializes a tree over no records.
+
+        Parameters:
+        ----------
+        buckets : int, optional
+            The number of leaves, a power of two.
+        """
+        self.buckets = buckets
+        self.depth = buckets.bit_length() - 1
+        self.leaves = [0] * buckets
+        self.records = dict()  # key -> (record last hashed, its digest, its bucket)
+        self.refreshed = None  # The records dict last refreshed from, skipped if passed again
+        self.lock = threading.Lock()
+
+    def refresh(self, records):
+        """Brings the leaves up to date with records, a dict of key -> record. Requires self.lock."""
+        if records is self.refreshed:
+            return
+        for key in self.records.keys() - records.keys():
+            _, digest, bucket = self.records.pop(key)
+            self.leaves[bucket] ^= digest
+        for key, record in records.items():
+            cached = self.records.get(key)
+            if cached is not None and cached[0] is record:
+                continue
+            if cached is not None:
+                _, digest, bucket = cached
+                self.leaves[bucket] ^= digest
+            else:
+                bucket = key_bucket(key, self.buckets)
+            digest = record_digest(record)
+            self.leaves[bucket] ^= digest
+            self.records[key] = (record, digest, bucket)
+        self.refreshed = records
+
+    def node_hashes(self, records, depth, indices):
+        """Refreshes from records and returns the hash of node (depth, index) for each index. Raises ValueError for a node outside the tree."""
+        if not 0 <= depth <= self.depth or any(not 0 <= index < 1 << depth for index in indices):
+            raise ValueError(f"No node at depth {depth} with indices {list(indices)} in a tree of depth {self.depth}")
+        width = 1 << (self.depth - depth)
+        with self.lock:
+            self.refresh(records)
+            return [functools.reduce(operator.xor, self.leaves[index * width:(index + 1) * width], 0) for index in indices]
+
+    def keys_in(self, buckets):
+        """Returns the keys, as of the last refresh, that fall in the given leaves."""
+        buckets = set(buckets)
+        with self.lock:
+            return [key for key, (_, _, bucket) in self.records.items() if bucket in buckets]
@@ -0,0 +1,304 @@
+import asyncio
+import grpc
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import chat_pb2
+import chat_pb2_grpc
+from grpc_config import channel_compression, server_options, max_concurrent_rpcs
+from concurrent import futures
+from server_proto import (ChatService, COMPRESSION, SESSION_OPERATIONS, SessionOperationContext, save_replication_position,
+                          resolve_addresses, add_listening_ports, build_arg_parser, load_runtime_settings, service_kwargs)
+
+class AsyncChatService(ChatService):
+    """
+    ChatService for a grpc.aio server.
+
+    Writes are coroutines: the in-memory change is applied on the event loop, then the JSON
+    flush runs on a worker thread and the update is queued for every replica, so a slow disk
+    only delays the RPCs waiting on it instead of holding a thread, and a slow replica delays none.
+    Reads are inherited unchanged and run on the server's migration thread pool.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Initializes the ChatService plus the state used to batch flushes."""
+        super().__init__(*args, **kwargs)
+        self.write_generation = 0  # Bumped by every write that needs to reach disk
+        self.saved_generation = 0  # Newest write generation known to be on disk
+        self.persist_lock = None  # asyncio primitives are created on the server's loop in on_server_start_async
+        self.background_tasks = set()  # Heartbeat loops, referenced so they are not garbage collected
+
+    async def on_server_start_async(self):
+        """Setup server when server starts, with heartbeat loops as tasks on the running loop."""
+        self.loop = asyncio.get_running_loop()
+        self.persist_lock = asyncio.Lock()
+        if self.is_leader:
+            self.on_server_start()
+        else:
+            # The leader pushes its state back to us while registering, which this loop has to be free to serve
+            print("Calling on_server_start")
+            await asyncio.to_thread(self.register_with_leader)
+            self.start_heartbeat_loop()
+            self.start_anti_entropy_loop()
+            print(f"    ChatService __init__: replica_list={self.replica_list}")
+
+    def start_background_task(self, coroutine):
+        """Runs a coroutine as a task on the server's loop for the lifetime of the server."""
+        task = self.loop.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    def start_heartbeat_loop(self):
+        """Start sending heartbeat pings to the leader from an asyncio task."""
+        self.start_background_task(self.heartbeat_loop())
+
+    def start_leader_heartbeat_loop(self):
+        """Start sending heartbeat pings from leader to all replicas from an asyncio task."""
+        self.start_background_task(self.leader_heartbeat_loop())
+
+    async def heartbeat_loop(self):
+        """Pings the leader over its pooled channel every heartbeat interval and runs an election once the failure detector suspects it."""
+        self.leader_detector = self.new_failure_detector()
+        while True:
+            try:
+                print(f"Sending heartbeat request to leader {self.leader_address}")
+                request = chat_pb2.HeartbeatRequest(server_id=self.local_address)
+                response = await asyncio.to_thread(self.channel_pool.call, self.leader_address, "Heartbeat", request, timeout=self.heartbeat_deadline())
+                assert(response.success)
+                self.leader_detector.heartbeat()
+            except Exception as e:
+                if self.leader_failed(e):
+                    self.leader_election()
+                    print(f"Im leader: {self.is_leader}")
+                    if self.is_leader: break
+                    self.leader_detector = self.new_failure_detector()  # Start over with the new leader
+
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def leader_heartbeat_loop(self):
+        """Pings every replica concurrently each heartbeat interval and drops the ones the failure detector suspects."""
+        while True:
+            replicas = [replica for replica in self.replica_list if replica != self.leader_address]
+            alive = dict(zip(replicas, await asyncio.gather(*(self.ping_replica(replica) for replica in replicas))))
+            down = self.drop_suspected_replicas(replicas, alive)
+            for replica in down:
+                self.channel_pool.evict(replica)
+                print(f"Replica down {replica}, removed from replica_list")
+
+            # If replica list changed, propogate updated list to all other replicas
+            if down:
+                self.close_stale_outboxes()
+                await self.push_replica_list_to_replicas()
+
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def ping_replica(self, replica):
+        """Returns whether a replica answers a heartbeat, probing it over the pooled channel on a worker thread."""
+        try:
+            return await asyncio.to_thread(super().ping_replica, replica)
+        except grpc.RpcError:
+            return False
+
+    async def persist(self):
+        """
+        Flushes users and messages to disk on a worker thread.
+        Writes that arrive while a flush is running share the next flush instead of queueing one each.
+        """
+        self.write_generation += 1
+        generation = self.write_generation
+        async with self.persist_lock:
+            if self.saved_generation >= generation:  # A flush that started after this write already covered it
+                return
+            generation = self.write_generation
+            position = (self.applied_log_id, self.commit_seq)  # Read before the snapshot, so it never runs ahead of the data
+            snapshot = self.snapshots.snapshot()  # Writes applied on the loop during the flush do not change it
+            await asyncio.to_thread(self.save_snapshot, snapshot)
+            if not self.is_leader:
+                await asyncio.to_thread(save_replication_position, self.local_ip, self.local_port, *position)
+            self.saved_generation = generation
+
+    async def run_write_async(self, apply, request, context=None):
+        """
+        Applies a write to in-memory state, then awaits its flush and queues it for every replica
+        before notifying sessions, mirroring ChatService.run_write. Replica acknowledgements for the
+        write concern are awaited on a worker thread.
+        """
+        try:
+            concern = self.requested_write_concern(context)
+        except ValueError as e:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        reason = await asyncio.to_thread(self.apply_backpressure) if self.backpressure != "off" else None
+        if reason is not None:
+            if context is None:
+                raise RuntimeError(reason)
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, reason)
+        response, push_users, push_messages, operations = apply(request)
+        if push_users or push_messages:
+            if not response.commit_seq:  # Writes replicated as operations are stamped by apply
+                response.commit_seq = self.stamp_write(operations)
+            self.operation_log.append(response.commit_seq, operations)
+            await self.persist()
+            self.update_replicas(push_users = push_users, push_messages = push_messages, commit_seq = response.commit_seq, operations = operations)  # Only enqueues
+            if push_messages:
+                self.notify_sessions()
+            if concern != "leader" and not await asyncio.to_thread(self.wait_for_write_concern, response.commit_seq, concern):
+                message = self.write_concern_error(response.commit_seq, concern)
+                if context is None:
+                    raise TimeoutError(message)
+                await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, message)
+        return response
+
+    async def push_replica_list_to_replicas(self):
+        """
+        Pushes the replica list to every replica concurrently, each over its pooled channel on a worker thread.
+        A replica that fails does not stop the others.
+        """
+        print("Calling push_replica_list_to_replicas")
+        replicas = [replica_address for replica_address in self.replica_list if replica_address != self.leader_address]
+        results = await asyncio.gather(*(asyncio.to_thread(self.push_replica_list_to_replica, replica_address) for replica_address in replicas), return_exceptions=True)
+        for replica_address, result in zip(replicas, results):
+            if isinstance(result, Exception):  # Left to the heartbeat loop, which drops replicas that stop answering
+                print(f"    Could not push replica list to {replica_address}: {result}")
+
+    async def LoginPassword(self, request, context):
+        """Handles login by verifying the hashed password."""
+        print("Calling LoginPassword")
+        if not self.is_new_account(request.username):  # Logging in to an existing account writes nothing, so it skips backpressure
+            return self.apply_login_password(request)[0]
+        return await self.run_write_async(self.apply_login_password, request, context)
+
+    async def DeleteAccount(self, request, context):
+        """Deletes a user account by UID."""
+        print("Calling DeleteAccount")
+        return await self.run_write_async(self.apply_delete_account, request, context)
+
+    async def SendMessage(self, request, context):
+        """Handles sending a message from one user to another."""
+        print("Calling SendMessage")
+        return await self.run_write_async(self.apply_send_message, request, context)
+
+    async def SendMessages(self, request, context):
+        """Sends every text to every recipient with a single persistence flush and replication round."""
+        print("Calling SendMessages")
+        return await self.run_write_async(self.apply_send_messages, request, context)
+
+    async def MarkMessageRead(self, request, context):
+        """Marks a specific message as read."""
+        print("Calling MarkMessageRead")
+        return await self.run_write_async(self.apply_mark_message_read, request, context)
+
+    async def DeleteMessages(self, request, context):
+        """Deletes multiple messages for a given user."""
+        print("Calling DeleteMessages")
+        return await self.run_write_async(self.apply_delete_messages, request, context)
+
+    async def Session(self, request_iterator, context):
+        """Serves a client's pipelined operations over one stream and pushes its mailbox events on the same stream."""
+        print("Calling Session")
+        responses = asyncio.Queue()
+        subscription = {"uid": None}
+
+        async def read_requests():
+            # Operations are applied in the order the client sent them, so dependent requests can be pipelined
+            try:
+                async for request in request_iterator:
+                    if request.uid and subscription["uid"] is None:
+                        subscription["uid"] = request.uid
+                        self.subscribe_session(request.uid, responses)
+                    operation = request.WhichOneof("operation")
+                    if operation is not None:
+                        responses.put_nowait(await self.handle_session_request_async(request, operation, context))
+            except grpc.RpcError:
+                print("    Session closed by client")
+            finally:
+                responses.put_nowait(None)
+
+        reader = asyncio.create_task(read_requests())
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    break
+                yield response
+        finally:
+            reader.cancel()
+            if subscription["uid"] is not None:
+                self.unsubscribe_session(subscription["uid"], responses)
+
+    async def handle_session_request_async(self, request, operation, context):
+        """Runs one session operation through its handler, awaiting it if it is a coroutine."""
+        handler = getattr(self, SESSION_OPERATIONS[operation])
+        try:
+            result = handler(getattr(request, operation), SessionOperationContext(context))  # Its abort raises before any await
+            if asyncio.iscoroutine(result):
+                result = await result
+        except Exception as e:
+            print(f"    Session operation {operation} failed: {e}")
+            return chat_pb2.SessionResponse(correlation_id=request.correlation_id, error=str(e))
+        return chat_pb2.SessionResponse(correlation_id=request.correlation_id, **{operation: result})
+
+    async def RegisterReplica(self, request, context):
+        """Registers a new replica with the leader and pushes out updated replica list to other replicas."""
+        print("Calling RegisterReplica")
+
+        # Add replica to replica_list
+        replica_address = f"{request.ip_address}:{request.port}"
+        self.add_replica(replica_address)
+        print(f"    Added replica to replica_list: self.replica_list={self.replica_list}")
+
+        # Push the writes the replica is missing, then the replica list to every replica
+        await asyncio.to_thread(self.catch_up_replica, replica_address, request.log_id, request.applied_seq)
+        print(f"    Brought replica up to date")
+        await self.push_replica_list_to_replicas()
+
+        return chat_pb2.RegisterReplicaResponse(success=True)
+
+    async def InstallSnapshot(self, request_iterator, context):
+        """Leader streams its users and messages in chunks. They replace this replica's state once the last chunk arrives."""
+        print("Calling InstallSnapshot")
+        install = None
+        async for chunk in request_iterator:
+            install = self.receive_snapshot_chunk(chunk)
+            if install is None:
+                await context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Chunk {chunk.index} of snapshot {chunk.snapshot_id} is ahead of the chunks received")
+            if chunk.last:
+                await self.persist()
+        return chat_pb2.InstallSnapshotResponse(success=True, next_index=install.next_index if install else 0, commit_seq=self.commit_seq)
+
+    async def ApplyOperations(self, request, context):
+        """Leader calls replica's ApplyOperations to replay its writes."""
+        print("Calling ApplyOperations")
+        response, users_changed, messages_changed = self.apply_operations(request)
+        if users_changed or messages_changed:
+            await self.persist()
+        return response
+
+    async def RepairRanges(self, request, context):
+        """Leader sends its records in the key ranges where this replica's hashes differ from its own."""
+        print("Calling RepairRanges")
+        response = self.repair_ranges(request)
+        if response.repaired:
+            await self.persist()
+        return response
+
+async def serve_aio(args):
+    """Starts the grpc.aio server."""
+    leader_ip, leader_port, local_ip, local_port = resolve_addresses(args)
+    settings = load_runtime_settings(args)  # max_workers sizes the pool for the handlers that stay synchronous
+
+    server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=settings["max_workers"]),
+                             options=server_options(settings), maximum_concurrent_rpcs=max_concurrent_rpcs(settings),
+                             compression=channel_compression(COMPRESSION))
+    chat_service = AsyncChatService(args.is_leader, local_ip, local_port, leader_ip, leader_port, args.hi, **service_kwargs(settings))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
+    add_listening_ports(server, args.is_leader, leader_ip, leader_port, local_ip, local_port)
+
+    await server.start()
+    await chat_service.on_server_start_async()
+
+    print(f"Server Aio started on port {leader_port}...")
+    await server.wait_for_termination()
+
+if __name__ == "__main__":
+    args = build_arg_parser(description="Start the asyncio Chat Server with optional parameters.").parse_args()
+    asyncio.run(serve_aio(args))
@@ -5,23 +5,57 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 import chat_pb2
 import chat_pb2_grpc
+from grpc_config import (load_compression_settings, compression_for, channel_compression, SERVER_SETTINGS, load_server_settings,
+                         server_options, channel_options, max_concurrent_rpcs, log_server_settings, parse_write_concern)
 from concurrent import futures
 import json
 import hashlib
 import configparser
+import uuid
 from controller.login import check_username_exists, check_username_password, create_account
 from controller.accounts import list_accounts, delete_account
-from controller.messages import get_message_by_mid, get_received_messages_id, get_sent_messages_id, send_message, mark_message_read, delete_messages
+from controller.messages import get_received_messages_id, get_sent_messages_id, send_message, send_messages, mark_message_read, delete_messages, get_inbox_summary
+from controller.sync import get_mailbox_changes, get_mailbox_version
+from cache import ResponseCache
+from concurrency import ReadWriteLock, LockStripes, SnapshotStore, CommandQueue
+from failure_detector import PhiAccrualDetector
+from replication import ReplicaUpdate, ReplicaOutbox, OperationLog, SnapshotInstall, RangeHashTree, HASH_TREE_FANOUT_BITS, record_digest, fan_out
+from channel_pool import ChannelPool
 from model import User, Message
-from utils import dict_to_object_recursive, object_to_dict_recursive, protobuf_list_to_object, object_to_protobuf_list
+from utils import dict_to_object_recursive, object_to_dict_recursive, protobuf_list_to_object, project_fields
 import socket
 import threading
 import time
+import queue
 
 # Load config
 config = configparser.ConfigParser()
 config.read("config.ini")
 HOST = config["network"]["host"]
+COMPRESSION = load_compression_settings(config)
+CHANNEL_OPTIONS = channel_options(load_server_settings(config))  # Used when the server is not started through serve()
+RESPONSE_CACHE_SIZE = load_server_settings(config)["response_cache_size"]
+READ_WAIT_SECONDS = 0.5  # How long a lagging replica holds a read for its min_seq before redirecting to the leader
+MAILBOX_LOCK_STRIPES = 64  # Per-user locks that mailbox changes hash onto
+BOOTSTRAP_PAGE_SIZE = 20  # Messages per mailbox returned by Bootstrap when the client does not ask for a size
+REGISTRATION_PUSH_TIMEOUT = 30  # Seconds RegisterReplica waits for the new replica to receive the leader's state
+FAN_OUT_WORKERS = 16  # Threads calling replicas concurrently for heartbeats and replica list pushes
+SNAPSHOT_STREAM_TIMEOUT = 60  # Deadline of one InstallSnapshot stream. A stream cut short resumes where it stopped on the next retry
+WRITE_CONCERN_METADATA = "write-concern"  # Call metadata key a client sets to override the server's write concern for one write
+
+# Session operation (SessionRequest oneof field) -> unary handler that serves it
+SESSION_OPERATIONS = {
+    "send_message": "SendMessage",
+    "send_messages": "SendMessages",
+    "mark_message_read": "MarkMessageRead",
+    "delete_messages": "DeleteMessages",
+    "get_message_by_mid": "GetMessageByMid",
+    "get_received_messages": "GetReceivedMessages",
+    "get_sent_messages": "GetSentMessages",
+    "sync_mailbox": "SyncMailbox",
+    "list_accounts": "ListAccounts",
+    "get_messages_by_mid": "GetMessagesByMid",
+}
 
 def load_users_and_messages(ip, port, is_leader):
     """Loads user data from the JSON file."""
@@ -52,8 +86,15 @@ def load_users_and_messages(ip, port, is_leader):
     
     return users_dict, messages_dict
 
+SAVE_LOCK = threading.Lock()  # Concurrent saves would interleave their writes to the same files
+
 def save_users_and_messages(ip, port, users_dict, messages_dict, is_leader):
-    """Saves user data to the JSON file."""
+    """Saves user data to the JSON file. Pass a snapshot's users and messages so the dump cannot see a write half applied."""
+    with SAVE_LOCK:
+        write_users_and_messages(ip, port, dict(users_dict), dict(messages_dict), is_leader)  # json cannot dump a mappingproxy
+
+def write_users_and_messages(ip, port, users_dict, messages_dict, is_leader):
+    """Writes user and message data to the process specific and, for the leader, global JSON files."""
     print("Calling save_users_and_messages")
     with open(f"server/data/user_{ip}_{port}.json", "w") as f:
         json.dump(users_dict, f, default=object_to_dict_recursive, indent=4)
@@ -72,13 +113,97 @@ def save_users_and_messages(ip, port, users_dict, messages_dict, is_leader):
             json.dump(messages_dict, f, default=object_to_dict_recursive, indent=4)
         print(f"    Finished writing GLOBAL messages_dict")
 
+def load_replication_position(ip, port):
+    """Returns (log_id, applied_seq) a replica saved with its users and messages, or ("", 0) if it has none."""
+    position_filepath = f"server/data/replication_{ip}_{port}.json"
+    if not os.path.exists(position_filepath):
+        return "", 0
+    with open(position_filepath, "r") as f:
+        position = json.load(f)
+    return position["log_id"], position["applied_seq"]
+
+def save_replication_position(ip, port, log_id, applied_seq):
+    """Saves the leader log and last write a replica's saved users and messages include."""
+    with open(f"server/data/replication_{ip}_{port}.json", "w") as f:
+        json.dump({"log_id": log_id, "applied_seq": applied_seq}, f)
+
+def snapshot_commit_seq(applied):
+    """Returns the highest commit sequence among applied (future, response) pairs, the one replicas reach with this batch."""
+    return max((response.commit_seq for _, response in applied), default=0)
+
+def send_operation(message):
+    """Returns the operation that replays sending a message on a replica."""
+    return chat_pb2.Operation(send_message=chat_pb2.SendMessageOp(mid=message.mid, sender=message.sender, receiver_username=message.receiver_username,
+                                                                  text=message.text, timestamp=message.timestamp))
+
+# MessageData field -> the GetMessageResponse field carrying it, where the names differ
+GET_MESSAGE_RESPONSE_FIELDS = {"sender": "sender_uid", "receiver": "receiver_uid"}
+
+def project_message(message, fields):
+    """
+    Returns a message's MessageData fields limited to the requested ones, the names both GetMessageRequest.fields
+    and GetMessagesByMidRequest.fields use. The mid is always kept.
+    """
+    return project_fields(vars(message), fields, always=("mid",))
+
+def snapshot_chunks(snapshot, snapshot_id, log_id, commit_seq, chunk_bytes, start=0):
+    """
+    Yields a snapshot as SnapshotChunks of at most about chunk_bytes each, messages first, then users. Chunks
+    before start are skipped. Only one chunk is held at a time, so memory does not grow with the dataset.
+    """
+    chunk, size = chat_pb2.SnapshotChunk(snapshot_id=snapshot_id, log_id=log_id, commit_seq=commit_seq, index=0), 0
+    for field, proto_class, records in (("messages", chat_pb2.MessageData, snapshot.messages), ("users", chat_pb2.UserData, snapshot.users)):
+        for record in records.values():
+            data = proto_class(**vars(record))
+            data_size = data.ByteSize()
+            if size and size + data_size > chunk_bytes:  # A record bigger than chunk_bytes still gets a chunk of its own
+                if chunk.index >= start:
+                    yield chunk
+                chunk, size = chat_pb2.SnapshotChunk(snapshot_id=snapshot_id, log_id=log_id, commit_seq=commit_seq, index=chunk.index + 1), 0
+            getattr(chunk, field).append(data)
+            size += data_size
+    chunk.last = True
+    if chunk.index >= start:
+        yield chunk
+
+class SessionOperationAborted(Exception):
+    """Raised by SessionOperationContext.abort in place of failing the whole Session stream."""
+
+    def __init__(self, code, details):
+        super().__init__(f"{code.name}: {details}")
+        self.code = code
+        self.details = details
+
+class SessionOperationContext:
+    """
+    The context a unary handler sees when it serves one operation of a Session stream.
+
+    Everything is read from the stream's context, except that abort fails only this operation:
+    it raises SessionOperationAborted, which handle_session_request turns into the response's error.
+    """
+
+    def __init__(self, stream_context):
+        self.stream_context = stream_context
+
+    def abort(self, code, details):
+        raise SessionOperationAborted(code, details)
+
+    def set_compression(self, compression):
+        pass  # The stream's compression is shared by every operation on it
+
+    def __getattr__(self, name):
+        return getattr(self.stream_context, name)
 
 def hash_password(password):
     """Hashes a password using SHA-256."""
     return hashlib.sha256(password.encode()).hexdigest()
 
 class ChatService(chat_pb2_grpc.ChatServiceServicer):
-    def __init__(self, is_leader, local_ip, local_port, leader_ip, leader_port, heartbeat_interval):
+    def __init__(self, is_leader, local_ip, local_port, leader_ip, leader_port, heartbeat_interval, outgoing_options=None, response_cache_size=RESPONSE_CACHE_SIZE, write_batch_size=None,
+                 replication_backlog=64, replication_retry_ms=100, replication_retry_max_ms=5000, replica_timeout_ms=5000,
+                 write_concern="leader", write_concern_timeout_ms=5000, snapshot_chunk_bytes=1024 * 1024, operation_log_size=100000,
+                 anti_entropy_interval_ms=30000, backpressure="off", backpressure_max_lag_writes=10000, backpressure_max_lag_ms=10000,
+                 backpressure_timeout_ms=1000, phi_threshold=8.0, phi_window=100, phi_min_std_ms=100, phi_acceptable_pause_ms=1000):
         """Initializes the ChatService with user and message data."""
         self.is_leader = is_leader
         self.local_ip = local_ip
@@ -87,25 +212,97 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         self.leader_ip = leader_ip
         self.leader_port = leader_port
         self.leader_address = f"{self.leader_ip}:{self.leader_port}"
-        self.users_dict, self.messages_dict = load_users_and_messages(self.local_ip, self.local_port, self.is_leader)  # Load users and messages from process specific persistent storage
+        self.users_dict, self.messages_dict = self.load_state()  # Load users and messages from process specific persistent storage
         self.heartbeat_interval = heartbeat_interval
+        self.channel_options = outgoing_options if outgoing_options is not None else CHANNEL_OPTIONS  # Options for channels to other servers
+        self.channel_pool = ChannelPool(self.channel_options, channel_compression(COMPRESSION))  # Channels to other servers, reused across calls
+        self.mailbox_changes = dict()  # uid -> recent changes to the user's received mailbox, used for delta sync
+        self.mailbox_epoch = str(uuid.uuid4())  # Mailbox versions are only comparable within one server lifetime
+        self.sessions = dict()  # uid -> {open session's response queue: last mailbox version pushed to it}
+        self.sessions_lock = threading.Lock()
+        self.response_cache = ResponseCache(response_cache_size)  # Responses derived only from the user set
+        self.users_version = 0  # Bumped whenever an account is created or deleted or users are synced from the leader
+        self.users_version_lock = threading.Lock()
+        # Leader: last write committed. Replica: last leader write applied, from the log applied_log_id, resumed from disk after a restart
+        self.applied_log_id, self.commit_seq = ("", 0) if is_leader else load_replication_position(local_ip, local_port)
+        self.log_id = str(uuid.uuid4())  # Identifies this server's commit_seqs while it leads; a new leader starts a new log
+        self.operation_log = OperationLog(operation_log_size, compacted_seq=self.commit_seq)  # Leader: recent writes for rejoining replicas
+        self.commit_cond = threading.Condition()  # Notified when a replica applies a newer commit_seq
+        self.accounts_lock = ReadWriteLock()  # Shared by lookups over the account set, exclusive to change it or swap in leader state
+        self.mailbox_locks = LockStripes(MAILBOX_LOCK_STRIPES)  # Per-user locks for changes to a user's mailboxes
+        self.snapshots = SnapshotStore(self.users_dict, self.messages_dict)  # Immutable copies for reads, replication and saves
+        # Single-writer mode: writes are queued to one applier thread and committed in batches of up to write_batch_size
+        self.write_queue = CommandQueue(self.commit_batch, write_batch_size) if write_batch_size is not None else None
+        self.outboxes = dict()  # replica address -> ReplicaOutbox sending it updates off the request path
+        self.outboxes_lock = threading.Lock()
+        self.apply_operations_lock = threading.Lock()  # Replica: operation batches from the leader are applied one at a time
+        self.replica_timeout = replica_timeout_ms / 1000  # Deadline, in seconds, of every call between leader and replicas
+        self.fan_out_pool = futures.ThreadPoolExecutor(max_workers=FAN_OUT_WORKERS)
+        self.replication_backlog = replication_backlog
+        self.replication_retry = (replication_retry_ms / 1000, replication_retry_max_ms / 1000)  # Backoff of failed pushes, in seconds
+        self.write_concern = write_concern  # Servers that must have saved a write before it is acknowledged: leader, majority or all
+        self.write_concern_timeout = write_concern_timeout_ms / 1000
+        self.acks_cond = threading.Condition()  # Notified when a replica acknowledges an update or leaves the replica list
+        self.snapshot_chunk_bytes = snapshot_chunk_bytes
+        self.snapshot_install = None  # Replica: SnapshotInstall of the snapshot being received, kept so an interrupted stream can resume
+        self.installed_snapshot_id = None  # Replica: id of the last snapshot installed
+        self.snapshot_install_lock = threading.Lock()
+        self.hash_trees = {"users": RangeHashTree(), "messages": RangeHashTree()}  # Hashes of snapshot records by key range, compared by anti-entropy
+        self.anti_entropy_interval = anti_entropy_interval_ms / 1000  # Leader: seconds between comparisons with each replica, 0 to turn them off
+        self.anti_entropy_rounds = 0
+        self.anti_entropy_skipped = 0
+        self.divergent_ranges = 0
+        self.repaired_records = 0
+        self.replica_applied_seqs = dict()  # Leader: replica address -> commit_seq it reported in its last heartbeat
+        self.backpressure = backpressure  # Leader: off, or throttle or reject writes while a replica is past the lag limits
+        self.backpressure_max_lag_writes = backpressure_max_lag_writes
+        self.backpressure_max_lag = backpressure_max_lag_ms / 1000
+        self.backpressure_timeout = backpressure_timeout_ms / 1000
+        self.writes_throttled = 0
+        self.writes_rejected = 0
+        self.phi_threshold = phi_threshold  # Failure detection: suspicion at which a leader or replica is taken to be down
+        self.phi_window = phi_window
+        self.phi_min_std = phi_min_std_ms / 1000
+        self.phi_acceptable_pause = phi_acceptable_pause_ms / 1000
+        self.replica_detectors = dict()  # Leader: replica address -> PhiAccrualDetector fed by the heartbeat loop's probes
+        self.replica_list_lock = threading.Lock()  # Held to change replica_list or replica_detectors, which registrations and the heartbeat loop both do
+        self.leader_detector = None  # Replica: PhiAccrualDetector for the current leader, started by the heartbeat loop
+
+    def load_state(self):
+        """Returns (users_dict, messages_dict) from this server's persistent storage."""
+        return load_users_and_messages(self.local_ip, self.local_port, self.is_leader)
+
+    def save_snapshot(self, snapshot):
+        """Persists a snapshot's users and messages to this server's storage."""
+        save_users_and_messages(self.local_ip, self.local_port, snapshot.users, snapshot.messages, self.is_leader)
+
+    def save_replica_state(self):
+        """Persists this replica's users and messages with the position in the leader's log they include."""
+        log_id, applied_seq = self.applied_log_id, self.commit_seq  # Read before the snapshot, so the saved position never runs ahead of the data
+        self.save_snapshot(self.snapshots.snapshot())
+        save_replication_position(self.local_ip, self.local_port, log_id, applied_seq)
+
+    def mint_uid(self):
+        """Returns the uid for a new account."""
+        return str(uuid.uuid4())
 
     def start_heartbeat_loop(self):
         """Start sending heartbeat pings to the leader on a background thread."""
         def heartbeat_loop():
+            self.leader_detector = self.new_failure_detector()
             while True:
                 try:
-                    with grpc.insecure_channel(self.leader_address) as channel:
-                        stub = chat_pb2_grpc.ChatServiceStub(channel)
-                        print(f"Sending heartbeat request to leader {self.leader_address}")
-                        request = chat_pb2.HeartbeatRequest(server_id=self.local_address)
-                        response = stub.Heartbeat(request)
-                        assert(response.success)
+                    print(f"Sending heartbeat request to leader {self.leader_address}")
+                    request = chat_pb2.HeartbeatRequest(server_id=self.local_address)
+                    response = self.channel_pool.call(self.leader_address, "Heartbeat", request, timeout=self.heartbeat_deadline())
+                    assert(response.success)
+                    self.leader_detector.heartbeat()
                 except Exception as e:
-                    print(f"Heartbeat failed: {e}")
-                    self.leader_election()
-                    print(f"Im leader: {self.is_leader}")
-                    if self.is_leader: break
+                    if self.leader_failed(e):
+                        self.leader_election()
+                        print(f"Im leader: {self.is_leader}")
+                        if self.is_leader: break
+                        self.leader_detector = self.new_failure_detector()  # Start over with the new leader
 
                 time.sleep(self.heartbeat_interval)
 
@@ -114,38 +311,179 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
     def start_leader_heartbeat_loop(self):
         """Start sending heartbeat pings from leader to all replicas on a background thread."""
         def leader_heartbeat_loop():
-            replica_down = False
             while True:
-                for replica in self.replica_list:
-                    if replica == self.leader_address:  # Only send heartbeat check to replicas and skip leader
-                        continue
-                    try:
-                        with grpc.insecure_channel(replica) as channel:
-                            stub = chat_pb2_grpc.ChatServiceStub(channel)
-                            print(f"Sending heartbeat request to replica {replica}")
-                            request = chat_pb2.HeartbeatRequest(server_id=self.leader_address)
-                            response = stub.Heartbeat(request)
-                            assert(response.success)
-                    except Exception as e:
-                        replica_down = True
-                        self.replica_list.remove(replica)
-                        print(f"Replica down {replica}, removed from replica_list")
-                
+                replicas = [replica for replica in self.replica_list if replica != self.leader_address]  # Only check replicas, not the leader
+                alive = self.fan_out(replicas, self.ping_replica, self.heartbeat_deadline())
+                down = self.drop_suspected_replicas(replicas, alive)
+                for replica in down:
+                    self.channel_pool.evict(replica)
+                    print(f"Replica down {replica}, removed from replica_list: {alive[replica]}")
+
                 # If replica list changed, propogate updated list to all other replicas
-                if replica_down:
-                    for replica in self.replica_list:
-                        self.push_replica_list_to_replica(replica)
+                if down:
+                    self.close_stale_outboxes()
+                    self.push_replica_list_to_replicas()
 
                 time.sleep(self.heartbeat_interval)
 
         threading.Thread(target=leader_heartbeat_loop, daemon=True).start()
 
+    def heartbeat_deadline(self):
+        """
+        Returns the deadline, in seconds, of a heartbeat probe: at most one heartbeat interval, so a server that hangs
+        is judged by the failure detector a heartbeat late, instead of only once the probe gives up after replica_timeout.
+        """
+        return min(self.heartbeat_interval, self.replica_timeout)
+
+    def new_failure_detector(self):
+        """Returns a PhiAccrualDetector with this server's settings, started as if a heartbeat had just arrived."""
+        return PhiAccrualDetector(self.heartbeat_interval, self.phi_threshold, self.phi_window, self.phi_min_std, self.phi_acceptable_pause)
+
+    def drop_suspected_replicas(self, replicas, alive):
+        """Removes the replicas the failure detector suspects after a round of probes from the replica list, and returns them."""
+        with self.replica_list_lock:  # A replica registering meanwhile is either reset before this or added back after it
+            down = self.suspected_replicas(replicas, alive)
+            if down:
+                self.replica_list = [replica for replica in self.replica_list if replica not in down]  # Swapped whole, since other threads iterate it
+        return down
+
+    def add_replica(self, replica_address):
+        """Adds a registering replica to the replica list, with a fresh failure detector if it had one from before a restart."""
+        with self.replica_list_lock:
+            if replica_address not in self.replica_list:
+                self.replica_list.append(replica_address)
+            self.replica_detectors.pop(replica_address, None)
+
+    def suspected_replicas(self, replicas, alive):
+        """
+        Records a heartbeat from each replica that answered its probe (alive[replica] is True) and returns the replicas the
+        failure detector now suspects. A suspected replica's detector is dropped, so it starts over if the replica registers again.
+        The caller holds replica_list_lock.
+        """
+        suspected = []
+        for replica in replicas:
+            detector = self.replica_detectors.get(replica)
+            if detector is None:
+                detector = self.replica_detectors[replica] = self.new_failure_detector()
+            if alive[replica] is True:
+                detector.heartbeat()
+            elif not detector.is_available():
+                suspected.append(replica)
+                self.replica_detectors.pop(replica, None)
+            else:
+                print(f"Replica {replica} missed a heartbeat, suspicion phi={detector.phi():.2f} of {self.phi_threshold}: {alive[replica]}")
+        return suspected
+
+    def leader_failed(self, error):
+        """Called when a heartbeat to the leader fails. Returns whether the failure detector now suspects the leader."""
+        phi = self.leader_detector.phi()
+        print(f"Heartbeat failed: {error}, leader suspicion phi={phi:.2f} of {self.phi_threshold}")
+        return phi >= self.phi_threshold
+
+    def start_anti_entropy_loop(self):
+        """
+        Start comparing each replica's users and messages with the leader's every anti_entropy_interval on a background thread.
+        Replicas run the loop too but only compare once they are elected leader.
+        """
+        def anti_entropy_loop():
+            while True:
+                time.sleep(self.anti_entropy_interval)
+                if not self.is_leader:
+                    continue
+                for replica in [replica for replica in self.replica_list if replica != self.leader_address]:
+                    try:
+                        self.anti_entropy_round(replica)
+                    except Exception as e:
+                        print(f"Anti-entropy with {replica} failed: {e}")
+
+        if self.anti_entropy_interval > 0:
+            threading.Thread(target=anti_entropy_loop, daemon=True).start()
+
+    def anti_entropy_round(self, replica_address):
+        """
+        Compares the leader's users and messages with a replica's by their hash trees, and sends the replica the leader's
+        records in every key range that differs. Returns the number of records the replica repaired, or None if the replica
+        was not at the leader's commit_seq, so the two could not be compared.
+        """
+        print(f"Comparing state with replica {replica_address}")
+        commit_seq = self.commit_seq  # Read first: the snapshot can only be ahead of it, and a repair sends the newer records anyway
+        snapshot = self.snapshots.snapshot()
+        user_buckets = self.differing_ranges(replica_address, "users", snapshot.users, commit_seq)
+        message_buckets = self.differing_ranges(replica_address, "messages", snapshot.messages, commit_seq) if user_buckets is not None else None
+        if message_buckets is None:
+            self.anti_entropy_skipped += 1
+            return None
+        if not user_buckets and not message_buckets:
+            self.anti_entropy_rounds += 1
+            return 0
+
+        request = chat_pb2.RangeRepairRequest(commit_seq=commit_seq, user_buckets=user_buckets, message_buckets=message_buckets,
+                                              users=[chat_pb2.UserData(**vars(snapshot.users[uid])) for uid in self.hash_trees["users"].keys_in(user_buckets)],
+                                              messages=[chat_pb2.MessageData(**vars(snapshot.messages[mid])) for mid in self.hash_trees["messages"].keys_in(message_buckets)])
+        response = self.channel_pool.call(replica_address, "RepairRanges", request, compression=compression_for("RepairRanges", COMPRESSION), timeout=self.replica_timeout)
+        if not response.success:
+            self.anti_entropy_skipped += 1
+            return None
+        self.anti_entropy_rounds += 1
+        self.divergent_ranges += len(user_buckets) + len(message_buckets)
+        self.repaired_records += response.repaired
+        print(f"    Replica {replica_address} differed in {len(user_buckets)} user and {len(message_buckets)} message ranges, repaired {response.repaired} records")
+        return response.repaired
+
+    def differing_ranges(self, replica_address, kind, records, commit_seq):
+        """
+        Descends this server's and a replica's hash trees over one kind of record, HASH_TREE_FANOUT_BITS levels per call,
+        into the nodes whose hashes differ. Returns the differing leaves, or None if the replica was not at commit_seq.
+        """
+        tree = self.hash_trees[kind]
+        depth, indices = 0, [0]
+        while True:
+            request = chat_pb2.RangeHashRequest(kind=kind, depth=depth, indices=indices)
+            response = self.channel_pool.call(replica_address, "CompareRanges", request, timeout=self.replica_timeout)
+            if response.commit_seq != commit_seq:
+                return None
+            differing = [index for index, ours, theirs in zip(indices, tree.node_hashes(records, depth, indices), response.hashes) if ours != theirs]
+            if depth == tree.depth or not differing:
+                return differing
+            child_depth = min(depth + HASH_TREE_FANOUT_BITS, tree.depth)
+            shift = child_depth - depth
+            indices = [child for index in differing for child in range(index << shift, (index + 1) << shift)]
+            depth = child_depth
+
+    def fan_out(self, replicas, call, timeout=None):
+        """
+        Calls call(replica) on every replica concurrently, waiting up to timeout (replica_timeout by default).
+        Returns replica -> result or the exception it failed with.
+        """
+        return fan_out(self.fan_out_pool, replicas, call, self.replica_timeout if timeout is None else timeout)
+
+    def ping_replica(self, replica):
+        """Returns whether a replica answers a heartbeat within the heartbeat deadline."""
+        print(f"Sending heartbeat request to replica {replica}")
+        request = chat_pb2.HeartbeatRequest(server_id=self.leader_address)
+        response = self.channel_pool.call(replica, "Heartbeat", request, timeout=self.heartbeat_deadline())
+        self.record_replica_seq(replica, response.applied_seq)
+        return response.success
+
+    def record_replica_seq(self, replica, applied_seq):
+        """Records the commit_seq a replica reported in a heartbeat, and wakes writes held back by its lag."""
+        self.replica_applied_seqs[replica] = applied_seq
+        self.notify_acks()
+
+    def push_replica_list_to_replicas(self):
+        """Pushes the replica list to every replica concurrently. A replica that fails is left to the heartbeat loop."""
+        replicas = [replica for replica in self.replica_list if replica != self.leader_address]
+        for replica, result in self.fan_out(replicas, self.push_replica_list_to_replica).items():
+            if isinstance(result, Exception):
+                print(f"    Could not push replica list to {replica}: {result}")
+
     def leader_election(self):
         """Elects a new leader from the replica list."""
         print("Calling Leader Election")
         # Remove old leader from replica_list
         print("    Old replica list:", self.replica_list)
-        self.replica_list.remove(self.leader_address)
+        with self.replica_list_lock:
+            self.replica_list = [replica for replica in self.replica_list if replica != self.leader_address]
         self.start_leader_heartbeat_loop()
         print(f"    Removed leader replica list {self.replica_list}")
 
@@ -154,6 +492,7 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         
         if self.local_address == new_leader_address:
             self.is_leader = True
+            self.operation_log = OperationLog(self.operation_log.max_operations, compacted_seq=self.commit_seq)  # Writes before this are in no log of ours
             # Now update the config with your local address
 
         # Update everyone's params to new leade
@@ -165,148 +504,596 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
         """Setup server when server starts"""
         print("Calling on_server_start")
         if self.is_leader:  # Leader server initialization
-            self.replica_list = [args.leader_address] # Leader is included in the replica_list
+            self.replica_list = [self.leader_address] # Leader is included in the replica_list
             self.start_leader_heartbeat_loop()
         else:  # Replica server initialization
-            with grpc.insecure_channel(f"{self.leader_ip}:{self.leader_port}") as channel:
-                stub = chat_pb2_grpc.ChatServiceStub(channel)
-                request = chat_pb2.RegisterReplicaRequest(ip_address=self.local_ip, port=self.local_port)
-                response = stub.RegisterReplica(request)
-                # self.replica_list = response.replica_list
-                assert response.success
+            self.register_with_leader()
             self.start_heartbeat_loop() # begin sending heartbeat requests to leader
+        self.start_anti_entropy_loop()
         print(f"    ChatService __init__: replica_list={self.replica_list}")
 
+    def register_with_leader(self):
+        """Registers this replica with the leader, which pushes back the writes it missed and the replica list."""
+        request = chat_pb2.RegisterReplicaRequest(ip_address=self.local_ip, port=self.local_port, log_id=self.applied_log_id, applied_seq=self.commit_seq)
+        response = self.channel_pool.call(f"{self.leader_ip}:{self.leader_port}", "RegisterReplica", request)
+        # self.replica_list = response.replica_list
+        assert response.success
+
+    def bump_users_version(self):
+        """Invalidates every cached response derived from the user set."""
+        with self.users_version_lock:
+            self.users_version += 1
+
+    def cached_users_response(self, rpc, key, compute):
+        """Returns a response derived only from users_dict, from the cache while the user set is unchanged."""
+        return self.response_cache.get_or_compute((rpc, key), self.users_version, compute)
+
     def LoginUsername(self, request, context):
         """Handles username lookup to check if a user exists."""
         print("Calling LoginUsername")
         username = request.username
-        user_exists = check_username_exists(username, self.users_dict) is not None
-        return chat_pb2.LoginUsernameResponse(user_exists=user_exists, username=username)
+        def compute():
+            user_exists = check_username_exists(username, self.snapshots.snapshot().users) is not None
+            return chat_pb2.LoginUsernameResponse(user_exists=user_exists, username=username)
+        return self.cached_users_response("LoginUsername", username, compute)
 
     def LoginPassword(self, request, context):
         """Handles login by verifying the hashed password."""
         print("Calling LoginPassword")
+        if not self.is_new_account(request.username):  # Logging in to an existing account writes nothing, so it skips backpressure
+            return self.apply_login_password(request)[0]
+        return self.run_write(self.apply_login_password, request, context)
+
+    def is_new_account(self, username):
+        """Returns whether logging in as username would create its account."""
+        with self.accounts_lock.read_locked():
+            return not check_username_exists(username, self.users_dict)
+
+    def apply_login_password(self, request):
+        """Verifies the password of an existing account, or creates the account if the username is new."""
         username = request.username
         password = request.password
 
-        uid = check_username_exists(username, self.users_dict)
-        if uid: # Existing account
-            print(f'    Existing account: {uid}')
-            print(f"    Password is correct:",check_username_password(uid, password, self.users_dict))
-            if check_username_password(uid, password, self.users_dict): # Password is correct
-                return chat_pb2.LoginPasswordResponse(success=True, uid=uid)
-            else: # Password incorrect
-                return chat_pb2.LoginPasswordResponse(success=False, uid=uid)
-        else: # Create account
-            print(f'    Creating account')
-            uid = create_account(username, password, self.users_dict)
-            save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-            self.update_replicas(push_users = True, push_messages = False)
-            return chat_pb2.LoginPasswordResponse(success=True, uid=uid)
+        with self.accounts_lock.read_locked():
+            uid = check_username_exists(username, self.users_dict)
+            if uid: # Existing account
+                print(f'    Existing account: {uid}')
+                password_correct = check_username_password(uid, password, self.users_dict)
+                print(f"    Password is correct:", password_correct)
+                return chat_pb2.LoginPasswordResponse(success=password_correct, uid=uid), False, False, []
+
+        # Create account
+        print(f'    Creating account')
+        with self.accounts_lock.write_locked():
+            uid = create_account(username, password, self.users_dict, uid=self.mint_uid())
+            if uid is not None:
+                self.snapshots.record(users=[self.users_dict[uid]])
+                operation = chat_pb2.Operation(create_account=chat_pb2.CreateAccountOp(uid=uid, username=username, password=password))
+                commit_seq = self.stamp_write([operation])
+        if uid is None:  # Another login created the account between the two locks
+            return self.apply_login_password(request)
+        self.bump_users_version()
+        return chat_pb2.LoginPasswordResponse(success=True, uid=uid, commit_seq=commit_seq), True, False, [operation]
+
+    def run_write(self, apply, request, context=None):
+        """
+        Applies a write to in-memory state, then persists it, replicates it and notifies sessions if anything changed.
+        apply returns (response, push_users, push_messages, operations), where operations replay the write on a replica,
+        or are None if it can only be replicated by pushing full state. In single-writer mode the write is queued to the applier thread.
+        The response is returned once the write concern is met, or the call fails with DEADLINE_EXCEEDED.
+        """
+        try:
+            concern = self.requested_write_concern(context)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        reason = self.apply_backpressure()
+        if reason is not None:
+            if context is None:
+                raise RuntimeError(reason)
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, reason)
+        if self.write_queue is not None:
+            response = self.write_queue.submit(apply, request).result()
+        else:
+            future = futures.Future()
+            self.commit_batch([(apply, request, future)])
+            response = future.result()
+        if response.commit_seq and not self.wait_for_write_concern(response.commit_seq, concern):
+            message = self.write_concern_error(response.commit_seq, concern)
+            if context is None:
+                raise TimeoutError(message)
+            context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, message)
+        return response
+
+    def requested_write_concern(self, context):
+        """Returns the write concern a call asked for in its write-concern metadata, or the server's. Raises ValueError if it is unknown."""
+        if context is not None:
+            for key, value in context.invocation_metadata() or ():
+                if key == WRITE_CONCERN_METADATA:
+                    return parse_write_concern(value)
+        return self.write_concern
+
+    def acknowledgements(self, commit_seq):
+        """Returns how many servers, the leader included, have saved the write with commit_seq."""
+        with self.outboxes_lock:
+            return 1 + sum(1 for replica_address in self.replica_list if replica_address != self.leader_address
+                           and replica_address in self.outboxes and self.outboxes[replica_address].acked_seq >= commit_seq)
+
+    def required_acknowledgements(self, concern):
+        """Returns how many servers, the leader included, must have saved a write to meet a write concern."""
+        servers = len(self.replica_list)
+        return {"leader": 1, "majority": servers // 2 + 1, "all": servers}[concern]
+
+    def wait_for_write_concern(self, commit_seq, concern):
+        """Blocks until enough servers have saved commit_seq to meet concern. Returns False if write_concern_timeout passes first."""
+        if concern == "leader":
+            return True
+        with self.acks_cond:
+            return self.acks_cond.wait_for(lambda: self.acknowledgements(commit_seq) >= self.required_acknowledgements(concern),
+                                           timeout=self.write_concern_timeout)
+
+    def write_concern_error(self, commit_seq, concern):
+        """Describes a write whose write concern timed out. The write stays committed and keeps replicating."""
+        return (f"Write {commit_seq} is saved on {self.acknowledgements(commit_seq)} of {len(self.replica_list)} servers, "
+                f"{concern} needs {self.required_acknowledgements(concern)}; it is committed and will still replicate")
+
+    def replication_lag(self):
+        """
+        Returns a ReplicaLag for every replica in the replica list the leader has heard from, through
+        its outbox or a heartbeat. A replica is as far as the higher of its acknowledgement and heartbeat.
+        """
+        commit_seq = self.commit_seq
+        with self.outboxes_lock:
+            outboxes = dict(self.outboxes)
+        lag = []
+        for replica_address in self.replica_list:
+            outbox = outboxes.get(replica_address)
+            if replica_address == self.leader_address or (outbox is None and replica_address not in self.replica_applied_seqs):
+                continue
+            applied_seq = max(outbox.acked_seq if outbox else 0, self.replica_applied_seqs.get(replica_address, 0))
+            lag.append(chat_pb2.ReplicaLag(address=replica_address, applied_seq=applied_seq, writes_behind=max(0, commit_seq - applied_seq),
+                                           bytes_behind=outbox.unacked_bytes if outbox else 0, seconds_behind=outbox.seconds_behind() if outbox else 0.0,
+                                           backlog=outbox.backlog() if outbox else 0))
+        return lag
+
+    def lagging_replicas(self):
+        """Returns the ReplicaLag of every replica past backpressure_max_lag_writes or backpressure_max_lag."""
+        return [lag for lag in self.replication_lag()
+                if lag.writes_behind > self.backpressure_max_lag_writes or lag.seconds_behind > self.backpressure_max_lag]
+
+    def apply_backpressure(self):
+        """
+        Holds a new write while a replica is past the lag limits: for up to backpressure_timeout when throttling, not at all
+        when rejecting. Returns None if the write may go ahead, otherwise why it may not.
+        """
+        if self.backpressure == "off" or not self.lagging_replicas():
+            return None
+        if self.backpressure == "throttle":
+            self.writes_throttled += 1
+            with self.acks_cond:  # Notified by acknowledgements, heartbeats and replicas leaving the list
+                if self.acks_cond.wait_for(lambda: not self.lagging_replicas(), timeout=self.backpressure_timeout):
+                    return None
+        lagging = self.lagging_replicas()
+        if not lagging:
+            return None
+        self.writes_rejected += 1
+        return "; ".join(f"Replica {lag.address} is {lag.writes_behind} writes and {lag.seconds_behind:.1f}s behind" for lag in lagging) + \
+            f", past the backpressure limits of {self.backpressure_max_lag_writes} writes and {self.backpressure_max_lag}s"
+
+    def notify_acks(self):
+        """Wakes writes waiting on their write concern or on a lagging replica."""
+        with self.acks_cond:
+            self.acks_cond.notify_all()
+
+    def commit_batch(self, commands):
+        """
+        Applies (apply, request, future) commands in order, then persists, replicates and notifies sessions once
+        for the whole batch before resolving each command's future.
+        """
+        applied = []
+        push_users = push_messages = False
+        operations = []  # Every write's operations in commit order, or None once any write needs a full-state push
+        for apply, request, future in commands:
+            try:
+                response, command_pushes_users, command_pushes_messages, command_operations = apply(request)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            if command_pushes_users or command_pushes_messages:
+                if not response.commit_seq:  # Writes replicated as operations are stamped by apply, under their locks
+                    response.commit_seq = self.stamp_write(command_operations)
+                self.operation_log.append(response.commit_seq, command_operations)
+                if command_operations is None or operations is None:
+                    operations = None
+                else:
+                    operations.extend(command_operations)
+            push_users = push_users or command_pushes_users
+            push_messages = push_messages or command_pushes_messages
+            applied.append((future, response))
+
+        try:
+            if push_users or push_messages:
+                snapshot = self.snapshots.snapshot()  # Includes the whole batch, since apply recorded it
+                self.save_snapshot(snapshot)
+                self.update_replicas(push_users = push_users, push_messages = push_messages, commit_seq = snapshot_commit_seq(applied), snapshot = snapshot, operations = operations)
+                if push_messages:
+                    self.notify_sessions()
+        except Exception as e:
+            for future, _ in applied:
+                future.set_exception(e)
+            return
+        for future, response in applied:
+            future.set_result(response)
         
-    def update_replicas(self, push_users, push_messages):
-        """Pushes user and message updates to all replicas."""
+    def stamp_write(self, operations):
+        """
+        Assigns the next commit_seq to a write and its operations, and returns it. apply_* functions call it while still
+        holding the locks the write took, so writes that touch the same users get seqs in the order they were applied
+        and a replica replays them in that order.
+        """
+        commit_seq = self.next_commit_seq()
+        for operation in operations or ():
+            operation.seq = commit_seq
+        return commit_seq
+
+    def next_commit_seq(self):
+        """Assigns the next commit sequence to a write that has just been applied."""
+        with self.commit_cond:
+            self.commit_seq += 1
+            return self.commit_seq
+
+    def advance_commit_seq(self, commit_seq):
+        """Records that this replica has applied the leader's writes up to commit_seq and wakes reads waiting for it."""
+        with self.commit_cond:
+            if commit_seq > self.commit_seq:
+                self.commit_seq = commit_seq
+                self.commit_cond.notify_all()
+
+    def reset_commit_seq(self, commit_seq):
+        """Sets the commit_seq this replica has applied after a full-state push, even if lower, e.g. because the leader restarted."""
+        with self.commit_cond:
+            self.commit_seq = commit_seq
+            self.commit_cond.notify_all()
+
+    def wait_for_commit(self, min_seq, context):
+        """Holds a read until this replica has applied min_seq, aborting with FAILED_PRECONDITION if it takes too long."""
+        if self.is_leader or min_seq <= self.commit_seq:  # The leader has every write it acknowledged
+            return
+        with self.commit_cond:
+            caught_up = self.commit_cond.wait_for(lambda: self.commit_seq >= min_seq, timeout=READ_WAIT_SECONDS)
+        if not caught_up:
+            print(f"    Behind min_seq {min_seq} at {self.commit_seq}, redirecting to leader")
+            context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Replica has applied up to {self.commit_seq} of {min_seq}, read from the leader {self.leader_address}")
+
+    def Bootstrap(self, request, context):
+        """Returns the unread count, newest messages and cluster membership a client needs to render its home page."""
+        print("Calling Bootstrap")
+        context.set_compression(compression_for("Bootstrap", COMPRESSION))
+        page_size = request.page_size if request.page_size > 0 else BOOTSTRAP_PAGE_SIZE
+        snapshot = self.snapshots.snapshot()
+        summary = get_inbox_summary(request.uid, snapshot.users, snapshot.messages, page_size)
+        return chat_pb2.BootstrapResponse(
+            unread_count=summary["unread_count"],
+            total_received=summary["total_received"],
+            total_sent=summary["total_sent"],
+            received_messages=[chat_pb2.MessageData(**vars(message)) for message in summary["received"]],
+            sent_messages=[chat_pb2.MessageData(**vars(message)) for message in summary["sent"]],
+            mailbox_version=get_mailbox_version(self.mailbox_changes, request.uid),
+            mailbox_epoch=self.mailbox_epoch,
+            leader_address=self.leader_address,
+            replica_list=self.replica_list
+        )
+
+    def update_replicas(self, push_users, push_messages, commit_seq=0, snapshot=None, operations=None):
+        """
+        Queues user and message updates for every replica. Each replica's outbox sends them in order in the background,
+        as operations when there are any, otherwise as full state.
+        """
+        snapshot = snapshot or self.snapshots.snapshot()
         for replica_address in self.replica_list:
             if replica_address != self.leader_address:
-                # push updates to replicas
-                if push_messages: self.push_messages_to_replica(replica_address, self.messages_dict)
-                if push_users: self.push_users_to_replica(replica_address, self.users_dict)
+                update_operations = list(operations) if operations is not None else None  # Outboxes extend their own list when merging
+                self.replica_outbox(replica_address).enqueue(ReplicaUpdate(push_users, push_messages, commit_seq, snapshot, update_operations))
+        self.close_stale_outboxes()
+
+    def replica_outbox(self, replica_address):
+        """Returns the outbox for a replica, starting one if it has none."""
+        with self.outboxes_lock:
+            outbox = self.outboxes.get(replica_address)
+            if outbox is None:
+                retry_base, retry_max = self.replication_retry
+                outbox = ReplicaOutbox(replica_address, self.push_update_to_replica, self.replication_backlog, retry_base, retry_max, self.notify_acks)
+                self.outboxes[replica_address] = outbox
+            return outbox
+
+    def close_stale_outboxes(self):
+        """Stops the outboxes of servers that are no longer replicas."""
+        with self.outboxes_lock:
+            for replica_address in [address for address in self.outboxes if address not in self.replica_list]:
+                self.outboxes.pop(replica_address).close()
+        self.notify_acks()  # Writes waiting on a dropped replica now need fewer acknowledgements
+
+    def push_update_to_replica(self, replica_address, update):
+        """
+        Sends one ReplicaUpdate as its operations. Falls back to streaming the update's snapshot if it has no operations
+        or the replica has not applied the writes before them.
+        """
+        if update.operations is not None:
+            if self.push_operations_to_replica(replica_address, update.operations):
+                return
+            print(f"    Replica {replica_address} is missing writes before seq {update.operations[0].seq}, pushing full state")
+        self.push_snapshot_to_replica(replica_address, update.snapshot, update.commit_seq)
+
+    def catch_up_replica(self, replica_address, log_id, applied_seq):
+        """
+        Sends a registering replica the writes its saved state is missing and waits until they are sent: the operations
+        after applied_seq if the operation log still holds them, otherwise all users and messages.
+        """
+        operations = self.operation_log.since(applied_seq) if log_id == self.log_id and applied_seq <= self.commit_seq else None
+        if operations is None:
+            print(f"    Replica {replica_address} is at seq {applied_seq} of log '{log_id}', which this log cannot replay from, pushing full state")
+            self.push_full_state(replica_address)
+            return
+        print(f"    Replica {replica_address} is at seq {applied_seq}, pushing the {len(operations)} operations it missed")
+        commit_seq = operations[-1].seq if operations else applied_seq
+        self.send_to_replica(replica_address, ReplicaUpdate(True, True, commit_seq, self.snapshots.snapshot(), operations))
+
+    def push_full_state(self, replica_address):
+        """Sends all users and messages to a replica and waits until they are sent."""
+        self.send_to_replica(replica_address, ReplicaUpdate(True, True, self.commit_seq, self.snapshots.snapshot()))
+
+    def send_to_replica(self, replica_address, update):
+        """Queues an update for a replica behind its earlier updates and waits until it is sent."""
+        outbox = self.replica_outbox(replica_address)
+        outbox.enqueue(update)
+        if not outbox.flush(timeout=REGISTRATION_PUSH_TIMEOUT):
+            raise TimeoutError(f"Replica {replica_address} did not receive the leader's state in {REGISTRATION_PUSH_TIMEOUT}s")
 
     def DeleteAccount(self, request, context):
         """Deletes a user account by UID."""
         print("Calling DeleteAccount")
-        uid = request.uid
-        success = delete_account(self.users_dict, uid)
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        self.update_replicas(push_users = True, push_messages = False)
-        return chat_pb2.DeleteAccountResponse(success=success)
+        return self.run_write(self.apply_delete_account, request, context)
+
+    def apply_delete_account(self, request):
+        """Marks the account inactive in memory."""
+        operation = chat_pb2.Operation(deactivate_account=chat_pb2.DeactivateAccountOp(uid=request.uid))
+        with self.accounts_lock.write_locked():
+            success = delete_account(self.users_dict, request.uid)
+            self.snapshots.record(users=[self.users_dict[request.uid]])
+            commit_seq = self.stamp_write([operation]) if success else 0
+        self.bump_users_version()
+        return chat_pb2.DeleteAccountResponse(success=success, commit_seq=commit_seq), success, False, [operation]
    
     def ListAccounts(self, request, context):
         """Returns a list of account usernames matching a wildcard search."""
-        print("Calling LoginPassword")
+        print("Calling ListAccounts")
+        self.wait_for_commit(request.min_seq, context)
         wildcard = request.wildcard
-        accounts = list_accounts(self.users_dict, wildcard=wildcard)
-        return chat_pb2.ListAccountsResponse(accounts=accounts)
+        def compute():
+            return chat_pb2.ListAccountsResponse(accounts=list_accounts(self.snapshots.snapshot().users, wildcard=wildcard))
+        return self.cached_users_response("ListAccounts", wildcard, compute)
     
     def SendMessage(self, request, context):
         """Handles sending a message from one user to another."""
         print("Calling SendMessage")
-        message_sent = send_message(request.sender, request.receiver_username, request.text, self.users_dict, self.messages_dict, timestamp=request.timestamp)
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        self.update_replicas(push_users = True, push_messages = True)
-        return chat_pb2.SendMessageResponse(success=message_sent)
+        return self.run_write(self.apply_send_message, request, context)
+
+    def apply_send_message(self, request):
+        """Stores a new message and adds it to the sender's and receiver's mailboxes in memory."""
+        with self.accounts_lock.read_locked():
+            receiver_uid = check_username_exists(request.receiver_username, self.users_dict)
+            with self.mailbox_locks.locked(request.sender, receiver_uid):
+                message_sent = send_message(request.sender, request.receiver_username, request.text, self.users_dict, self.messages_dict, timestamp=request.timestamp, mailbox_changes=self.mailbox_changes)
+                operations, commit_seq = [], 0
+                if message_sent:
+                    mid = self.users_dict[request.sender].sent_messages[-1]  # Ours, the sender's stripe is still held
+                    self.snapshots.record(users=[self.users_dict[request.sender], self.users_dict[receiver_uid]], messages=[self.messages_dict[mid]])
+                    operations = [send_operation(self.messages_dict[mid])]
+                    commit_seq = self.stamp_write(operations)
+        return chat_pb2.SendMessageResponse(success=message_sent, commit_seq=commit_seq), message_sent, message_sent, operations
+
+    def SendMessages(self, request, context):
+        """Sends every text to every recipient with a single persistence flush and replication round."""
+        print("Calling SendMessages")
+        return self.run_write(self.apply_send_messages, request, context)
+
+    def apply_send_messages(self, request):
+        """Stores a batch of messages to several recipients in memory."""
+        with self.accounts_lock.read_locked():
+            receiver_uids = [check_username_exists(username, self.users_dict) for username in request.receiver_usernames]
+            with self.mailbox_locks.locked(request.sender, *receiver_uids):
+                results = send_messages(request.sender, request.receiver_usernames, request.texts, self.users_dict, self.messages_dict, timestamp=request.timestamp, mailbox_changes=self.mailbox_changes)
+                new_mids = [mid for mids in results.values() if mids for mid in mids]
+                operations = [send_operation(self.messages_dict[mid]) for mid in new_mids]
+                commit_seq = 0
+                if new_mids:
+                    changed_uids = {request.sender, *(self.messages_dict[mid].receiver for mid in new_mids)}
+                    self.snapshots.record(users=[self.users_dict[uid] for uid in changed_uids], messages=[self.messages_dict[mid] for mid in new_mids])
+                    commit_seq = self.stamp_write(operations)
+        recipient_results = [chat_pb2.RecipientResult(receiver_username=username, success=mids is not None, mids=mids or []) for username, mids in results.items()]
+        changed = any(mids for mids in results.values())
+        return chat_pb2.SendMessagesResponse(success=all(result.success for result in recipient_results), results=recipient_results, commit_seq=commit_seq), changed, changed, operations
 
     def GetSentMessages(self, request, context):
         """Retrieves the list of message IDs sent by a user."""
         print("Calling GetSentMessages")
+        context.set_compression(compression_for("GetSentMessages", COMPRESSION))
+        self.wait_for_commit(request.min_seq, context)
         uid = request.uid
-        mids = get_sent_messages_id(uid, self.users_dict)
+        mids = get_sent_messages_id(uid, self.snapshots.snapshot().users)
         return chat_pb2.GetMessagesResponse(mids=mids)
 
     def GetReceivedMessages(self, request, context):
         """Retrieves the list of message IDs received by a user."""
         print("Calling GetReceivedMessages")
+        context.set_compression(compression_for("GetReceivedMessages", COMPRESSION))
+        self.wait_for_commit(request.min_seq, context)
         uid = request.uid
-        mids = get_received_messages_id(uid, self.users_dict)
+        mids = get_received_messages_id(uid, self.snapshots.snapshot().users)
         return chat_pb2.GetMessagesResponse(mids=mids)
 
     def GetMessageByMid(self, request, context):
-        """Fetches the content of a message using its message ID."""
+        """Fetches the content of a message using its message ID, limited to the requested fields."""
         print("Calling GetMessageByMid")
-        message = get_message_by_mid(request.mid, self.messages_dict)
-        return chat_pb2.GetMessageResponse(sender_uid=message["sender"], receiver_uid=message["receiver"], 
-                                           sender_username=message["sender_username"], receiver_username=message["receiver_username"], 
-                                           text=message["text"], timestamp=message["timestamp"], receiver_read=message["receiver_read"])
+        self.wait_for_commit(request.min_seq, context)
+        message = self.snapshots.snapshot().messages.get(request.mid)
+        if message is None:
+            context.abort(grpc.StatusCode.NOT_FOUND, f"Message {request.mid} does not exist on {self.local_address}")
+        values = project_message(message, request.fields)
+        return chat_pb2.GetMessageResponse(**{GET_MESSAGE_RESPONSE_FIELDS.get(name, name): value for name, value in values.items() if name != "mid"})
+
+    def GetMessagesByMid(self, request, context):
+        """Fetches several messages in one call, limited to the requested fields."""
+        print("Calling GetMessagesByMid")
+        context.set_compression(compression_for("GetMessagesByMid", COMPRESSION))
+        self.wait_for_commit(request.min_seq, context)
+        snapshot_messages = self.snapshots.snapshot().messages
+        messages = [chat_pb2.MessageData(**project_message(snapshot_messages[mid], request.fields)) for mid in request.mids if mid in snapshot_messages]
+        return chat_pb2.GetMessagesByMidResponse(messages=messages)
 
     def MarkMessageRead(self, request, context):
         """Marks a specific message as read."""
         print("Calling MarkMessageRead")
-        mid = request.mid
-        success = mark_message_read(self.messages_dict, mid)
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        self.update_replicas(push_users = False, push_messages = True)
-        return chat_pb2.MarkMessageReadResponse(success=success)
+        return self.run_write(self.apply_mark_message_read, request, context)
+
+    def apply_mark_message_read(self, request):
+        """Sets the message's read flag in memory."""
+        message = self.messages_dict.get(request.mid)
+        with self.mailbox_locks.locked(message.receiver if message else None):
+            success = mark_message_read(self.messages_dict, request.mid, mailbox_changes=self.mailbox_changes)
+            operations, commit_seq = [], 0
+            if success:
+                self.snapshots.record(messages=[message])
+                operations = [chat_pb2.Operation(mark_read=chat_pb2.MarkReadOp(mid=request.mid))]
+                commit_seq = self.stamp_write(operations)
+        return chat_pb2.MarkMessageReadResponse(success=success, commit_seq=commit_seq), False, success, operations
 
     def DeleteMessages(self, request, context):
         """Deletes multiple messages for a given user."""
         print("Calling DeleteMessages")
-        success, _ = delete_messages(self.users_dict, self.messages_dict, request.mids, uid=request.uid)
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        self.update_replicas(push_users = True, push_messages = True)
-        return chat_pb2.DeleteMessagesResponse(success=success)
+        return self.run_write(self.apply_delete_messages, request, context)
+
+    def apply_delete_messages(self, request):
+        """Removes the messages from the user's mailboxes in memory."""
+        with self.accounts_lock.read_locked(), self.mailbox_locks.locked(request.uid):
+            success, deleted_mids = delete_messages(self.users_dict, self.messages_dict, request.mids, uid=request.uid, mailbox_changes=self.mailbox_changes)
+            operations, commit_seq = [], 0
+            if deleted_mids:
+                self.snapshots.record(users=[self.users_dict[request.uid]])
+                operations = [chat_pb2.Operation(delete_messages=chat_pb2.DeleteMessagesOp(uid=request.uid, mids=deleted_mids))]
+                commit_seq = self.stamp_write(operations)
+        changed = len(deleted_mids) > 0
+        return chat_pb2.DeleteMessagesResponse(success=success, commit_seq=commit_seq), changed, changed, operations
+
+    def SyncMailbox(self, request, context):
+        """Returns the changes to a user's received mailbox since the client's version."""
+        print("Calling SyncMailbox")
+        stale_epoch = request.epoch != self.mailbox_epoch  # Versions from another server lifetime are meaningless here
+        with self.mailbox_locks.locked(request.uid):  # The user's change log cannot be walked while it is appended to
+            changes = get_mailbox_changes(self.mailbox_changes, request.uid, request.since_version, self.users_dict, full_sync=stale_epoch)
+            commit_seq = self.commit_seq  # Writes stamp their seq under this stripe, so it covers every change above
+        return chat_pb2.SyncMailboxResponse(version=changes["version"], epoch=self.mailbox_epoch, full_sync=changes["full_sync"],
+                                            added_mids=changes["added"], removed_mids=changes["removed"], read_mids=changes["read"], commit_seq=commit_seq)
     
-    def push_messages_to_replica(self, replica_address, messages_dict):
-        """Pushes messages to a replica."""
-        print("Calling push_messages_to_replica")
-        with grpc.insecure_channel(replica_address) as channel:
-            stub = chat_pb2_grpc.ChatServiceStub(channel)
-            messages = object_to_protobuf_list(messages_dict, chat_pb2.MessageData)
-            print(f"    Preparing to send {len(messages)} messages to {replica_address}")
-            request = chat_pb2.MessageSyncRequest(messages=messages)
-            response = stub.SyncMessagesFromLeader(request)
-            assert response.success
-
-    def push_users_to_replica(self, replica_address, users_dict):
-        """Pushes users to a replica."""
-        print("Calling push_users_to_replica")
-        with grpc.insecure_channel(replica_address) as channel:
-            stub = chat_pb2_grpc.ChatServiceStub(channel)
-            users = object_to_protobuf_list(users_dict, chat_pb2.UserData)
-            print(f"    Preparing to send {len(users)} users to {replica_address}")
-            request = chat_pb2.UserSyncRequest(users=users)
-            response = stub.SyncUsersFromLeader(request)
-            assert response.success
+    def Session(self, request_iterator, context):
+        """Serves a client's pipelined operations over one stream and pushes its mailbox events on the same stream."""
+        print("Calling Session")
+        responses = queue.Queue()
+        subscription = {"uid": None}
+
+        def read_requests():
+            # Operations are applied in the order the client sent them, so dependent requests can be pipelined
+            try:
+                for request in request_iterator:
+                    if request.uid and subscription["uid"] is None:
+                        subscription["uid"] = request.uid
+                        self.subscribe_session(request.uid, responses)
+                    operation = request.WhichOneof("operation")
+                    if operation is not None:
+                        responses.put(self.handle_session_request(request, operation, context))
+            except grpc.RpcError:
+                print("    Session closed by client")
+            finally:
+                responses.put(None)
+
+        threading.Thread(target=read_requests, daemon=True).start()
+        try:
+            while True:
+                response = responses.get()
+                if response is None:
+                    break
+                yield response
+        finally:
+            if subscription["uid"] is not None:
+                self.unsubscribe_session(subscription["uid"], responses)
+
+    def handle_session_request(self, request, operation, context):
+        """Runs one session operation through its unary handler and tags the result with the request's correlation id."""
+        handler = getattr(self, SESSION_OPERATIONS[operation])
+        try:
+            result = handler(getattr(request, operation), SessionOperationContext(context))
+        except Exception as e:
+            print(f"    Session operation {operation} failed: {e}")
+            return chat_pb2.SessionResponse(correlation_id=request.correlation_id, error=str(e))
+        return chat_pb2.SessionResponse(correlation_id=request.correlation_id, **{operation: result})
+
+    def subscribe_session(self, uid, responses):
+        """Registers an open session to receive mailbox events for a user."""
+        with self.sessions_lock:
+            self.sessions.setdefault(uid, dict())[responses] = get_mailbox_version(self.mailbox_changes, uid)
+        print(f"    Session subscribed to mailbox of {uid}")
+
+    def unsubscribe_session(self, uid, responses):
+        """Removes a closed session from the mailbox event subscribers."""
+        with self.sessions_lock:
+            self.sessions.get(uid, dict()).pop(responses, None)
+            if not self.sessions.get(uid):
+                self.sessions.pop(uid, None)
+
+    def notify_sessions(self):
+        """Pushes a mailbox event to every open session whose user's mailbox changed since its last event."""
+        with self.sessions_lock:
+            for uid, session_versions in self.sessions.items():
+                version = get_mailbox_version(self.mailbox_changes, uid)
+                for responses, notified_version in session_versions.items():
+                    if version != notified_version:
+                        session_versions[responses] = version
+                        event = chat_pb2.MailboxEvent(uid=uid, version=version, epoch=self.mailbox_epoch)
+                        responses.put_nowait(chat_pb2.SessionResponse(mailbox_event=event))
+
+    def push_snapshot_to_replica(self, replica_address, snapshot, commit_seq):
+        """
+        Streams a snapshot's users and messages to a replica in chunks of about snapshot_chunk_bytes. If an earlier
+        attempt to send the same snapshot was cut off, only the chunks the replica does not have yet are sent.
+        """
+        print("Calling push_snapshot_to_replica")
+        snapshot_id = f"{self.mailbox_epoch}:{snapshot.version}:{commit_seq}"
+        progress = self.channel_pool.call(replica_address, "SnapshotProgress", chat_pb2.SnapshotProgressRequest(snapshot_id=snapshot_id),
+                                          timeout=self.replica_timeout)
+        if progress.installed:
+            return
+        print(f"    Streaming {len(snapshot.users)} users and {len(snapshot.messages)} messages to {replica_address} from chunk {progress.next_index}")
+        chunks = snapshot_chunks(snapshot, snapshot_id, self.log_id, commit_seq, self.snapshot_chunk_bytes, start=progress.next_index)
+        response = self.channel_pool.call(replica_address, "InstallSnapshot", chunks,
+                                          compression=compression_for("InstallSnapshot", COMPRESSION), timeout=SNAPSHOT_STREAM_TIMEOUT)
+        assert response.success
+
+    def push_operations_to_replica(self, replica_address, operations):
+        """Pushes operations to a replica. Returns False if the replica has not applied the writes before them."""
+        print("Calling push_operations_to_replica")
+        print(f"    Preparing to send {len(operations)} operations to {replica_address}")
+        request = chat_pb2.OperationBatch(operations=operations, log_id=self.log_id)
+        response = self.channel_pool.call(replica_address, "ApplyOperations", request,
+                                          compression=compression_for("ApplyOperations", COMPRESSION), timeout=self.replica_timeout)
+        return response.success
 
     def push_replica_list_to_replica(self, replica_address):
         """Pushes replica list to a replica."""
         print("Calling push_replica_list_to_replica")
-        with grpc.insecure_channel(replica_address) as channel:
-                stub = chat_pb2_grpc.ChatServiceStub(channel)
-                print(f"    Preparing to send {len(self.replica_list)} replicas to {replica_address}")
-                request = chat_pb2.ReplicaListSyncRequest(replica_list=self.replica_list)
-                response = stub.SyncReplicaListFromLeader(request)
-                assert response.success
+        print(f"    Preparing to send {len(self.replica_list)} replicas to {replica_address}")
+        request = chat_pb2.ReplicaListSyncRequest(replica_list=self.replica_list)
+        response = self.channel_pool.call(replica_address, "SyncReplicaListFromLeader", request,
+                                          compression=compression_for("SyncReplicaListFromLeader", COMPRESSION), timeout=self.replica_timeout)
+        assert response.success
 
     def RegisterReplica(self, request, context):
         """Registers a new replica with the leader and pushes out updated replica list to other replicas."""
@@ -314,47 +1101,206 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
 
         # Add replica to replica_list
         replica_address = f"{request.ip_address}:{request.port}"
-        if replica_address not in self.replica_list:
-            self.replica_list.append(replica_address)
+        self.add_replica(replica_address)
         print(f"    Added replica to replica_list: self.replica_list={self.replica_list}")
 
-        # Push messages and users to new replica
-        self.push_messages_to_replica(replica_address, self.messages_dict)
-        self.push_users_to_replica(replica_address, self.users_dict)
-        print(f"    Pushed messages and users to replica")
+        # Push the writes the replica is missing, in order with any updates already queued for it
+        self.catch_up_replica(replica_address, request.log_id, request.applied_seq)
+        print(f"    Brought replica up to date")
 
         # Push replica _list to old replicas
-        for replica_address in self.replica_list:
-            if replica_address != self.leader_address:
-                # Only send updated replicas to non-leaders
-                self.push_replica_list_to_replica(replica_address)
+        self.push_replica_list_to_replicas()
 
         return chat_pb2.RegisterReplicaResponse(success=True)
     
     def Heartbeat(self, request, context):
-        """Responds to heartbeat pings."""
-        return chat_pb2.HeartbeatResponse(success=True)
-    
-    def SyncMessagesFromLeader(self, request, context):
-        """Leader calls replica's SyncMessagesFromLeader to push messages."""
-        print("Calling SyncMessagesFromLeader")
-        self.messages_dict = protobuf_list_to_object(request.messages, Message, "mid")
-        print(f"    Received {len(request.messages)} messages from leader server")
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        return chat_pb2.MessageSyncResponse(success=True)
-
-    def SyncUsersFromLeader(self, request, context):
-        """Leader calls replica's SyncUsersFromLeader to push users."""
-        print("Calling SyncUsersFromLeader")
-        print(f"    Received {len(request.users)} users from leader server")
-        self.users_dict = protobuf_list_to_object(request.users, User, "uid")
-        save_users_and_messages(self.local_ip, self.local_port, self.users_dict, self.messages_dict, self.is_leader)
-        return chat_pb2.UserSyncResponse(success=True)
+        """Responds to heartbeat pings with this server's commit_seq."""
+        return chat_pb2.HeartbeatResponse(success=True, applied_seq=self.commit_seq)
     
+    def InstallSnapshot(self, request_iterator, context):
+        """Leader streams its users and messages in chunks. They replace this replica's state once the last chunk arrives."""
+        print("Calling InstallSnapshot")
+        install = None
+        for chunk in request_iterator:
+            install = self.receive_snapshot_chunk(chunk)
+            if install is None:
+                context.abort(grpc.StatusCode.FAILED_PRECONDITION, f"Chunk {chunk.index} of snapshot {chunk.snapshot_id} is ahead of the chunks received")
+            if chunk.last:
+                self.save_replica_state()
+        return chat_pb2.InstallSnapshotResponse(success=True, next_index=install.next_index if install else 0, commit_seq=self.commit_seq)
+
+    def SnapshotProgress(self, request, context):
+        """Leader asks how much of a snapshot this replica has, to resume an interrupted InstallSnapshot."""
+        with self.snapshot_install_lock:
+            if request.snapshot_id == self.installed_snapshot_id:
+                return chat_pb2.SnapshotProgressResponse(installed=True)
+            install = self.snapshot_install
+            next_index = install.next_index if install is not None and install.snapshot_id == request.snapshot_id else 0
+        return chat_pb2.SnapshotProgressResponse(next_index=next_index)
+
+    def receive_snapshot_chunk(self, chunk):
+        """
+        Adds a chunk to the snapshot being received, starting over if chunk 0 of another snapshot arrives, and installs
+        the snapshot once its last chunk is in. Returns the SnapshotInstall, or None if chunks before this one are missing.
+        """
+        with self.snapshot_install_lock:
+            install = self.snapshot_install
+            if install is None or install.snapshot_id != chunk.snapshot_id:
+                if chunk.index != 0:
+                    return None
+                install = self.snapshot_install = SnapshotInstall(chunk.snapshot_id, chunk.log_id, chunk.commit_seq)
+            if not install.add(chunk.index, protobuf_list_to_object(chunk.users, User, "uid"), protobuf_list_to_object(chunk.messages, Message, "mid")):
+                return None
+            if chunk.last:
+                self.install_snapshot(install)
+            return install
+
+    def install_snapshot(self, install):
+        """Replaces this replica's users, messages and commit_seq with a fully received snapshot. Requires snapshot_install_lock."""
+        with self.apply_operations_lock:
+            with self.accounts_lock.write_locked():
+                self.users_dict = install.users
+                self.messages_dict = install.messages
+                self.snapshots.replace(users_dict=install.users, messages_dict=install.messages)
+            self.applied_log_id = install.log_id
+            self.reset_commit_seq(install.commit_seq)
+        self.snapshot_install = None
+        self.installed_snapshot_id = install.snapshot_id
+        self.bump_users_version()
+        print(f"    Installed snapshot {install.snapshot_id}: {len(install.users)} users, {len(install.messages)} messages")
+
+    def CompareRanges(self, request, context):
+        """Leader asks for this replica's hashes of some nodes of its users or messages hash tree."""
+        print("Calling CompareRanges")
+        if request.kind not in self.hash_trees:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, f"Unknown record kind '{request.kind}', expected one of {list(self.hash_trees)}")
+        commit_seq = self.commit_seq  # Read first, like the leader, so equal seqs mean both snapshots hold at least the same writes
+        snapshot = self.snapshots.snapshot()
+        try:
+            hashes = self.hash_trees[request.kind].node_hashes(getattr(snapshot, request.kind), request.depth, request.indices)
+        except ValueError as e:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+        return chat_pb2.RangeHashResponse(commit_seq=commit_seq, hashes=hashes)
+
+    def RepairRanges(self, request, context):
+        """Leader sends its records in the key ranges where this replica's hashes differ from its own."""
+        print("Calling RepairRanges")
+        response = self.repair_ranges(request)
+        if response.repaired:
+            self.save_replica_state()
+        return response
+
+    def repair_ranges(self, request):
+        """
+        Replaces this replica's users and messages in the requested key ranges with the leader's records, removing any the
+        leader does not have. Nothing changes if this replica applied more writes since the leader compared the two.
+        """
+        with self.apply_operations_lock:
+            if self.commit_seq != request.commit_seq:
+                return chat_pb2.RangeRepairResponse(success=False)
+            with self.accounts_lock.write_locked():
+                users_repaired = self.repair_range(self.users_dict, "users", protobuf_list_to_object(request.users, User, "uid"), request.user_buckets)
+                messages_repaired = self.repair_range(self.messages_dict, "messages", protobuf_list_to_object(request.messages, Message, "mid"), request.message_buckets)
+        if users_repaired:
+            self.bump_users_version()
+        print(f"    Repaired {users_repaired} users and {messages_repaired} messages")
+        return chat_pb2.RangeRepairResponse(success=True, repaired=users_repaired + messages_repaired)
+
+    def repair_range(self, live, kind, records, buckets):
+        """Makes live's records in the given leaves of the kind's hash tree equal records. Requires the accounts write lock. Returns the records changed."""
+        removed = [key for key in self.hash_trees[kind].keys_in(buckets) if key not in records and key in live]
+        changed = [record for key, record in records.items() if key not in live or record_digest(live[key]) != record_digest(record)]
+        for key in removed:
+            del live[key]
+        live.update((record.uid if kind == "users" else record.mid, record) for record in changed)
+        if removed:
+            self.snapshots.replace(**{f"{kind}_dict": live})  # Snapshots can only drop a record by replacing the dict
+        elif changed:
+            self.snapshots.record(**{kind: changed})
+        return len(removed) + len(changed)
+
+    def ApplyOperations(self, request, context):
+        """Leader calls replica's ApplyOperations to replay its writes."""
+        print("Calling ApplyOperations")
+        response, users_changed, messages_changed = self.apply_operations(request)
+        if users_changed or messages_changed:
+            self.save_replica_state()
+        return response
+
+    def apply_operations(self, request):
+        """
+        Replays the leader's operations after this replica's commit_seq, skipping ones already applied.
+        Returns (response, users_changed, messages_changed). Nothing is applied if the batch comes from another log
+        than the one this replica applied up to commit_seq in, or leaves a gap. If an operation cannot be applied, the
+        writes before it are kept and the batch fails, so the leader pushes full state.
+        """
+        users_changed = messages_changed = False
+        failed = None
+        with self.apply_operations_lock:
+            if request.log_id != self.applied_log_id:  # Seqs of another leader's log say nothing about what we applied
+                print(f"    Operations are from log '{request.log_id}', but this replica is at seq {self.commit_seq} of log '{self.applied_log_id}'")
+                return chat_pb2.ApplyOperationsResponse(success=False, applied_seq=self.commit_seq), False, False
+            operations = [operation for operation in request.operations if operation.seq > self.commit_seq]
+            if operations and operations[0].seq != self.commit_seq + 1:
+                return chat_pb2.ApplyOperationsResponse(success=False, applied_seq=self.commit_seq), False, False
+            with self.accounts_lock.write_locked():
+                for operation in operations:
+                    kind = self.apply_operation(operation)
+                    if kind is None:
+                        failed = operation
+                        break
+                    users_changed = users_changed or kind in ("create_account", "deactivate_account")
+                    messages_changed = messages_changed or kind not in ("create_account", "deactivate_account")
+            applied_seq = failed.seq - 1 if failed is not None else operations[-1].seq if operations else self.commit_seq
+            if applied_seq > self.commit_seq:
+                self.advance_commit_seq(applied_seq)
+        if failed is not None:
+            print(f"    Could not apply {failed.WhichOneof('op')} at seq {failed.seq}, kept writes up to seq {self.commit_seq}")
+        else:
+            print(f"    Applied {len(operations)} operations up to seq {self.commit_seq}")
+        if users_changed:
+            self.bump_users_version()
+        if messages_changed:
+            self.notify_sessions()
+        return chat_pb2.ApplyOperationsResponse(success=failed is None, applied_seq=self.commit_seq), users_changed, messages_changed
+
+    def apply_operation(self, operation):
+        """Applies one leader operation to in-memory state. Requires the accounts write lock. Returns the operation's kind, or None if it cannot be applied."""
+        kind = operation.WhichOneof("op")
+        op = getattr(operation, kind)
+        if kind == "create_account":
+            if op.uid in self.users_dict:  # Replayed after a restart that saved the account before its position
+                return kind
+            if create_account(op.username, op.password, self.users_dict, uid=op.uid) is None:
+                return None  # Another account has the username here, so this replica has diverged from the leader
+            self.snapshots.record(users=[self.users_dict[op.uid]])
+        elif kind == "deactivate_account":
+            if op.uid not in self.users_dict:
+                return None
+            delete_account(self.users_dict, op.uid)
+            self.snapshots.record(users=[self.users_dict[op.uid]])
+        elif kind == "send_message":
+            if op.mid in self.messages_dict:  # Replayed after a restart that saved the message before its position
+                return kind
+            if not send_message(op.sender, op.receiver_username, op.text, self.users_dict, self.messages_dict, timestamp=op.timestamp, mailbox_changes=self.mailbox_changes, mid=op.mid):
+                return None  # The sender or receiver is missing here, so this replica has diverged from the leader
+            message = self.messages_dict[op.mid]
+            self.snapshots.record(users=[self.users_dict[message.sender], self.users_dict[message.receiver]], messages=[message])
+        elif kind == "mark_read":
+            if mark_message_read(self.messages_dict, op.mid, mailbox_changes=self.mailbox_changes):
+                self.snapshots.record(messages=[self.messages_dict[op.mid]])
+        elif kind == "delete_messages":
+            if op.uid not in self.users_dict:
+                return None
+            delete_messages(self.users_dict, self.messages_dict, op.mids, uid=op.uid, mailbox_changes=self.mailbox_changes)
+            self.snapshots.record(users=[self.users_dict[op.uid]])
+        return kind
+
     def SyncReplicaListFromLeader(self, request, context):
         """Leader calls replica's SyncReplicaListFromLeader to push replica list."""
         print("Calling SyncReplicaListFromLeader")
-        self.replica_list = request.replica_list
+        with self.replica_list_lock:
+            self.replica_list = list(request.replica_list)
         print(f"    Updated replica_list to {self.replica_list}")
         return chat_pb2.ReplicaListSyncResponse(success=True)
     
@@ -366,6 +1312,20 @@ class ChatService(chat_pb2_grpc.ChatServiceServicer):
             replica_list=self.replica_list
         )
 
+    def GetServerStats(self, request, context):
+        """Returns the response cache counters, the current users version, the single-writer batch counters, the anti-entropy counters and replication lag."""
+        print("Calling GetServerStats")
+        stats = self.response_cache.stats()
+        write_queue = self.write_queue
+        return chat_pb2.ServerStatsResponse(cache_hits=stats["hits"], cache_misses=stats["misses"], cache_evictions=stats["evictions"],
+                                            cache_entries=stats["entries"], cache_hit_rate=stats["hit_rate"], users_version=self.users_version,
+                                            write_batches=write_queue.batches if write_queue else 0,
+                                            writes_committed=write_queue.committed if write_queue else 0,
+                                            anti_entropy_rounds=self.anti_entropy_rounds, anti_entropy_skipped=self.anti_entropy_skipped,
+                                            divergent_ranges=self.divergent_ranges, repaired_records=self.repaired_records,
+                                            replicas=self.replication_lag() if self.is_leader else [],
+                                            writes_throttled=self.writes_throttled, writes_rejected=self.writes_rejected)
+
 def get_local_ip():
     """Get the LAN IP address of the current machine."""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -379,19 +1339,17 @@ def get_local_ip():
         s.close()
     return IP
 
-def serve(args):
-    """Starts the gRPC server with only login flow."""
-    # Leader and server addresses
+def resolve_addresses(args):
+    """Returns (leader_ip, leader_port, local_ip, local_port) for the command line arguments."""
     leader_ip, leader_port = args.leader_address.split(":")
 
     local_ip = socket.gethostbyname(get_local_ip()) if not args.is_leader else leader_ip
     local_port = args.port if not args.is_leader else leader_port
+    return leader_ip, leader_port, local_ip, local_port
 
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    chat_service = ChatService(args.is_leader, local_ip, local_port, leader_ip, leader_port, args.hi)
-    chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
-
-    if args.is_leader:
+def add_listening_ports(server, is_leader, leader_ip, leader_port, local_ip, local_port):
+    """Binds the leader to HOST, or a replica to its LAN address and HOST."""
+    if is_leader:
         server.add_insecure_port(f"{HOST}:{leader_port}")  # Leader uses HOST and PORT from config.ini
         print("Mode: leader, leader IP:", f"{leader_ip}:{leader_port}")
     else:
@@ -399,18 +1357,54 @@ def serve(args):
         server.add_insecure_port(f"{HOST}:{local_port}") # Listen externally in case this one becomes leader later on
         print("Mode: replica, replica IP", f"{local_ip}:{local_port}", "leader IP", f"{leader_ip}:{leader_port}")
 
+def load_runtime_settings(args):
+    """Returns the [server] settings with command line overrides applied, and logs them."""
+    settings = load_server_settings(config, overrides=vars(args))
+    log_server_settings(settings)
+    return settings
+
+def service_kwargs(settings):
+    """Returns the ChatService keyword arguments taken from the runtime settings."""
+    return dict(outgoing_options=channel_options(settings), response_cache_size=settings["response_cache_size"],
+                write_batch_size=settings["write_batch_size"] if settings["single_writer"] else None,
+                replication_backlog=settings["replication_backlog"], replication_retry_ms=settings["replication_retry_ms"],
+                replication_retry_max_ms=settings["replication_retry_max_ms"], replica_timeout_ms=settings["replica_timeout_ms"],
+                write_concern=settings["write_concern"], write_concern_timeout_ms=settings["write_concern_timeout_ms"],
+                snapshot_chunk_bytes=settings["snapshot_chunk_bytes"], operation_log_size=settings["operation_log_size"],
+                anti_entropy_interval_ms=settings["anti_entropy_interval_ms"], backpressure=settings["backpressure"],
+                backpressure_max_lag_writes=settings["backpressure_max_lag_writes"], backpressure_max_lag_ms=settings["backpressure_max_lag_ms"],
+                backpressure_timeout_ms=settings["backpressure_timeout_ms"], phi_threshold=settings["phi_threshold"],
+                phi_window=settings["phi_window"], phi_min_std_ms=settings["phi_min_std_ms"], phi_acceptable_pause_ms=settings["phi_acceptable_pause_ms"])
+
+def serve(args):
+    """Starts the gRPC server with only login flow."""
+    # Leader and server addresses
+    leader_ip, leader_port, local_ip, local_port = resolve_addresses(args)
+    settings = load_runtime_settings(args)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=settings["max_workers"]), options=server_options(settings),
+                         maximum_concurrent_rpcs=max_concurrent_rpcs(settings), compression=channel_compression(COMPRESSION))
+    chat_service = ChatService(args.is_leader, local_ip, local_port, leader_ip, leader_port, args.hi, **service_kwargs(settings))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
+    add_listening_ports(server, args.is_leader, leader_ip, leader_port, local_ip, local_port)
+
     server.start()
     chat_service.on_server_start()
 
     print(f"Server Proto started on port {leader_port}...")
     server.wait_for_termination()
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Start the Chat Client with optional parameters.")
+def build_arg_parser(description="Start the Chat Client with optional parameters."):
+    """Returns the command line parser shared by the threaded and asyncio servers."""
+    parser = argparse.ArgumentParser(description=description)
     parser.add_argument("--is-leader", action="store_true", help="Set this flag to run as a leader")
     parser.add_argument("--port", type=int, default=60001, help="Specify the port")
     parser.add_argument("--hi", type=int, default=1)
     parser.add_argument("--leader-address", type=str, default="10.250.248.221:60000", help="Specify the leader address")
+    for key, (parse, _) in SERVER_SETTINGS.items():  # Runtime settings, overriding the [server] section of config.ini
+        parser.add_argument(f"--{key.replace('_', '-')}", type=parse, default=None, help=f"Overrides {key} from config.ini")
+    return parser
 
-    args = parser.parse_args()
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
     serve(args)
\ No newline at end of file
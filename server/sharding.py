@@ -0,0 +1,285 @@
+import grpc
+import multiprocessing
+import sys
+import os
+import uuid
+import zlib
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import chat_pb2
+import chat_pb2_grpc
+from grpc_config import channel_compression, server_options, max_concurrent_rpcs
+from concurrent import futures
+from controller.login import check_username_exists
+from controller.messages import deliver_messages, record_sent_messages
+from model import Message
+from server_proto import (ChatService, COMPRESSION, HOST, load_users_and_messages, save_users_and_messages, get_local_ip,
+                          build_arg_parser, load_runtime_settings, service_kwargs)
+
+FORWARDED_METADATA = ("x-shard-forwarded", "1")  # Marks calls between shards so a scatter is not scattered again
+
+def shard_for(key, num_shards):
+    """Returns the shard that owns a username, uid or mid, the same in every process."""
+    return zlib.crc32(str(key).encode()) % num_shards
+
+def mint_id(shard, num_shards):
+    """Returns a new random uid or mid that maps to the given shard, so any process can find its owner from the id alone."""
+    while True:
+        new_id = str(uuid.uuid4())
+        if shard_for(new_id, num_shards) == shard:
+            return new_id
+
+def routed(rpc, key):
+    """Returns a handler that serves rpc on the shard owning key(request) and forwards it there from any other shard."""
+    def handler(self, request, context):
+        shard = shard_for(key(request), self.num_shards)
+        if shard == self.shard_index:
+            return getattr(ChatService, rpc)(self, request, context)
+        return self.forward(shard, rpc, request, context)
+    handler.__doc__ = f"Serves {rpc} on the shard that owns the request's key."
+    return handler
+
+class ShardedChatService(ChatService):
+    """
+    One worker process of a server split into num_shards processes that share a port through SO_REUSEPORT.
+
+    The kernel hands each connection to any worker, so every worker accepts every RPC and forwards it to the
+    shard that owns it over a private loopback port. Accounts are owned by the shard their username hashes to,
+    and uids are minted to hash to the same shard. A message is owned by its receiver's shard, which its mid
+    hashes to; the sender's shard keeps a copy for the sender's sent mailbox. Each shard persists to its own files.
+
+    Each shard serves three listeners, each with its own threads: the public port, the peer port that forwarded
+    calls arrive on, and the delivery port that only serves DeliverMessages. A call only ever waits on a listener
+    further down that order, so shards calling each other cannot use up each other's threads and deadlock. The
+    delivery port is also the only place DeliverMessages is served, since it trusts the sender it is given.
+
+    Attributes:
+    ----------
+    shard_index : int
+        The shard this process owns.
+    num_shards : int
+        Number of worker processes.
+    peer_addresses : list of str
+        The private `ip:port` of every shard's peer listener, indexed by shard. Calls to them go over the pooled channels.
+    delivery_addresses : list of str
+        The private `ip:port` of every shard's delivery listener, indexed by shard.
+    """
+
+    def __init__(self, shard_index, num_shards, peer_addresses, delivery_addresses, public_ip, public_port, heartbeat_interval, **kwargs):
+        """
+        Initializes the shard with the users and messages it owns.
+
+        Parameters:
+        ----------
+        shard_index : int
+            The shard this process owns.
+        num_shards : int
+            Number of worker processes.
+        peer_addresses : list of str
+            The private `ip:port` of every shard's peer listener, indexed by shard.
+        delivery_addresses : list of str
+            The private `ip:port` of every shard's delivery listener, indexed by shard.
+        public_ip, public_port : str
+            The address clients connect to, shared by every shard.
+        heartbeat_interval : int
+            Unused, since shards have no replicas, but kept for ChatService.
+        """
+        self.shard_index = shard_index
+        self.num_shards = num_shards
+        super().__init__(True, public_ip, public_port, public_ip, public_port, heartbeat_interval, **kwargs)
+        self.peer_addresses = peer_addresses
+        self.delivery_addresses = delivery_addresses
+
+    def load_state(self):
+        """Returns (users_dict, messages_dict) from this shard's files."""
+        return load_users_and_messages(self.local_ip, f"{self.local_port}_shard{self.shard_index}", False)
+
+    def save_snapshot(self, snapshot):
+        """Persists a snapshot to this shard's files."""
+        save_users_and_messages(self.local_ip, f"{self.local_port}_shard{self.shard_index}", snapshot.users, snapshot.messages, False)
+
+    def mint_uid(self):
+        """Returns a uid for a new account that maps to this shard."""
+        return mint_id(self.shard_index, self.num_shards)
+
+    def on_server_start(self):
+        """Setup server when server starts. Shards do not replicate, so there are no heartbeats."""
+        print(f"Calling on_server_start for shard {self.shard_index} of {self.num_shards}")
+        self.replica_list = [self.leader_address]
+
+    def forward(self, shard, rpc, request, context, addresses=None):
+        """Calls rpc on another shard's peer listener, or on addresses[shard], passing its error back to the client."""
+        try:
+            return self.channel_pool.call((addresses or self.peer_addresses)[shard], rpc, request, metadata=[FORWARDED_METADATA])
+        except grpc.RpcError as e:
+            if context is None:
+                raise
+            context.abort(e.code(), e.details())
+
+    def deliver_on(self, shard, request, context):
+        """Delivers messages on any shard, this one included."""
+        if shard == self.shard_index:
+            return self.deliver(request, context)
+        return self.forward(shard, "DeliverMessages", request, context, self.delivery_addresses)
+
+    LoginUsername = routed("LoginUsername", lambda request: request.username)
+    LoginPassword = routed("LoginPassword", lambda request: request.username)
+    Bootstrap = routed("Bootstrap", lambda request: request.uid)
+    DeleteAccount = routed("DeleteAccount", lambda request: request.uid)
+    GetSentMessages = routed("GetSentMessages", lambda request: request.uid)
+    GetReceivedMessages = routed("GetReceivedMessages", lambda request: request.uid)
+    DeleteMessages = routed("DeleteMessages", lambda request: request.uid)
+    SyncMailbox = routed("SyncMailbox", lambda request: request.uid)
+    GetMessageByMid = routed("GetMessageByMid", lambda request: request.mid)
+    MarkMessageRead = routed("MarkMessageRead", lambda request: request.mid)
+
+    def ListAccounts(self, request, context):
+        """Returns the matching usernames of every shard."""
+        if context is not None and FORWARDED_METADATA in context.invocation_metadata():
+            return ChatService.ListAccounts(self, request, context)
+        accounts = []
+        for shard in range(self.num_shards):
+            if shard == self.shard_index:
+                accounts.extend(ChatService.ListAccounts(self, request, context).accounts)
+            else:
+                accounts.extend(self.forward(shard, "ListAccounts", request, context).accounts)
+        return chat_pb2.ListAccountsResponse(accounts=accounts)
+
+    def GetMessagesByMid(self, request, context):
+        """Fetches each message from the shard that owns it, in the order requested."""
+        mids_by_shard = dict()
+        for mid in request.mids:
+            mids_by_shard.setdefault(shard_for(mid, self.num_shards), []).append(mid)
+        if list(mids_by_shard) in ([], [self.shard_index]):
+            return ChatService.GetMessagesByMid(self, request, context)
+
+        found = dict()
+        for shard, mids in mids_by_shard.items():
+            shard_request = chat_pb2.GetMessagesByMidRequest(mids=mids, fields=request.fields, min_seq=request.min_seq)
+            response = ChatService.GetMessagesByMid(self, shard_request, context) if shard == self.shard_index else self.forward(shard, "GetMessagesByMid", shard_request, context)
+            found.update((message.mid, message) for message in response.messages)
+        return chat_pb2.GetMessagesByMidResponse(messages=[found[mid] for mid in request.mids if mid in found])
+
+    def SendMessage(self, request, context):
+        """Delivers a message on the receiver's shard, then records it in the sender's sent mailbox here."""
+        shard = shard_for(request.sender, self.num_shards)
+        if shard != self.shard_index:
+            return self.forward(shard, "SendMessage", request, context)
+        print("Calling SendMessage")
+        mids, commit_seq = self.send_to(request.sender, request.receiver_username, [request.text], request.timestamp, context)
+        return chat_pb2.SendMessageResponse(success=mids is not None, commit_seq=commit_seq)
+
+    def SendMessages(self, request, context):
+        """Delivers the texts on each receiver's shard, then records them in the sender's sent mailbox here."""
+        shard = shard_for(request.sender, self.num_shards)
+        if shard != self.shard_index:
+            return self.forward(shard, "SendMessages", request, context)
+        print("Calling SendMessages")
+        results, commit_seq = [], 0
+        for username in dict.fromkeys(request.receiver_usernames):
+            mids, seq = self.send_to(request.sender, username, request.texts, request.timestamp, context) if request.texts else (None, 0)
+            results.append(chat_pb2.RecipientResult(receiver_username=username, success=mids is not None, mids=mids or []))
+            commit_seq = max(commit_seq, seq)
+        return chat_pb2.SendMessagesResponse(success=all(result.success for result in results), results=results, commit_seq=commit_seq)
+
+    def send_to(self, sender_uid, receiver_username, texts, timestamp, context):
+        """Returns (new mids or None if nobody received them, commit_seq of the sender's side)."""
+        sender = self.snapshots.snapshot().users.get(sender_uid)
+        if sender is None or not sender.active:
+            return None, 0
+        shard = shard_for(receiver_username, self.num_shards)
+        messages = [chat_pb2.MessageData(mid=mint_id(shard, self.num_shards), sender=sender_uid, sender_username=sender.username,
+                                         receiver_username=receiver_username, text=text, timestamp=timestamp) for text in texts]
+        delivered = self.deliver_on(shard, chat_pb2.DeliverMessagesRequest(receiver_username=receiver_username, messages=messages), context)
+        if not delivered.success:
+            return None, 0
+        for message in messages:
+            message.receiver = delivered.receiver_uid
+        response = self.run_write(self.apply_record_sent, chat_pb2.DeliverMessagesRequest(receiver_username=receiver_username, messages=messages))
+        return [message.mid for message in messages], response.commit_seq
+
+    def DeliverMessages(self, request, context):
+        """Refused on the public and peer listeners, where a client could pass any sender. See ShardDeliveryService."""
+        print("Calling DeliverMessages")
+        context.abort(grpc.StatusCode.PERMISSION_DENIED, "DeliverMessages is only served on a shard's private delivery address")
+
+    def deliver(self, request, context):
+        """Stores messages from a sender's shard in the receiver's mailbox on this shard."""
+        return self.run_write(self.apply_deliver_messages, request, context)
+
+    def apply_deliver_messages(self, request):
+        """Adds the messages to the receiver's received mailbox in memory."""
+        messages = [Message(**{field: getattr(data, field) for field in ("sender", "sender_username", "receiver_username", "text", "mid", "timestamp")},
+                            receiver="") for data in request.messages]
+        with self.accounts_lock.read_locked():
+            receiver_uid = check_username_exists(request.receiver_username, self.users_dict)
+            with self.mailbox_locks.locked(receiver_uid):
+                receiver_uid = deliver_messages(request.receiver_username, messages, self.users_dict, self.messages_dict, mailbox_changes=self.mailbox_changes)
+                if receiver_uid is not None:
+                    self.snapshots.record(users=[self.users_dict[receiver_uid]], messages=messages)
+        delivered = receiver_uid is not None
+        return chat_pb2.DeliverMessagesResponse(success=delivered, receiver_uid=receiver_uid or ""), False, delivered, None
+
+    def apply_record_sent(self, request):
+        """Adds delivered messages to the sender's sent mailbox in memory."""
+        sender_uid = request.messages[0].sender
+        messages = [Message(**{field: getattr(data, field) for field in ("sender", "receiver", "sender_username", "receiver_username", "text", "mid", "timestamp")})
+                    for data in request.messages]
+        with self.accounts_lock.read_locked(), self.mailbox_locks.locked(sender_uid):
+            record_sent_messages(sender_uid, messages, self.users_dict, self.messages_dict)
+            self.snapshots.record(users=[self.users_dict[sender_uid]], messages=[self.messages_dict[message.mid] for message in messages])
+        return chat_pb2.SendMessageResponse(success=True), False, True, None
+
+class ShardDeliveryService(chat_pb2_grpc.ChatServiceServicer):
+    """Serves only DeliverMessages, for the shards calling this one on its private delivery address."""
+
+    def __init__(self, chat_service):
+        self.chat_service = chat_service
+
+    def DeliverMessages(self, request, context):
+        """Stores messages from a sender's shard in the receiver's mailbox on this shard."""
+        print("Calling DeliverMessages")
+        return self.chat_service.deliver(request, context)
+
+def shard_addresses(settings):
+    """Returns the private loopback address of every shard's peer listener."""
+    return [f"127.0.0.1:{settings['shard_port_base'] + shard}" for shard in range(settings["shards"])]
+
+def delivery_addresses(settings):
+    """Returns the private loopback address of every shard's delivery listener, the ports after the peer listeners'."""
+    return [f"127.0.0.1:{settings['shard_port_base'] + settings['shards'] + shard}" for shard in range(settings["shards"])]
+
+def run_shard(args, shard_index, settings):
+    """Runs one shard's gRPC server, sharing the public port with the other shards."""
+    public_ip = get_local_ip()
+    peer_addresses, deliveries = shard_addresses(settings), delivery_addresses(settings)
+    chat_service = ShardedChatService(shard_index, settings["shards"], peer_addresses, deliveries, public_ip, str(args.port), args.hi, **service_kwargs(settings))
+
+    def start_server(servicer, address, options):
+        # One server per listener, so each has its own worker threads
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=settings["max_workers"]), options=options,
+                             maximum_concurrent_rpcs=max_concurrent_rpcs(settings), compression=channel_compression(COMPRESSION))
+        chat_pb2_grpc.add_ChatServiceServicer_to_server(servicer, server)
+        server.add_insecure_port(address)
+        server.start()
+        return server
+
+    server = start_server(chat_service, f"{HOST}:{args.port}", server_options(settings) + [("grpc.so_reuseport", 1)])  # Every shard binds the same public port
+    start_server(chat_service, peer_addresses[shard_index], server_options(settings))
+    start_server(ShardDeliveryService(chat_service), deliveries[shard_index], server_options(settings))
+    chat_service.on_server_start()
+    print(f"Shard {shard_index} started on port {args.port}, private addresses {peer_addresses[shard_index]} and {deliveries[shard_index]}...")
+    server.wait_for_termination()
+
+def serve_sharded(args):
+    """Starts one process per shard and waits for them."""
+    settings = load_runtime_settings(args)
+    context = multiprocessing.get_context("spawn")  # gRPC does not survive fork
+    processes = [context.Process(target=run_shard, args=(args, shard, settings)) for shard in range(settings["shards"])]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+if __name__ == "__main__":
+    args = build_arg_parser(description="Start the sharded Chat Server with optional parameters.").parse_args()
+    serve_sharded(args)
@@ -0,0 +1,59 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from cache import ResponseCache
+
+# ---------------- TESTS FOR ResponseCache ---------------- #
+
+def test_cache_hit_and_miss():
+    """
+    Test that a repeated lookup at the same version is served from the cache.
+    """
+    cache = ResponseCache(max_entries=4)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ["Alice"]
+
+    assert cache.get_or_compute(("ListAccounts", "*"), 0, compute) == ["Alice"]
+    assert cache.get_or_compute(("ListAccounts", "*"), 0, compute) == ["Alice"]
+
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert cache.stats()["hit_rate"] == 0.5
+
+def test_cache_version_bump_invalidates():
+    """
+    Test that an entry computed at an older version is recomputed.
+    """
+    cache = ResponseCache(max_entries=4)
+    cache.get_or_compute("key", 0, lambda: "old")
+
+    assert cache.get_or_compute("key", 1, lambda: "new") == "new"
+    assert cache.get_or_compute("key", 1, lambda: "unused") == "new"
+
+def test_cache_evicts_least_recently_used():
+    """
+    Test that the cache stays within its bound and evicts the least recently used entry.
+    """
+    cache = ResponseCache(max_entries=2)
+    cache.get_or_compute("a", 0, lambda: "a")
+    cache.get_or_compute("b", 0, lambda: "b")
+    cache.get_or_compute("a", 0, lambda: "unused")  # a is now the most recently used
+    cache.get_or_compute("c", 0, lambda: "c")
+
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_compute("a", 0, lambda: "recomputed") == "a"
+    assert cache.get_or_compute("b", 0, lambda: "recomputed") == "recomputed"
+
+def test_cache_disabled():
+    """
+    Test that a size of 0 never stores anything.
+    """
+    cache = ResponseCache(max_entries=0)
+    cache.get_or_compute("a", 0, lambda: "a")
+
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_compute("a", 0, lambda: "again") == "again"
@@ -0,0 +1,90 @@
+import pytest
+import grpc
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from channel_pool import ChannelPool
+from concurrent import futures
+import chat_pb2
+import chat_pb2_grpc
+
+class HeartbeatService(chat_pb2_grpc.ChatServiceServicer):
+    """Answers heartbeats and counts them."""
+
+    def __init__(self):
+        self.heartbeats = 0
+
+    def Heartbeat(self, request, context):
+        self.heartbeats += 1
+        return chat_pb2.HeartbeatResponse(success=True)
+
+@pytest.fixture
+def heartbeat_server():
+    """An in-process server on a free port. Yields (address, service)."""
+    service = HeartbeatService()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(service, server)
+    address = f"127.0.0.1:{server.add_insecure_port('127.0.0.1:0')}"
+    server.start()
+    yield address, service
+    server.stop(None)
+
+def test_pool_reuses_one_channel_across_threads(heartbeat_server):
+    """
+    Test that calls from many threads to one address share a single channel.
+    """
+    address, service = heartbeat_server
+    pool = ChannelPool()
+
+    def heartbeat(_):
+        return pool.call(address, "Heartbeat", chat_pb2.HeartbeatRequest(server_id="test"), timeout=2).success
+
+    with futures.ThreadPoolExecutor(max_workers=8) as threads:
+        assert all(threads.map(heartbeat, range(40)))
+    assert list(pool.channels) == [address]
+    assert pool.stub(address) is pool.stub(address)
+    assert service.heartbeats == 40
+    pool.close()
+    assert not pool.channels
+
+def test_pool_evicts_unreachable_server():
+    """
+    Test that a call failing with UNAVAILABLE closes the channel, so the next call opens a new one.
+    """
+    pool = ChannelPool()
+    address = "127.0.0.1:1"  # Nothing listens on port 1
+    with pytest.raises(grpc.RpcError) as error:
+        pool.call(address, "Heartbeat", chat_pb2.HeartbeatRequest(server_id="test"), timeout=2)
+
+    assert error.value.code() == grpc.StatusCode.UNAVAILABLE
+    assert address not in pool.channels
+    assert pool.evictions == 1
+
+def test_pool_evict_closes_only_that_server(heartbeat_server):
+    """
+    Test that evicting one address keeps the other channels open.
+    """
+    address, _ = heartbeat_server
+    pool = ChannelPool()
+    pool.stub(address)
+    pool.stub("127.0.0.1:2")
+
+    pool.evict("127.0.0.1:2")
+
+    assert list(pool.channels) == [address]
+    assert pool.call(address, "Heartbeat", chat_pb2.HeartbeatRequest(server_id="test"), timeout=2).success
+    pool.close()
+
+def test_pool_evict_leaves_channel_usable_by_other_threads(heartbeat_server):
+    """
+    Test that a stub another thread got before its channel was evicted can still make calls.
+    """
+    address, _ = heartbeat_server
+    pool = ChannelPool()
+    stub = pool.stub(address)
+
+    pool.evict(address)
+
+    assert stub.Heartbeat(chat_pb2.HeartbeatRequest(server_id="test"), timeout=2).success
+    assert pool.stub(address) is not stub
+    pool.close()
@@ -0,0 +1,335 @@
+import pytest
+import threading
+import time
+import os
+import sys
+from concurrent import futures
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import concurrency
+from concurrency import ReadWriteLock, LockStripes, SnapshotStore, CommandQueue
+from model import User, Message
+import server_proto
+import chat_pb2
+
+# ---------------- TESTS FOR ReadWriteLock ---------------- #
+
+def test_readers_share_the_lock():
+    """
+    Test that several readers hold the lock at the same time.
+    """
+    lock = ReadWriteLock()
+    inside = threading.Barrier(3, timeout=2)
+
+    def reader():
+        with lock.read_locked():
+            inside.wait()  # Only passes if all three readers are inside together
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def test_writer_excludes_readers():
+    """
+    Test that a reader waits for the writer holding the lock.
+    """
+    lock = ReadWriteLock()
+    events = []
+
+    def reader():
+        with lock.read_locked():
+            events.append("read")
+
+    with lock.write_locked():
+        thread = threading.Thread(target=reader)
+        thread.start()
+        time.sleep(0.05)
+        events.append("write done")
+    thread.join()
+
+    assert events == ["write done", "read"]
+
+def test_waiting_writer_blocks_new_readers():
+    """
+    Test that readers arriving after a waiting writer go after it.
+    """
+    lock = ReadWriteLock()
+    events = []
+    lock.acquire_read()
+
+    def writer():
+        with lock.write_locked():
+            events.append("write")
+
+    def late_reader():
+        with lock.read_locked():
+            events.append("late read")
+
+    writer_thread = threading.Thread(target=writer)
+    writer_thread.start()
+    time.sleep(0.05)
+    reader_thread = threading.Thread(target=late_reader)
+    reader_thread.start()
+    time.sleep(0.05)
+    lock.release_read()
+    writer_thread.join()
+    reader_thread.join()
+
+    assert events == ["write", "late read"]
+
+# ---------------- TESTS FOR LockStripes ---------------- #
+
+def test_stripes_lock_in_order_without_deadlock():
+    """
+    Test that locking the same users in opposite orders from many threads never deadlocks.
+    """
+    stripes = LockStripes(8)
+    counter = {"value": 0}
+
+    def work(keys):
+        for _ in range(200):
+            with stripes.locked(*keys):
+                counter["value"] += 1
+
+    threads = [threading.Thread(target=work, args=(keys,)) for keys in (("a", "b"), ("b", "a"), ("b", "a", "a"))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    assert counter["value"] == 600
+
+def test_different_users_do_not_block_each_other():
+    """
+    Test that holding one user's stripe does not block a user on another stripe.
+    """
+    stripes = LockStripes(64)
+    other = next(key for key in (f"user{i}" for i in range(100)) if stripes.stripe_index(key) != stripes.stripe_index("user_a"))
+    acquired = threading.Event()
+
+    def lock_other():
+        with stripes.locked(other):
+            acquired.set()
+
+    with stripes.locked("user_a"):
+        threading.Thread(target=lock_other).start()
+        assert acquired.wait(timeout=1)
+
+# ---------------- TESTS FOR SnapshotStore ---------------- #
+
+def test_snapshot_does_not_change_after_publish():
+    """
+    Test that a snapshot keeps its contents when the live objects are changed and recorded afterwards.
+    """
+    alice = User(username="Alice", password="pw", uid="u1")
+    message = Message(sender="u1", receiver="u1", sender_username="Alice", receiver_username="Alice", text="Hi", timestamp="t", mid="m1")
+    store = SnapshotStore({"u1": alice}, {})
+
+    alice.received_messages.append("m1")
+    store.record(users=[alice], messages=[message])
+    first = store.snapshot()
+
+    alice.received_messages.append("m2")
+    message.receiver_read = True
+    store.record(users=[alice], messages=[message])
+    second = store.snapshot()
+
+    assert first.users["u1"].received_messages == ["m1"]
+    assert first.messages["m1"].receiver_read is False
+    assert second.users["u1"].received_messages == ["m1", "m2"]
+    assert second.messages["m1"].receiver_read is True
+    assert second.version > first.version
+    with pytest.raises(TypeError):
+        first.users["u2"] = alice  # Snapshots are read only
+
+def test_long_scan_does_not_block_writers():
+    """
+    Test that writers keep publishing while a reader scans an older snapshot.
+    """
+    users = {f"u{i}": User(username=f"user{i}", password="pw", uid=f"u{i}") for i in range(100)}
+    store = SnapshotStore(users, {})
+    snapshot = store.snapshot()
+    scanning = threading.Event()
+    finish_scan = threading.Event()
+
+    def slow_scan():
+        for uid in snapshot.users:
+            scanning.set()
+            finish_scan.wait(timeout=2)
+
+    reader = threading.Thread(target=slow_scan)
+    reader.start()
+    scanning.wait(timeout=1)
+    for i in range(100):
+        users[f"u{i}"].active = False
+        store.record(users=[users[f"u{i}"]])  # Would raise or block if the scan shared the dict or a lock
+    finish_scan.set()
+    reader.join()
+
+    assert all(user.active for user in snapshot.users.values())
+    assert not any(user.active for user in store.snapshot().users.values())
+
+def test_write_does_not_wait_for_rebuild(monkeypatch):
+    """
+    Test that a writer can record while a reader is folding earlier changes into a new snapshot.
+    """
+    users = {f"u{i}": User(username=f"user{i}", password="pw", uid=f"u{i}") for i in range(10)}
+    store = SnapshotStore(users, {})
+    building = threading.Event()
+    finish_build = threading.Event()
+
+    class SlowSnapshot(concurrency.Snapshot):
+        def __init__(self, *args):
+            building.set()
+            finish_build.wait(timeout=2)  # Stands in for copying a large state
+            super().__init__(*args)
+
+    monkeypatch.setattr(concurrency, "Snapshot", SlowSnapshot)
+    users["u0"].active = False
+    store.record(users=[users["u0"]])
+    reader = threading.Thread(target=store.snapshot)
+    reader.start()
+    building.wait(timeout=1)
+
+    users["u1"].active = False
+    writer = threading.Thread(target=store.record, kwargs={"users": [users["u1"]]})
+    writer.start()
+    writer.join(timeout=1)
+    recorded = not writer.is_alive()
+    finish_build.set()
+    reader.join()
+    writer.join()
+
+    assert recorded
+    latest = store.snapshot()
+    assert not latest.users["u0"].active and not latest.users["u1"].active
+
+# ---------------- TESTS FOR CommandQueue ---------------- #
+
+def test_command_queue_batches_in_submission_order():
+    """
+    Test that commands queued while a batch is committing go into the next batch, in the order they were submitted.
+    """
+    batches = []
+    first_batch_started = threading.Event()
+    release_first_batch = threading.Event()
+
+    def commit_batch(commands):
+        batches.append([request for _, request, _ in commands])
+        first_batch_started.set()
+        release_first_batch.wait(timeout=2)
+        for apply, request, future in commands:
+            future.set_result(apply(request))
+
+    command_queue = CommandQueue(commit_batch, max_batch=4)
+    pending = [command_queue.submit(lambda request: request * 10, 0)]
+    first_batch_started.wait(timeout=1)
+    pending += [command_queue.submit(lambda request: request * 10, i) for i in range(1, 7)]
+    release_first_batch.set()
+
+    assert [future.result(timeout=2) for future in pending] == [i * 10 for i in range(7)]
+    assert batches == [[0], [1, 2, 3, 4], [5, 6]]
+
+def test_command_queue_fails_batch_without_stopping():
+    """
+    Test that an error committing one batch reaches its callers and later commands still commit.
+    """
+    def commit_batch(commands):
+        for _, request, future in commands:
+            if request == "bad":
+                raise RuntimeError("disk full")
+            future.set_result(request)
+
+    command_queue = CommandQueue(commit_batch)
+    with pytest.raises(RuntimeError):
+        command_queue.submit(None, "bad").result(timeout=2)
+    assert command_queue.submit(None, "good").result(timeout=2) == "good"
+
+# ---------------- STRESS TEST ---------------- #
+
+@pytest.fixture
+def chat_service(monkeypatch):
+    """A leader ChatService with no replicas whose saves are no-ops, so the test exercises only in-memory state."""
+    monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+    service = server_proto.ChatService(True, "127.0.0.1", "50052", "127.0.0.1", "50052", 1)
+    service.replica_list = ["127.0.0.1:50052"]
+    return service
+
+def test_single_writer_persists_batches_once(monkeypatch):
+    """
+    Test that in single-writer mode concurrent sends share saves, and every sender gets its own commit sequence.
+    """
+    saves = []
+    release_saves = threading.Event()
+
+    def slow_save(*args):
+        saves.append(len(args[3]))  # Number of messages on disk after this save
+        release_saves.wait(timeout=2)  # Holds the first save so the other sends queue up behind it
+
+    monkeypatch.setattr(server_proto, "write_users_and_messages", slow_save)
+    service = server_proto.ChatService(True, "127.0.0.1", "50052", "127.0.0.1", "50052", 1, write_batch_size=64)
+    service.replica_list = ["127.0.0.1:50052"]
+    release_saves.set()
+    sender = service.LoginPassword(chat_pb2.LoginPasswordRequest(username="batch_sender", password="pw"), None).uid
+    service.LoginPassword(chat_pb2.LoginPasswordRequest(username="batch_receiver", password="pw"), None)
+    release_saves.clear()
+    saves.clear()
+    messages_before = len(service.messages_dict)  # The 50052 data file may already hold messages
+
+    def send(i):
+        return service.SendMessage(chat_pb2.SendMessageRequest(sender=sender, receiver_username="batch_receiver", text=str(i), timestamp="t"), None)
+
+    with futures.ThreadPoolExecutor(max_workers=20) as pool:
+        pending = [pool.submit(send, i) for i in range(20)]
+        time.sleep(0.2)
+        release_saves.set()
+        responses = [future.result(timeout=5) for future in pending]
+
+    assert all(response.success for response in responses)
+    assert len({response.commit_seq for response in responses}) == 20
+    assert len(saves) < 20  # Sends that queued behind the held save were persisted together
+    assert saves[-1] == messages_before + 20
+    stats = service.GetServerStats(chat_pb2.Empty(), None)
+    assert stats.writes_committed == 22 and stats.write_batches < stats.writes_committed
+
+def test_parallel_rpcs_keep_state_consistent(chat_service):
+    """
+    Test that concurrent account creation, sends, reads, marks and deletes leave every mailbox consistent.
+    """
+    num_users, sends_per_user = 8, 40
+    uids = [chat_service.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"stress{i}", password="pw"), None).uid
+            for i in range(num_users)]
+
+    def client(i):
+        for j in range(sends_per_user):
+            receiver = f"stress{(i + 1 + j % (num_users - 1)) % num_users}"  # Never the sender, so deletes only touch received mids
+            chat_service.SendMessage(chat_pb2.SendMessageRequest(sender=uids[i], receiver_username=receiver, text=f"{i}-{j}", timestamp="t"), None)
+            chat_service.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"stress_new_{i}_{j}", password="pw"), None)
+            chat_service.ListAccounts(chat_pb2.ListAccountsRequest(wildcard=f"stress_new_{i}_*"), None)
+            received = list(chat_service.users_dict[uids[i]].received_messages)
+            if received:
+                chat_service.MarkMessageRead(chat_pb2.MarkMessageReadRequest(mid=received[0]), None)
+            if j % 10 == 9 and received:
+                chat_service.DeleteMessages(chat_pb2.DeleteMessagesRequest(uid=uids[i], mids=received[:1]), None)
+
+    with futures.ThreadPoolExecutor(max_workers=num_users) as pool:
+        list(pool.map(client, range(num_users)))
+
+    users = chat_service.users_dict
+    usernames = [user.username for user in users.values()]
+    assert len(usernames) == len(set(usernames))  # No account was created twice
+    assert len([name for name in usernames if name.startswith("stress_new_")]) == num_users * sends_per_user
+
+    total_sent = sum(len(users[uid].sent_messages) for uid in uids)
+    assert total_sent == num_users * sends_per_user  # No append was lost
+    for uid in uids:
+        received = users[uid].received_messages
+        assert len(received) == len(set(received))
+        assert all(chat_service.messages_dict[mid].receiver == uid for mid in received)
+
+    snapshot = chat_service.snapshots.snapshot()  # Every recorded write is in the published snapshot
+    for uid in uids:
+        assert snapshot.users[uid].received_messages == users[uid].received_messages
+        assert snapshot.users[uid].sent_messages == users[uid].sent_messages
+    assert set(snapshot.messages) == set(chat_service.messages_dict)
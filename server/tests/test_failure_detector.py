@@ -0,0 +1,52 @@
+import pytest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from failure_detector import PhiAccrualDetector
+
+def feed(detector, intervals, start=0.0):
+    """Records heartbeats separated by intervals after start. Returns the time of the last one."""
+    now = start
+    for interval in intervals:
+        now += interval
+        detector.heartbeat(now)
+    return now
+
+def test_phi_grows_with_silence():
+    """
+    Test that suspicion stays low while heartbeats are on time and passes the threshold once they stop.
+    """
+    detector = PhiAccrualDetector(1.0, threshold=8.0, acceptable_pause=0.0, now=0.0)
+    last = feed(detector, [1.0] * 20)
+
+    assert detector.phi(last + 1.0) < 1
+    assert detector.is_available(last + 1.2)
+    assert detector.phi(last + 2.0) < detector.phi(last + 3.0)
+    assert not detector.is_available(last + 5.0)
+
+def test_phi_adapts_to_jitter_and_pauses():
+    """
+    Test that a gap that would condemn a server with regular heartbeats is tolerated from one whose heartbeats
+    vary, and that the acceptable pause gives every server extra slack.
+    """
+    regular = PhiAccrualDetector(1.0, acceptable_pause=0.0, now=0.0)
+    jittery = PhiAccrualDetector(1.0, acceptable_pause=0.0, now=0.0)
+    paused = PhiAccrualDetector(1.0, acceptable_pause=3.0, now=0.0)
+    regular_last = feed(regular, [1.0] * 50)
+    jittery_last = feed(jittery, [0.5, 1.5] * 25)
+    paused_last = feed(paused, [1.0] * 50)
+
+    assert not regular.is_available(regular_last + 2.5)
+    assert jittery.is_available(jittery_last + 2.5)
+    assert paused.is_available(paused_last + 3.5)
+    assert not paused.is_available(paused_last + 6.0)
+
+def test_window_forgets_old_intervals():
+    """
+    Test that only the last window intervals shape the distribution.
+    """
+    detector = PhiAccrualDetector(1.0, window=10, acceptable_pause=0.0, now=0.0)
+    last = feed(detector, [5.0] * 10 + [1.0] * 10)
+
+    assert list(detector.intervals) == [1.0] * 10
+    assert not detector.is_available(last + 3.0)
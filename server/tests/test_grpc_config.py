@@ -0,0 +1,98 @@
+import pytest
+import configparser
+import grpc
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
+from grpc_config import load_compression_settings, compression_for, channel_compression, load_server_settings, server_options, channel_options, max_concurrent_rpcs
+from concurrent import futures
+import chat_pb2
+import chat_pb2_grpc
+
+# ------------------ COMPRESSION SETTINGS TESTS ------------------ #
+
+def make_config(text):
+    config = configparser.ConfigParser()
+    config.read_string(text)
+    return config
+
+def test_missing_section_disables_compression():
+    """
+    Test that a config without [compression] compresses nothing.
+    """
+    settings = load_compression_settings(make_config("[network]\nhost = 0.0.0.0\n"))
+
+    assert channel_compression(settings) == grpc.Compression.NoCompression
+    assert compression_for("ApplyOperations", settings) == grpc.Compression.NoCompression
+
+def test_per_class_compression():
+    """
+    Test that RPCs pick up their class's setting and fall back to the default.
+    """
+    settings = load_compression_settings(make_config("[compression]\ndefault = deflate\nreplication = gzip\n"))
+
+    assert compression_for("InstallSnapshot", settings) == grpc.Compression.Gzip
+    assert compression_for("GetMessagesByMid", settings) == grpc.Compression.Deflate  # bulk not configured
+    assert compression_for("Heartbeat", settings) == grpc.Compression.Deflate
+    assert channel_compression(settings) == grpc.Compression.Deflate
+
+def test_unknown_algorithm_rejected():
+    """
+    Test that a typo in config.ini fails loudly instead of silently disabling compression.
+    """
+    with pytest.raises(ValueError):
+        load_compression_settings(make_config("[compression]\nbulk = zstd\n"))
+
+# ------------------ SERVER SETTINGS TESTS ------------------ #
+
+def test_server_settings_defaults_and_overrides():
+    """
+    Test that config.ini values override the defaults and command line values override config.ini.
+    """
+    config = make_config("[server]\nmax_workers = 32\nhttp2_bdp_probe = false\nmaximum_concurrent_rpcs = 500\n")
+    settings = load_server_settings(config, overrides={"max_workers": 64, "keepalive_time_ms": None, "is_leader": True})
+
+    assert settings["max_workers"] == 64
+    assert settings["keepalive_time_ms"] == 60000  # None means the flag was not given
+    assert settings["http2_bdp_probe"] is False
+    assert max_concurrent_rpcs(settings) == 500
+    assert ("grpc.http2.bdp_probe", 0) in server_options(settings)
+    assert max_concurrent_rpcs(load_server_settings(make_config(""))) is None
+
+def test_unknown_server_setting_rejected():
+    """
+    Test that a misspelled [server] key fails loudly.
+    """
+    with pytest.raises(ValueError):
+        load_server_settings(make_config("[server]\nmax_worker = 4\n"))
+    with pytest.raises(ValueError):
+        load_server_settings(make_config("[server]\nmax_workers = 0\n"))
+    with pytest.raises(ValueError):
+        load_server_settings(make_config("[server]\nwrite_batch_size = 0\n"))
+    with pytest.raises(ValueError):
+        load_server_settings(make_config("[server]\nwrite_concern = quorum\n"))
+    assert load_server_settings(make_config("[server]\nwrite_concern = Majority\n"))["write_concern"] == "majority"
+    with pytest.raises(ValueError):
+        load_server_settings(make_config("[server]\nbackpressure = drop\n"))
+    assert load_server_settings(make_config("[server]\nbackpressure = Throttle\n"))["backpressure"] == "throttle"
+
+class OperationSink(chat_pb2_grpc.ChatServiceServicer):
+    def ApplyOperations(self, request, context):
+        return chat_pb2.ApplyOperationsResponse(success=True, applied_seq=request.operations[-1].seq)
+
+def test_message_size_limits_allow_large_pushes():
+    """
+    Test that a replication push larger than gRPC's 4 MB default goes through with the configured limits.
+    """
+    settings = load_server_settings(make_config(""))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=1), options=server_options(settings))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(OperationSink(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    try:
+        request = chat_pb2.OperationBatch(operations=[chat_pb2.Operation(seq=i + 1, send_message=chat_pb2.SendMessageOp(mid=str(i), text="x" * 1024)) for i in range(6000)])
+        assert request.ByteSize() > 4 * 1024 * 1024
+        with grpc.insecure_channel(f"127.0.0.1:{port}", options=channel_options(settings)) as channel:
+            assert chat_pb2_grpc.ChatServiceStub(channel).ApplyOperations(request).success
+    finally:
+        server.stop(None)
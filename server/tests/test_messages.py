@@ -3,8 +3,8 @@ import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from controller.messages import (
-    send_message, delete_messages, mark_message_read,
-    get_message_by_mid, get_sent_messages_id, get_received_messages_id
+    send_message, send_messages, delete_messages, mark_message_read,
+    get_message_by_mid, get_sent_messages_id, get_received_messages_id, get_inbox_summary
 )
 from model.user import User
 from model.message import Message
@@ -181,3 +181,46 @@ def test_get_received_messages_id(sample_users):
     received_mids = get_received_messages_id("user2", sample_users)
 
     assert received_mids == ["msg1"]
+
+# ---------------- TESTS FOR BULK MESSAGE SENDING ---------------- #
+
+def test_send_messages_multiple_recipients(sample_users, sample_messages):
+    """
+    Test if send_messages() delivers every text to every recipient and reports per-recipient results.
+    """
+    sample_users["user4"] = User(username="Dana", password="pw", uid="user4")
+
+    results = send_messages("user1", ["Bob", "Dana", "Charlie"], ["One", "Two"], sample_users, sample_messages, timestamp="2023-01-03T10:00:00")
+
+    assert len(results["Bob"]) == 2 and len(results["Dana"]) == 2
+    assert results["Charlie"] is None  # Inactive recipient
+    assert sample_users["user2"].received_messages == results["Bob"]
+    assert len(sample_users["user1"].sent_messages) == 4
+    assert [sample_messages[mid].text for mid in results["Dana"]] == ["One", "Two"]
+
+def test_send_messages_unknown_sender(sample_users, sample_messages):
+    """
+    Test if send_messages() stores nothing when the sender does not exist.
+    """
+    results = send_messages("ghost", ["Bob"], ["Hi"], sample_users, sample_messages, timestamp="2023-01-03T10:00:00")
+
+    assert results == {"Bob": None}
+    assert len(sample_messages) == 2
+
+# ---------------- TESTS FOR INBOX SUMMARY ---------------- #
+
+def test_get_inbox_summary(sample_users, sample_messages):
+    """
+    Test if get_inbox_summary() counts unread messages and returns the newest page first.
+    """
+    for i in range(3):
+        send_message("user2", "Alice", f"Message {i}", sample_users, sample_messages, timestamp=f"2023-01-0{i + 3}T10:00:00")
+    sample_users["user1"].received_messages.append("msg2")
+    sample_messages["msg2"].receiver_read = True
+
+    summary = get_inbox_summary("user1", sample_users, sample_messages, page_size=2)
+
+    assert summary["unread_count"] == 3
+    assert summary["total_received"] == 4
+    assert [message.text for message in summary["received"]] == ["Message 2", "Message 1"]
+    assert summary["sent"] == []
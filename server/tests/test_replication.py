@@ -0,0 +1,595 @@
+import pytest
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from concurrent import futures
+from replication import ReplicaUpdate, ReplicaOutbox, OperationLog, RangeHashTree, key_bucket, fan_out
+import server_proto
+import chat_pb2
+
+def make_update(commit_seq):
+    """An update whose snapshot is just a label, since these tests never push it for real."""
+    return ReplicaUpdate(push_users=False, push_messages=True, commit_seq=commit_seq, snapshot=f"snapshot{commit_seq}")
+
+def test_outbox_retries_failed_pushes_in_order():
+    """
+    Test that a failed push is retried before any later update is sent.
+    """
+    sent, failures = [], [2]
+
+    def send(address, update):
+        if failures[0]:
+            failures[0] -= 1
+            raise ConnectionError("replica down")
+        sent.append(update.commit_seq)
+
+    outbox = ReplicaOutbox("replica:1", send, retry_base=0.01, retry_max=0.02)
+    for commit_seq in (1, 2, 3):
+        outbox.enqueue(make_update(commit_seq))
+
+    assert outbox.flush(timeout=2)
+    assert sent == [1, 2, 3]
+    assert outbox.acked_seq == 3
+    outbox.close()
+
+def test_outbox_merges_updates_beyond_backlog():
+    """
+    Test that updates arriving while the backlog is full are merged into the newest waiting one.
+    """
+    sent = []
+    release = threading.Event()
+
+    def send(address, update):
+        release.wait(timeout=2)
+        sent.append((update.commit_seq, update.snapshot, update.push_users))
+
+    outbox = ReplicaOutbox("replica:1", send, max_backlog=2)
+    outbox.enqueue(make_update(1))
+    time.sleep(0.05)  # The first update is in flight, so the rest wait
+    for commit_seq in range(2, 11):
+        update = make_update(commit_seq)
+        update.push_users = commit_seq == 5
+        outbox.enqueue(update)
+    assert outbox.backlog() == 2
+    release.set()
+
+    assert outbox.flush(timeout=2)
+    assert sent == [(1, "snapshot1", False), (2, "snapshot2", False), (10, "snapshot10", True)]
+    assert outbox.coalesced == 7  # 4 to 10 were merged into 3
+    outbox.close()
+
+def test_outbox_reports_bytes_and_seconds_behind():
+    """
+    Test that an outbox counts the operations it has not had acknowledged, and how long the oldest has waited.
+    """
+    release = threading.Event()
+    outbox = ReplicaOutbox("replica:1", lambda address, update: release.wait(2))
+    operations = [chat_pb2.Operation(seq=1, mark_read=chat_pb2.MarkReadOp(mid="m1"))]
+    outbox.enqueue(ReplicaUpdate(False, True, 1, None, operations))
+    outbox.enqueue(ReplicaUpdate(False, True, 2, None, None))  # Full state counts no operation bytes
+    time.sleep(0.1)
+
+    assert outbox.unacked_bytes == operations[0].ByteSize()
+    assert outbox.seconds_behind() >= 0.1
+    release.set()
+    assert outbox.flush(timeout=2)
+    assert outbox.unacked_bytes == 0 and outbox.seconds_behind() == 0.0
+    outbox.close()
+
+def test_fan_out_isolates_slow_and_failing_servers():
+    """
+    Test that fan_out returns after the deadline with every server's own outcome, however the others behaved.
+    """
+    def call(address):
+        if address == "hung":
+            time.sleep(1)
+        if address == "broken":
+            raise ConnectionError("refused")
+        return address.upper()
+
+    with futures.ThreadPoolExecutor(max_workers=4) as pool:
+        start = time.monotonic()
+        results = fan_out(pool, ["fast", "broken", "hung", "also_fast"], call, timeout=0.2)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.5
+    assert results["fast"] == "FAST" and results["also_fast"] == "ALSO_FAST"
+    assert isinstance(results["broken"], ConnectionError)
+    assert isinstance(results["hung"], TimeoutError)
+
+def test_replica_list_push_is_not_held_up_by_hung_replica(monkeypatch):
+    """
+    Test that pushing the replica list takes about one deadline with a hung replica, not one per replica.
+    """
+    service = server_proto.ChatService(True, "127.0.0.1", "50052", "127.0.0.1", "50052", 1, replica_timeout_ms=200)
+    service.replica_list = ["127.0.0.1:50052", "hung:1", "ok:1", "ok:2"]
+    pushed = []
+
+    def push(replica_address):
+        if replica_address == "hung:1":
+            time.sleep(1)
+        pushed.append(replica_address)
+
+    monkeypatch.setattr(service, "push_replica_list_to_replica", push)
+    start = time.monotonic()
+    service.push_replica_list_to_replicas()
+
+    assert time.monotonic() - start < 0.5
+    assert sorted(pushed) == ["ok:1", "ok:2"]
+
+def test_write_does_not_wait_for_slow_replica(monkeypatch):
+    """
+    Test that a write is acknowledged while its push to a replica is still in progress.
+    """
+    monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+    service = server_proto.ChatService(True, "127.0.0.1", "50052", "127.0.0.1", "50052", 1)
+    service.replica_list = ["127.0.0.1:50052", "replica:1"]
+    pushed = threading.Event()
+
+    def slow_push(replica_address, update):
+        time.sleep(0.5)
+        pushed.set()
+
+    monkeypatch.setattr(service, "push_update_to_replica", slow_push)
+    start = time.monotonic()
+    response = service.LoginPassword(chat_pb2.LoginPasswordRequest(username="outbox_user", password="pw"), None)
+
+    assert response.success and time.monotonic() - start < 0.4
+    assert not pushed.is_set()
+    assert service.replica_outbox("replica:1").flush(timeout=2) and pushed.is_set()
+    service.replica_list = ["127.0.0.1:50052"]
+    service.close_stale_outboxes()
+    assert service.outboxes == {}
+
+@pytest.fixture
+def leader_and_replica(monkeypatch):
+    """A leader ChatService replicating to a replica served on 127.0.0.1:50063, with saves turned off."""
+    import grpc
+    import chat_pb2_grpc
+    monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+    monkeypatch.setattr(server_proto, "save_replication_position", lambda *args: None)
+    replica = server_proto.ChatService(False, "127.0.0.1", "50063", "127.0.0.1", "50064", 1)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(replica, server)
+    server.add_insecure_port("127.0.0.1:50063")
+    server.start()
+    leader = server_proto.ChatService(True, "127.0.0.1", "50064", "127.0.0.1", "50064", 1)
+    leader.replica_list = ["127.0.0.1:50064", "127.0.0.1:50063"]
+    leader.push_full_state("127.0.0.1:50063")  # What RegisterReplica does
+    yield leader, replica
+    leader.replica_list = ["127.0.0.1:50064"]
+    leader.close_stale_outboxes()
+    server.stop(None)
+
+def test_writes_replicate_as_operations(leader_and_replica, monkeypatch):
+    """
+    Test that every kind of write reaches the replica as operations, without pushing full state.
+    """
+    leader, replica = leader_and_replica
+    full_pushes = []
+    monkeypatch.setattr(leader, "push_snapshot_to_replica", lambda *args, **kwargs: full_pushes.append(args))
+
+    alice = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="oplog_alice", password="pw"), None).uid
+    bob = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="oplog_bob", password="pw"), None).uid
+    leader.SendMessage(chat_pb2.SendMessageRequest(sender=alice, receiver_username="oplog_bob", text="one", timestamp="t"), None)
+    leader.SendMessages(chat_pb2.SendMessagesRequest(sender=bob, receiver_usernames=["oplog_alice"], texts=["two", "three"], timestamp="t"), None)
+    first, second = leader.users_dict[alice].received_messages
+    leader.MarkMessageRead(chat_pb2.MarkMessageReadRequest(mid=first), None)
+    leader.DeleteMessages(chat_pb2.DeleteMessagesRequest(uid=alice, mids=[second]), None)
+    leader.DeleteAccount(chat_pb2.DeleteAccountRequest(uid=bob), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+
+    assert full_pushes == []
+    assert replica.commit_seq == leader.commit_seq
+    for uid in (alice, bob):
+        assert vars(replica.users_dict[uid]) == vars(leader.users_dict[uid])
+    assert replica.messages_dict[first].receiver_read and replica.messages_dict[first].text == leader.messages_dict[first].text
+    assert replica.snapshots.snapshot().users[alice].received_messages == [first]
+
+def test_replica_behind_gets_full_state(leader_and_replica):
+    """
+    Test that a replica missing earlier writes rejects the operations and is brought up to date with full state.
+    """
+    leader, replica = leader_and_replica
+    gap = chat_pb2.OperationBatch(operations=[chat_pb2.Operation(seq=replica.commit_seq + 2, mark_read=chat_pb2.MarkReadOp(mid="m"))])
+    response = replica.ApplyOperations(gap, None)
+    assert not response.success and response.applied_seq == replica.commit_seq
+
+    leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="oplog_early", password="pw"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    replica.reset_commit_seq(0)  # As if the replica had lost the write above
+    replica.users_dict.clear()
+    uid = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="oplog_late", password="pw"), None).uid
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+
+    assert replica.commit_seq == leader.commit_seq
+    assert uid in replica.users_dict and len(replica.users_dict) == len(leader.users_dict)
+
+def test_concurrent_writes_replicate_in_apply_order(leader_and_replica, monkeypatch):
+    """
+    Test that a message sent to an account created concurrently gets a later seq than the account, so the replica can replay it.
+    """
+    leader, replica = leader_and_replica
+    full_pushes = []
+    monkeypatch.setattr(leader, "push_snapshot_to_replica", lambda *args, **kwargs: full_pushes.append(args))
+    next_commit_seq = leader.next_commit_seq
+    monkeypatch.setattr(leader, "next_commit_seq", lambda: time.sleep(0.01 if threading.current_thread().name.startswith("creator") else 0) or next_commit_seq())  # Slows stamping account creations
+    sender = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="order_sender", password="pw"), None).uid
+
+    def create_and_send(i):
+        sent = threading.Thread(target=lambda: [leader.SendMessage(chat_pb2.SendMessageRequest(sender=sender, receiver_username=f"order_user{i}", text="hi", timestamp="t"), None) for _ in range(20)])
+        sent.start()
+        leader.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"order_user{i}", password="pw"), None)
+        sent.join()
+
+    threads = [threading.Thread(target=create_and_send, args=(i,), name=f"creator{i}") for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+
+    assert full_pushes == []
+    assert replica.commit_seq == leader.commit_seq
+    assert set(replica.messages_dict) == set(leader.messages_dict)
+
+def test_replica_rejects_operation_it_cannot_apply(leader_and_replica):
+    """
+    Test that a send the replica cannot replay fails the batch, keeping the writes before it.
+    """
+    leader, replica = leader_and_replica
+    seq = replica.commit_seq
+    batch = chat_pb2.OperationBatch(log_id=leader.log_id, operations=[
+        chat_pb2.Operation(seq=seq + 1, create_account=chat_pb2.CreateAccountOp(uid="unapplied_uid", username="unapplied_user", password="pw")),
+        chat_pb2.Operation(seq=seq + 2, send_message=chat_pb2.SendMessageOp(mid="unapplied_mid", sender="unapplied_uid", receiver_username="nobody_here", text="hi", timestamp="t")),
+    ])
+    response = replica.ApplyOperations(batch, None)
+    assert not response.success and response.applied_seq == seq + 1
+    assert "unapplied_uid" in replica.users_dict and "unapplied_mid" not in replica.messages_dict
+
+def test_replica_rejects_duplicate_account(leader_and_replica):
+    """
+    Test that creating an account whose username another uid already has fails the batch instead of raising.
+    """
+    leader, replica = leader_and_replica
+    seq = replica.commit_seq
+    batch = chat_pb2.OperationBatch(log_id=leader.log_id, operations=[
+        chat_pb2.Operation(seq=seq + 1, create_account=chat_pb2.CreateAccountOp(uid="first_dup_uid", username="dup_user", password="pw")),
+        chat_pb2.Operation(seq=seq + 2, create_account=chat_pb2.CreateAccountOp(uid="second_dup_uid", username="dup_user", password="pw")),
+    ])
+    response = replica.ApplyOperations(batch, None)
+    assert not response.success and response.applied_seq == seq + 1
+    assert "first_dup_uid" in replica.users_dict and "second_dup_uid" not in replica.users_dict
+
+def test_replica_rejects_deactivating_unknown_account(leader_and_replica):
+    """
+    Test that deactivating a uid the replica does not have fails the batch instead of raising.
+    """
+    leader, replica = leader_and_replica
+    seq = replica.commit_seq
+    batch = chat_pb2.OperationBatch(log_id=leader.log_id, operations=[
+        chat_pb2.Operation(seq=seq + 1, create_account=chat_pb2.CreateAccountOp(uid="kept_uid", username="kept_user", password="pw")),
+        chat_pb2.Operation(seq=seq + 2, deactivate_account=chat_pb2.DeactivateAccountOp(uid="missing_uid")),
+    ])
+    response = replica.ApplyOperations(batch, None)
+    assert not response.success and response.applied_seq == seq + 1
+    assert "kept_uid" in replica.users_dict and "missing_uid" not in replica.users_dict
+
+def test_snapshot_chunks_are_bounded_and_resumable():
+    """
+    Test that a snapshot is split into numbered chunks under the size limit, and that chunks before start are skipped.
+    """
+    from concurrency import SnapshotStore
+    from model import User, Message
+    users = {f"u{i}": User(username=f"chunk_user{i}", password="pw", uid=f"u{i}") for i in range(20)}
+    messages = {f"m{i}": Message(sender="u0", receiver="u1", sender_username="chunk_user0", receiver_username="chunk_user1",
+                                 text="hello " * 10, timestamp="t", mid=f"m{i}") for i in range(50)}
+    snapshot = SnapshotStore(users, messages).snapshot()
+
+    chunks = list(server_proto.snapshot_chunks(snapshot, "s1", "log", 7, chunk_bytes=500))
+    assert [chunk.index for chunk in chunks] == list(range(len(chunks))) and len(chunks) > 5
+    assert [chunk.last for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+    assert all(chunk.commit_seq == 7 and chunk.snapshot_id == "s1" and chunk.log_id == "log" for chunk in chunks)
+    assert all(sum(data.ByteSize() for data in list(chunk.users) + list(chunk.messages)) <= 500 for chunk in chunks)
+    assert sum(len(chunk.messages) for chunk in chunks) == 50 and sum(len(chunk.users) for chunk in chunks) == 20
+
+    resumed = list(server_proto.snapshot_chunks(snapshot, "s1", "log", 7, chunk_bytes=500, start=3))
+    assert resumed == chunks[3:]
+
+def test_interrupted_snapshot_resumes(leader_and_replica, monkeypatch):
+    """
+    Test that a replica holding the first chunks of a snapshot only gets the rest, and installs the whole state.
+    """
+    leader, replica = leader_and_replica
+    uids = [leader.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"resume_user{i}", password="pw"), None).uid for i in range(10)]
+    leader.SendMessage(chat_pb2.SendMessageRequest(sender=uids[0], receiver_username="resume_user1", text="hi", timestamp="t"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    leader.snapshot_chunk_bytes = 200
+    snapshot, commit_seq = leader.snapshots.snapshot(), leader.commit_seq
+    snapshot_id = f"{leader.mailbox_epoch}:{snapshot.version}:{commit_seq}"
+
+    replica.users_dict.clear()
+    chunks = list(server_proto.snapshot_chunks(snapshot, snapshot_id, leader.log_id, commit_seq, leader.snapshot_chunk_bytes))
+    for chunk in chunks[:2]:  # What the replica received before the stream broke
+        assert replica.receive_snapshot_chunk(chunk) is not None
+    assert replica.receive_snapshot_chunk(chunks[5]) is None  # Chunks 2 to 4 are missing
+
+    starts = []
+    chunk_stream = server_proto.snapshot_chunks
+    monkeypatch.setattr(server_proto, "snapshot_chunks", lambda *args, start=0: starts.append(start) or chunk_stream(*args, start=start))
+    leader.push_snapshot_to_replica("127.0.0.1:50063", snapshot, commit_seq)
+    leader.push_snapshot_to_replica("127.0.0.1:50063", snapshot, commit_seq)  # Already installed, so nothing is streamed
+
+    assert starts == [2]
+    assert replica.installed_snapshot_id == snapshot_id and replica.snapshot_install is None
+    assert replica.commit_seq == commit_seq
+    assert set(replica.users_dict) == set(snapshot.users) and set(replica.messages_dict) == set(snapshot.messages)
+    assert replica.snapshots.snapshot().users[uids[0]].sent_messages == snapshot.users[uids[0]].sent_messages
+
+def test_operation_log_compacts_oldest_writes():
+    """
+    Test that the operation log keeps its newest writes within its size, and cannot replay from before what it dropped.
+    """
+    log = OperationLog(max_operations=3, compacted_seq=1)
+    operation = lambda seq: chat_pb2.Operation(seq=seq, mark_read=chat_pb2.MarkReadOp(mid=f"m{seq}"))
+    log.append(3, [operation(3)])
+    log.append(2, [operation(2)])  # Concurrent writes may be appended out of order
+    log.append(4, [operation(4)])
+    assert [op.seq for op in log.since(1)] == [2, 3, 4]
+    assert [op.seq for op in log.since(3)] == [4]
+    assert log.since(0) is None
+
+    log.append(5, [operation(5)])
+    assert log.compacted_seq == 2 and log.since(1) is None
+    assert [op.seq for op in log.since(2)] == [3, 4, 5]
+
+    log.append(6, None)  # A write only full state can replicate
+    assert log.since(5) is None and log.since(6) == []
+
+def test_rejoining_replica_gets_only_missed_writes(leader_and_replica, monkeypatch):
+    """
+    Test that a replica rejoining at the seq it saved only gets the writes after it, and gets full state
+    if it saved a position in another leader's log or one the log has compacted away.
+    """
+    leader, replica = leader_and_replica
+    leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="rejoin_before", password="pw"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    log_id, applied_seq = replica.applied_log_id, replica.commit_seq
+    assert log_id == leader.log_id and applied_seq == leader.commit_seq
+
+    leader.replica_list.remove("127.0.0.1:50063")  # The replica goes down
+    leader.close_stale_outboxes()
+    uid = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="rejoin_after", password="pw"), None).uid
+    leader.SendMessage(chat_pb2.SendMessageRequest(sender=uid, receiver_username="rejoin_before", text="missed", timestamp="t"), None)
+    leader.replica_list.append("127.0.0.1:50063")
+
+    full_pushes, batches = [], []
+    push_operations = leader.push_operations_to_replica
+    monkeypatch.setattr(leader, "push_snapshot_to_replica", lambda *args: full_pushes.append(args))
+    monkeypatch.setattr(leader, "push_operations_to_replica", lambda address, operations: batches.append(len(operations)) or push_operations(address, operations))
+    leader.catch_up_replica("127.0.0.1:50063", log_id, applied_seq)
+
+    assert full_pushes == [] and batches == [2]
+    assert replica.commit_seq == leader.commit_seq and uid in replica.users_dict
+    assert set(replica.messages_dict) == set(leader.messages_dict)
+
+    leader.catch_up_replica("127.0.0.1:50063", "another leader's log", applied_seq)
+    leader.operation_log = OperationLog(compacted_seq=leader.commit_seq)
+    leader.catch_up_replica("127.0.0.1:50063", log_id, applied_seq)
+    assert len(full_pushes) == 2
+
+def test_replica_rejects_operations_from_another_log(leader_and_replica):
+    """
+    Test that after a failover, a batch whose seqs collide with what the replica applied from the old leader is
+    rejected, and that the new leader brings the replica over to its log with full state.
+    """
+    leader, replica = leader_and_replica
+    leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="old_log_user", password="pw"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    seq = replica.commit_seq
+
+    leader.log_id = "new leader's log"  # A new leader numbers its writes from its own commit_seq, in a new log
+    leader.reset_commit_seq(seq - 1)
+    batch = chat_pb2.OperationBatch(log_id=leader.log_id, operations=[
+        chat_pb2.Operation(seq=seq + 1, create_account=chat_pb2.CreateAccountOp(uid="new_log_uid", username="new_log_user", password="pw"))])
+    response = replica.ApplyOperations(batch, None)
+    assert not response.success and response.applied_seq == seq
+    assert "new_log_uid" not in replica.users_dict
+
+    uid = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="new_log_user", password="pw"), None).uid
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    assert replica.applied_log_id == leader.log_id and replica.commit_seq == leader.commit_seq
+    assert uid in replica.users_dict
+
+def test_hash_tree_localizes_differences():
+    """
+    Test that hash trees over equal records match, and that a changed, added or removed record only changes its own leaf and its ancestors.
+    """
+    from model import Message
+    messages = {f"m{i}": Message(sender="u0", receiver="u1", sender_username="a", receiver_username="b", text=f"text {i}", timestamp="t", mid=f"m{i}")
+                for i in range(100)}
+    ours, theirs = RangeHashTree(), RangeHashTree()
+    assert ours.node_hashes(messages, 0, [0]) == theirs.node_hashes(dict(messages), 0, [0])
+
+    changed = dict(messages)
+    changed["m7"] = Message(sender="u0", receiver="u1", sender_username="a", receiver_username="b", text="edited", timestamp="t", mid="m7")
+    del changed["m8"]
+    changed["extra"] = messages["m9"]
+    leaves = range(ours.buckets)
+    differing = [leaf for leaf, mine, other in zip(leaves, ours.node_hashes(messages, ours.depth, leaves), theirs.node_hashes(changed, theirs.depth, leaves)) if mine != other]
+    assert set(differing) == {key_bucket("m7"), key_bucket("m8"), key_bucket("extra")}
+    assert ours.node_hashes(messages, 1, [0, 1]) != theirs.node_hashes(changed, 1, [0, 1])
+    assert set(theirs.keys_in([key_bucket("m8")])) == {key for key in changed if key_bucket(key) == key_bucket("m8")}
+    with pytest.raises(ValueError):
+        ours.node_hashes(messages, 2, [4])
+
+def test_anti_entropy_repairs_only_divergent_ranges(leader_and_replica):
+    """
+    Test that anti-entropy finds records a replica changed, lost or added without the leader, repairs them,
+    and skips a replica that is not at the leader's commit_seq.
+    """
+    leader, replica = leader_and_replica
+    uids = [leader.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"entropy_user{i}", password="pw"), None).uid for i in range(5)]
+    for i in range(20):
+        leader.SendMessage(chat_pb2.SendMessageRequest(sender=uids[0], receiver_username=f"entropy_user{i % 5}", text=f"hi {i}", timestamp="t"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    assert leader.anti_entropy_round("127.0.0.1:50063") == 0
+
+    mids = sorted(leader.messages_dict)
+    with replica.accounts_lock.write_locked():  # Divergence the operation log did not cause
+        replica.messages_dict[mids[0]].text = "corrupted"
+        replica.messages_dict.pop(mids[1])
+        replica.users_dict[uids[2]].active = False
+        replica.snapshots.replace(users_dict=replica.users_dict, messages_dict=replica.messages_dict)
+
+    assert leader.anti_entropy_round("127.0.0.1:50063") == 3
+    assert replica.messages_dict[mids[0]].text == leader.messages_dict[mids[0]].text and mids[1] in replica.messages_dict
+    assert replica.users_dict[uids[2]].active
+    assert leader.anti_entropy_round("127.0.0.1:50063") == 0
+    stats = leader.GetServerStats(chat_pb2.Empty(), None)
+    assert stats.anti_entropy_rounds == 3 and stats.repaired_records == 3 and 2 <= stats.divergent_ranges <= 3
+
+    replica.reset_commit_seq(leader.commit_seq - 1)  # As if the last write were still on its way
+    assert leader.anti_entropy_round("127.0.0.1:50063") is None
+    assert leader.anti_entropy_skipped == 1
+
+def test_leader_tracks_replica_lag(leader_and_replica):
+    """
+    Test that the leader reports how far behind each replica is, from acknowledgements and heartbeats.
+    """
+    leader, replica = leader_and_replica
+    leader.replica_list.append("127.0.0.1:1")  # Nothing listens here, so it never acknowledges
+    for i in range(3):
+        leader.LoginPassword(chat_pb2.LoginPasswordRequest(username=f"lag_user{i}", password="pw"), None)
+    assert leader.replica_outbox("127.0.0.1:50063").flush(timeout=5)
+    assert leader.ping_replica("127.0.0.1:50063") and leader.replica_applied_seqs["127.0.0.1:50063"] == replica.commit_seq
+
+    lag = {replica_lag.address: replica_lag for replica_lag in leader.GetServerStats(chat_pb2.Empty(), None).replicas}
+    assert lag["127.0.0.1:50063"].writes_behind == 0 and lag["127.0.0.1:50063"].bytes_behind == 0
+    assert lag["127.0.0.1:1"].writes_behind == leader.commit_seq - lag["127.0.0.1:1"].applied_seq > 0
+    assert lag["127.0.0.1:1"].bytes_behind > 0 and lag["127.0.0.1:1"].seconds_behind > 0
+
+def test_backpressure_rejects_or_throttles_writes(leader_and_replica):
+    """
+    Test that writes fail while a replica is past the lag limit in reject mode, and in throttle mode wait until it is dropped.
+    """
+    leader, replica = leader_and_replica
+    leader.replica_list.append("127.0.0.1:1")
+    leader.backpressure, leader.backpressure_max_lag_writes = "reject", 1
+    leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="pressure_one", password="pw"), None)
+    leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="pressure_two", password="pw"), None)
+    with pytest.raises(RuntimeError):
+        leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="pressure_rejected", password="pw"), None)
+    assert "pressure_rejected" not in [user.username for user in leader.users_dict.values()]
+    assert leader.writes_rejected == 1
+    assert leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="pressure_one", password="pw"), None).success  # Writes nothing
+    assert leader.writes_rejected == 1
+
+    def drop_dead_replica():
+        time.sleep(0.2)
+        leader.replica_list.remove("127.0.0.1:1")  # What the heartbeat loop does
+        leader.close_stale_outboxes()
+
+    leader.backpressure, leader.backpressure_timeout = "throttle", 5
+    threading.Thread(target=drop_dead_replica).start()
+    start = time.monotonic()
+    assert leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="pressure_throttled", password="pw"), None).success
+    assert 0.15 < time.monotonic() - start < 5
+    assert leader.writes_throttled == 1 and leader.writes_rejected == 1
+
+def test_leader_drops_replica_only_once_suspected(leader_and_replica):
+    """
+    Test that a replica missing a single heartbeat stays in the replica list, and is only dropped once the failure detector suspects it.
+    """
+    leader, replica = leader_and_replica
+    leader.heartbeat_interval, leader.phi_acceptable_pause, leader.phi_min_std = 0.2, 0.0, 0.05
+    replicas = ["127.0.0.1:50063", "127.0.0.1:1"]
+    alive = lambda: {"127.0.0.1:50063": leader.ping_replica("127.0.0.1:50063"), "127.0.0.1:1": ConnectionError("no answer")}
+
+    assert leader.suspected_replicas(replicas, alive()) == []
+    time.sleep(0.2)
+    assert leader.suspected_replicas(replicas, alive()) == []  # One missed heartbeat is not enough
+    time.sleep(1)
+    leader.replica_list.append("127.0.0.1:1")
+    probes = alive()
+    leader.add_replica("127.0.0.1:2")  # Registers between the probes and the drop
+    assert leader.drop_suspected_replicas(replicas, probes) == ["127.0.0.1:1"]
+    assert leader.replica_list == ["127.0.0.1:50064", "127.0.0.1:50063", "127.0.0.1:2"]
+    assert "127.0.0.1:1" not in leader.replica_detectors and "127.0.0.1:50063" in leader.replica_detectors
+
+def test_hung_heartbeat_is_judged_one_interval_late(monkeypatch):
+    """
+    Test that a heartbeat probe to a replica that never answers gives up after one heartbeat interval rather than
+    replica_timeout, so a single hung probe is a missed heartbeat rather than a suspicion.
+    """
+    import grpc
+    import chat_pb2_grpc
+    monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+    release = threading.Event()
+
+    class HungHeartbeatService(chat_pb2_grpc.ChatServiceServicer):
+        def Heartbeat(self, request, context):
+            release.wait(timeout=10)
+            return chat_pb2.HeartbeatResponse(success=True)
+
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+    chat_pb2_grpc.add_ChatServiceServicer_to_server(HungHeartbeatService(), server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    hung = f"127.0.0.1:{port}"
+    leader = server_proto.ChatService(True, "127.0.0.1", "50065", "127.0.0.1", "50065", 0.2, replica_timeout_ms=5000)
+    leader.phi_min_std = 0.05
+    try:
+        assert leader.suspected_replicas([hung], {hung: True}) == []
+        time.sleep(0.2)
+        start = time.monotonic()
+        alive = leader.fan_out([hung], leader.ping_replica, leader.heartbeat_deadline())
+        assert time.monotonic() - start < 1
+        assert alive[hung] is not True
+        assert leader.suspected_replicas([hung], alive) == []
+    finally:
+        release.set()
+        server.stop(None)
+
+class MetadataContext:
+    """Stands in for a grpc.ServicerContext that only carries invocation metadata."""
+
+    def __init__(self, metadata):
+        self.metadata = metadata
+
+    def invocation_metadata(self):
+        return self.metadata
+
+def test_write_concern_all_waits_for_replica(leader_and_replica):
+    """
+    Test that under the all write concern the replica has applied a write by the time its sender gets the reply.
+    """
+    leader, replica = leader_and_replica
+    leader.write_concern = "all"
+    response = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="concern_all", password="pw"), None)
+
+    assert response.success
+    assert replica.commit_seq >= response.commit_seq
+    assert response.uid in replica.users_dict
+
+def test_write_concern_majority_tolerates_one_dead_replica(leader_and_replica):
+    """
+    Test that a majority write succeeds while one of two replicas is down, and an all write times out but stays committed.
+    """
+    leader, replica = leader_and_replica
+    leader.replica_list.append("127.0.0.1:1")  # Nothing listens here, so its outbox never gets an acknowledgement
+    leader.write_concern_timeout = 0.5
+    majority = MetadataContext([(server_proto.WRITE_CONCERN_METADATA, "majority")])
+
+    response = leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="concern_majority", password="pw"), majority)
+    assert response.success and replica.commit_seq >= response.commit_seq
+
+    leader.write_concern = "all"
+    with pytest.raises(TimeoutError):
+        leader.LoginPassword(chat_pb2.LoginPasswordRequest(username="concern_timeout", password="pw"), None)
+    assert "concern_timeout" in [user.username for user in leader.users_dict.values()]
+    assert leader.requested_write_concern(MetadataContext([(server_proto.WRITE_CONCERN_METADATA, "LEADER")])) == "leader"
+    with pytest.raises(ValueError):
+        leader.requested_write_concern(MetadataContext([(server_proto.WRITE_CONCERN_METADATA, "two")]))
@@ -0,0 +1,185 @@
+import pytest
+import grpc
+import asyncio
+import threading
+import time
+import sys
+import os
+import uuid
+from concurrent import futures
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import server_aio
+import server_proto
+import chat_pb2
+import chat_pb2_grpc
+
+# ---------- FIXTURES ---------- #
+
+@pytest.fixture(scope="module", autouse=True)
+def no_saves():
+    """Keeps the tests' accounts and messages out of the tracked files in server/data."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+        yield
+
+@pytest.fixture(scope="module")
+def aio_server(no_saves):
+    """Runs an asyncio leader on 127.0.0.1:50052 on an event loop in a background thread."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    chat_service = server_aio.AsyncChatService(
+        is_leader=True,
+        local_ip="127.0.0.1",
+        local_port="50052",
+        leader_ip="127.0.0.1",
+        leader_port="50052",
+        heartbeat_interval=1
+    )
+
+    async def start():
+        server = grpc.aio.server(migration_thread_pool=futures.ThreadPoolExecutor(max_workers=2))
+        chat_pb2_grpc.add_ChatServiceServicer_to_server(chat_service, server)
+        server.add_insecure_port("127.0.0.1:50052")
+        await server.start()
+        await chat_service.on_server_start_async()
+        return server
+
+    server = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    yield chat_service, loop
+    asyncio.run_coroutine_threadsafe(server.stop(None), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+@pytest.fixture(scope="module")
+def aio_stub(aio_server):
+    channel = grpc.insecure_channel("127.0.0.1:50052")
+    yield chat_pb2_grpc.ChatServiceStub(channel)
+    channel.close()
+
+# ---------- TESTS ---------- #
+
+def test_aio_send_and_retrieve_message(aio_stub):
+    """
+    Test that coroutine write handlers and inherited read handlers serve the same state.
+    """
+    sender, receiver = f"aio_sender_{uuid.uuid4().hex[:8]}", f"aio_receiver_{uuid.uuid4().hex[:8]}"  # fresh accounts, whatever server/data already holds
+    sender_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=sender, password="pw")).uid
+    receiver_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver, password="pw")).uid
+
+    send = aio_stub.SendMessage(chat_pb2.SendMessageRequest(
+        sender=sender_uid, receiver_username=receiver, text="Hello from asyncio", timestamp="2025-01-01 10:00:00"))
+    assert send.success
+
+    mids = aio_stub.GetReceivedMessages(chat_pb2.GetMessagesRequest(uid=receiver_uid)).mids
+    message = aio_stub.GetMessageByMid(chat_pb2.GetMessageRequest(mid=mids[-1]))
+    assert message.text == "Hello from asyncio"
+
+def test_aio_concurrent_writes(aio_stub):
+    """
+    Test that many concurrent clients can write without any of them failing.
+    """
+    sender, receiver = f"aio_busy_sender_{uuid.uuid4().hex[:8]}", f"aio_busy_receiver_{uuid.uuid4().hex[:8]}"
+    sender_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=sender, password="pw")).uid
+    receiver_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver, password="pw")).uid
+
+    def send(i):
+        return aio_stub.SendMessage(chat_pb2.SendMessageRequest(
+            sender=sender_uid, receiver_username=receiver, text=f"Message {i}", timestamp="2025-01-01 11:00:00")).success
+
+    with futures.ThreadPoolExecutor(max_workers=20) as pool:
+        assert all(pool.map(send, range(50)))
+    assert len(aio_stub.GetReceivedMessages(chat_pb2.GetMessagesRequest(uid=receiver_uid)).mids) == 50
+
+def test_aio_session_pushes_events(aio_stub):
+    """
+    Test that the asyncio session answers pipelined operations and pushes mailbox events.
+    """
+    sender, receiver = f"aio_session_sender_{uuid.uuid4().hex[:8]}", f"aio_session_receiver_{uuid.uuid4().hex[:8]}"
+    sender_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=sender, password="pw")).uid
+    receiver_uid = aio_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver, password="pw")).uid
+
+    requests = [
+        chat_pb2.SessionRequest(uid=receiver_uid),
+        chat_pb2.SessionRequest(correlation_id=1, send_message=chat_pb2.SendMessageRequest(
+            sender=sender_uid, receiver_username=receiver, text="Over the stream", timestamp="2025-01-01 13:00:00")),
+        chat_pb2.SessionRequest(correlation_id=2, get_received_messages=chat_pb2.GetMessagesRequest(uid=receiver_uid)),
+    ]
+
+    results, events = {}, []
+    for response in aio_stub.Session(iter(requests)):
+        if response.WhichOneof("result") == "mailbox_event":
+            events.append(response.mailbox_event)
+        else:
+            results[response.correlation_id] = response
+
+    assert results[1].send_message.success
+    assert len(results[2].get_received_messages.mids) == 1
+    assert events and events[0].uid == receiver_uid
+
+def test_persist_coalesces_concurrent_flushes(aio_server, monkeypatch):
+    """
+    Test that writes arriving during a flush share one follow-up flush instead of one each.
+    """
+    chat_service, loop = aio_server
+    calls = []
+
+    def slow_save(*args):
+        calls.append(args)
+        time.sleep(0.05)
+
+    monkeypatch.setattr(chat_service, "save_snapshot", slow_save)
+
+    async def many_writes():
+        await asyncio.gather(*(chat_service.persist() for _ in range(20)))
+
+    asyncio.run_coroutine_threadsafe(many_writes(), loop).result()
+    assert 1 <= len(calls) <= 2
+    assert chat_service.saved_generation == chat_service.write_generation
+
+def test_aio_installs_streamed_snapshot(aio_server, aio_stub, monkeypatch):
+    """
+    Test that the asyncio server installs a snapshot streamed to it in several chunks.
+    """
+    from concurrency import SnapshotStore
+    from model import User
+    from server_proto import snapshot_chunks
+    chat_service, _ = aio_server
+    monkeypatch.setattr(chat_service, "save_snapshot", lambda snapshot: None)
+    users = {f"u{i}": User(username=f"aio_snapshot{i}", password="pw", uid=f"u{i}") for i in range(30)}
+    chunks = list(snapshot_chunks(SnapshotStore(users, {}).snapshot(), "aio_snapshot", "aio_log", 42, chunk_bytes=300))
+
+    response = aio_stub.InstallSnapshot(iter(chunks))
+
+    assert len(chunks) > 1
+    assert response.success and response.next_index == len(chunks) and response.commit_seq == 42
+    assert set(chat_service.users_dict) == set(users) and chat_service.messages_dict == {}
+    assert aio_stub.SnapshotProgress(chat_pb2.SnapshotProgressRequest(snapshot_id="aio_snapshot")).installed
+
+def test_aio_leader_evicts_dropped_replica_channel(aio_server, monkeypatch):
+    """
+    Test that the asyncio leader drops the pooled channel of a replica it removes, and pushes the new list over pooled channels.
+    """
+    chat_service, loop = aio_server
+    dropped, kept = "127.0.0.1:1", "127.0.0.1:2"
+    pushed = []
+
+    async def ping_replica(replica):
+        return replica == kept
+
+    monkeypatch.setattr(chat_service, "ping_replica", ping_replica)
+    monkeypatch.setattr(chat_service, "suspected_replicas", lambda replicas, alive: [replica for replica in replicas if not alive[replica]])
+    monkeypatch.setattr(chat_service, "push_replica_list_to_replica", lambda replica: pushed.append((replica, chat_service.channel_pool.stub(replica))))
+    monkeypatch.setattr(chat_service, "replica_list", [chat_service.leader_address, dropped, kept])
+    kept_stub = chat_service.channel_pool.stub(kept)
+    chat_service.channel_pool.stub(dropped)
+
+    task = asyncio.run_coroutine_threadsafe(chat_service.leader_heartbeat_loop(), loop)
+    deadline = time.time() + 2
+    while not pushed and time.time() < deadline:
+        time.sleep(0.01)
+    task.cancel()
+
+    assert pushed == [(kept, kept_stub)]  # The surviving replica's channel is reused, not reopened
+    assert dropped not in chat_service.channel_pool.channels and kept in chat_service.channel_pool.channels
@@ -4,6 +4,8 @@ import sys
 import os
 from concurrent import futures
 import time
+import threading
+import uuid
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -13,6 +15,13 @@ import chat_pb2_grpc
 
 # ---------- FIXTURES ---------- #
 
+@pytest.fixture(scope="module", autouse=True)
+def no_saves():
+    """Keeps the tests' accounts and messages out of the tracked files in server/data."""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+        yield
+
 @pytest.fixture(scope="module")
 def grpc_server():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
@@ -45,6 +54,10 @@ def grpc_channel(grpc_server):
 def grpc_stub(grpc_channel):
     return chat_pb2_grpc.ChatServiceStub(grpc_channel)
 
+def reset_replica_list(grpc_stub):
+    """Drops replicas added by earlier tests so writes are not pushed to unreachable servers."""
+    grpc_stub.SyncReplicaListFromLeader(chat_pb2.ReplicaListSyncRequest(replica_list=["127.0.0.1:50051"]))
+
 # ---------- TESTS ---------- #
 
 def test_delete_account(grpc_stub):
@@ -175,50 +188,6 @@ def test_leader_election_logic():
     assert chat_service.leader_address == "127.0.0.2:60002"
     assert not chat_service.is_leader  # This server is not the new leader
 
-def test_sync_users_from_leader(grpc_stub):
-    """
-    Test syncing user data from the leader to a replica.
-    """
-    test_user = chat_pb2.UserData(
-        uid="sync-user-uid",
-        username="sync_user",
-        password="fakehash",
-        received_messages=[],
-        sent_messages=[],
-        active=True
-    )
-    request = chat_pb2.UserSyncRequest(users=[test_user])
-    response = grpc_stub.SyncUsersFromLeader(request)
-    assert response.success
-
-    # Confirm the user exists via login
-    username_request = chat_pb2.LoginUsernameRequest(username="sync_user")
-    check = grpc_stub.LoginUsername(username_request)
-    assert check.user_exists
-
-def test_sync_messages_from_leader(grpc_stub):
-    """
-    Test syncing messages from the leader to a replica.
-    """
-    test_message = chat_pb2.MessageData(
-        sender="sync-user-uid",
-        receiver="sync-receiver-uid",
-        sender_username="sync_user",
-        receiver_username="sync_receiver",
-        text="Synced message!",
-        mid="sync-mid-001",
-        timestamp="2025-03-23 14:00:00",
-        receiver_read=False
-    )
-    request = chat_pb2.MessageSyncRequest(messages=[test_message])
-    response = grpc_stub.SyncMessagesFromLeader(request)
-    assert response.success
-
-    # Confirm the message is now retrievable
-    message = grpc_stub.GetMessageByMid(chat_pb2.GetMessageRequest(mid="sync-mid-001"))
-    assert message.text == "Synced message!"
-    assert message.sender_username == "sync_user"
-
 def test_sync_replica_list_from_leader(grpc_stub):
     """
     Test syncing replica list from the leader to a replica.
@@ -235,3 +204,209 @@ def test_sync_replica_list_from_leader(grpc_stub):
     # Confirm via GetReplicaList that the list matches
     replica_info = grpc_stub.GetReplicaList(chat_pb2.Empty())
     assert sorted(replica_info.replica_list) == sorted(test_list)
+
+def test_sync_mailbox(grpc_stub):
+    """
+    Test that SyncMailbox returns a full sync for a new client and only deltas afterwards.
+    """
+    reset_replica_list(grpc_stub)
+    pw = "pw"
+    receiver = f"sync_receiver_{uuid.uuid4().hex[:8]}"  # A new mailbox on every run
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="sync_sender", password=pw)).uid
+    receiver_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver, password=pw)).uid
+
+    grpc_stub.SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username=receiver, text="one", timestamp="2025-01-01 10:00:00"))
+
+    first = grpc_stub.SyncMailbox(chat_pb2.SyncMailboxRequest(uid=receiver_uid, since_version=0, epoch=""))
+    assert first.full_sync
+    assert len(first.added_mids) == 1
+
+    grpc_stub.SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username=receiver, text="two", timestamp="2025-01-01 10:01:00"))
+    grpc_stub.MarkMessageRead(chat_pb2.MarkMessageReadRequest(mid=first.added_mids[0]))
+
+    second = grpc_stub.SyncMailbox(chat_pb2.SyncMailboxRequest(uid=receiver_uid, since_version=first.version, epoch=first.epoch))
+    assert not second.full_sync
+    assert len(second.added_mids) == 1
+    assert list(second.read_mids) == [first.added_mids[0]]
+    assert second.version > first.version
+    assert first.commit_seq > 0 and second.commit_seq >= first.commit_seq + 2  # Covers the send and the read since
+
+def test_get_missing_message_is_not_found(grpc_stub):
+    """
+    Test that GetMessageByMid on a mid the server does not have fails with NOT_FOUND.
+    """
+    with pytest.raises(grpc.RpcError) as error:
+        grpc_stub.GetMessageByMid(chat_pb2.GetMessageRequest(mid="no_such_mid"))
+    assert error.value.code() == grpc.StatusCode.NOT_FOUND
+
+def test_send_messages_bulk(grpc_stub):
+    """
+    Test that SendMessages delivers to several recipients and reports failures per recipient.
+    """
+    reset_replica_list(grpc_stub)
+    pw = "pw"
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="bulk_sender", password=pw)).uid
+    first_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="bulk_first", password=pw)).uid
+    grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="bulk_second", password=pw))
+
+    response = grpc_stub.SendMessages(chat_pb2.SendMessagesRequest(
+        sender=sender_uid,
+        receiver_usernames=["bulk_first", "bulk_second", "bulk_missing"],
+        texts=["Announcement", "Reminder"],
+        timestamp="2025-01-01 09:00:00"
+    ))
+
+    assert not response.success
+    results = {result.receiver_username: result for result in response.results}
+    assert results["bulk_first"].success and len(results["bulk_first"].mids) == 2
+    assert results["bulk_second"].success
+    assert not results["bulk_missing"].success
+
+    received = grpc_stub.GetReceivedMessages(chat_pb2.GetMessagesRequest(uid=first_uid))
+    assert list(received.mids) == list(results["bulk_first"].mids)
+
+def test_session_pipelines_operations_and_pushes_events(grpc_stub):
+    """
+    Test that a session answers pipelined operations by correlation id and pushes mailbox events for its user.
+    """
+    reset_replica_list(grpc_stub)
+    pw = "pw"
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="session_sender", password=pw)).uid
+    receiver_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="session_receiver", password=pw)).uid
+
+    requests = [
+        chat_pb2.SessionRequest(uid=receiver_uid),
+        chat_pb2.SessionRequest(correlation_id=1, send_message=chat_pb2.SendMessageRequest(
+            sender=sender_uid, receiver_username="session_receiver", text="Over the stream", timestamp="2025-01-01 13:00:00")),
+        chat_pb2.SessionRequest(correlation_id=2, get_received_messages=chat_pb2.GetMessagesRequest(uid=receiver_uid)),
+    ]
+    responses = grpc_stub.Session(iter(requests))
+
+    results = {}
+    events = []
+    for response in responses:
+        if response.WhichOneof("result") == "mailbox_event":
+            events.append(response.mailbox_event)
+        else:
+            results[response.correlation_id] = response
+    
+    assert results[1].send_message.success
+    assert len(results[2].get_received_messages.mids) == 1
+    assert events and events[0].uid == receiver_uid and events[0].version == 1
+
+def test_session_operation_failure_keeps_stream_open(grpc_stub):
+    """
+    Test that a write the server rejects fails only its own session operation, with its status in the error.
+    """
+    reset_replica_list(grpc_stub)
+    uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="session_rejected", password="pw")).uid
+
+    requests = [
+        chat_pb2.SessionRequest(correlation_id=1, send_message=chat_pb2.SendMessageRequest(
+            sender=uid, receiver_username="session_rejected", text="Rejected", timestamp="2025-01-01 13:00:00")),
+        chat_pb2.SessionRequest(correlation_id=2, get_received_messages=chat_pb2.GetMessagesRequest(uid=uid)),
+    ]
+    responses = list(grpc_stub.Session(iter(requests), metadata=(("write-concern", "bogus"),)))
+
+    results = {response.correlation_id: response for response in responses}
+    assert results[1].error.startswith("INVALID_ARGUMENT") and results[1].WhichOneof("result") is None
+    assert results[2].WhichOneof("result") == "get_received_messages" and len(results[2].get_received_messages.mids) == 0
+
+def test_bootstrap(grpc_stub):
+    """
+    Test that Bootstrap returns the unread count, newest messages and replica list in one response.
+    """
+    reset_replica_list(grpc_stub)
+    pw = "pw"
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="boot_sender", password=pw)).uid
+    receiver_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="boot_receiver", password=pw)).uid
+    for i in range(3):
+        grpc_stub.SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username="boot_receiver", text=f"Boot {i}", timestamp=f"2025-01-0{i + 1} 08:00:00"))
+
+    response = grpc_stub.Bootstrap(chat_pb2.BootstrapRequest(uid=receiver_uid, page_size=2))
+
+    assert response.unread_count == 3
+    assert response.total_received == 3
+    assert [message.text for message in response.received_messages] == ["Boot 2", "Boot 1"]
+    assert response.leader_address == "127.0.0.1:50051"
+    assert list(response.replica_list) == ["127.0.0.1:50051"]
+    assert response.mailbox_version == 3
+
+def test_message_fetch_field_projection(grpc_stub):
+    """
+    Test that single and batch message fetches only fill the requested fields.
+    """
+    reset_replica_list(grpc_stub)
+    pw = "pw"
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="mask_sender", password=pw)).uid
+    grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="mask_receiver", password=pw))
+    grpc_stub.SendMessages(chat_pb2.SendMessagesRequest(sender=sender_uid, receiver_usernames=["mask_receiver"], texts=["first body", "second body"], timestamp="2025-01-01 07:00:00"))
+    mids = list(grpc_stub.GetSentMessages(chat_pb2.GetMessagesRequest(uid=sender_uid)).mids)
+
+    single = grpc_stub.GetMessageByMid(chat_pb2.GetMessageRequest(mid=mids[0], fields=["timestamp", "receiver_read", "sender"]))
+    assert single.timestamp == "2025-01-01 07:00:00"
+    assert single.sender_uid == sender_uid  # The same field names as the batch fetch
+    assert single.text == ""
+    assert single.sender_username == ""
+
+    full = grpc_stub.GetMessageByMid(chat_pb2.GetMessageRequest(mid=mids[0]))
+    assert full.text == "first body"
+    assert full.ByteSize() > single.ByteSize()
+
+    batch = grpc_stub.GetMessagesByMid(chat_pb2.GetMessagesByMidRequest(mids=mids + ["missing-mid"], fields=["receiver_read"]))
+    assert [message.mid for message in batch.messages] == mids
+    assert all(message.text == "" for message in batch.messages)
+
+    bodies = grpc_stub.GetMessagesByMid(chat_pb2.GetMessagesByMidRequest(mids=mids))
+    assert [message.text for message in bodies.messages] == ["first body", "second body"]
+
+def test_list_accounts_cache_invalidated_by_new_account(grpc_stub):
+    """
+    Test that ListAccounts is served from the cache until an account is created or deleted.
+    """
+    reset_replica_list(grpc_stub)
+    grpc_stub.ListAccounts(chat_pb2.ListAccountsRequest(wildcard="cache_*"))
+    before = grpc_stub.GetServerStats(chat_pb2.Empty())
+
+    assert list(grpc_stub.ListAccounts(chat_pb2.ListAccountsRequest(wildcard="cache_*")).accounts) == []
+    assert grpc_stub.GetServerStats(chat_pb2.Empty()).cache_hits == before.cache_hits + 1
+
+    uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="cache_user", password="pw")).uid
+    assert list(grpc_stub.ListAccounts(chat_pb2.ListAccountsRequest(wildcard="cache_*")).accounts) == ["cache_user"]
+
+    grpc_stub.DeleteAccount(chat_pb2.DeleteAccountRequest(uid=uid))
+    assert list(grpc_stub.ListAccounts(chat_pb2.ListAccountsRequest(wildcard="cache_*")).accounts) == []
+    assert grpc_stub.GetServerStats(chat_pb2.Empty()).users_version == before.users_version + 2
+
+def test_writes_return_increasing_commit_seq(grpc_stub):
+    """
+    Test that every acknowledged write carries a higher commit sequence than the one before.
+    """
+    reset_replica_list(grpc_stub)
+    sender_uid = grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="seq_sender", password="pw")).uid
+    grpc_stub.LoginPassword(chat_pb2.LoginPasswordRequest(username="seq_receiver", password="pw"))
+
+    first = grpc_stub.SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username="seq_receiver", text="1", timestamp="2025-01-01"))
+    second = grpc_stub.SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username="seq_receiver", text="2", timestamp="2025-01-01"))
+
+    assert 0 < first.commit_seq < second.commit_seq
+    # The leader has every write it acknowledged, so it never holds a read
+    assert grpc_stub.GetSentMessages(chat_pb2.GetMessagesRequest(uid=sender_uid, min_seq=second.commit_seq + 100)).mids
+
+class AbortingContext:
+    def abort(self, code, details):
+        raise grpc.RpcError(code, details)
+
+def test_replica_read_waits_for_min_seq():
+    """
+    Test that a replica holds a read until it applies min_seq, and redirects if it does not catch up in time.
+    """
+    replica = server_proto.ChatService(False, "127.0.0.1", "50052", "127.0.0.1", "50051", 1)
+    threading.Timer(0.1, replica.advance_commit_seq, args=(3,)).start()
+
+    replica.wait_for_commit(3, AbortingContext())  # Returns once the push is applied
+    assert replica.commit_seq == 3
+
+    with pytest.raises(grpc.RpcError) as error:
+        replica.wait_for_commit(4, AbortingContext())
+    assert error.value.args[0] == grpc.StatusCode.FAILED_PRECONDITION
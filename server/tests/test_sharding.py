@@ -0,0 +1,112 @@
+import pytest
+import grpc
+import sys
+import os
+from concurrent import futures
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import chat_pb2
+import chat_pb2_grpc
+import server_proto
+from sharding import ShardedChatService, ShardDeliveryService, shard_for, mint_id
+
+PUBLIC_ADDRESSES = ["127.0.0.1:50071", "127.0.0.1:50072"]  # Stand-ins for the port shards share, which needs SO_REUSEPORT
+PEER_ADDRESSES = ["127.0.0.1:50061", "127.0.0.1:50062"]
+DELIVERY_ADDRESSES = ["127.0.0.1:50073", "127.0.0.1:50074"]
+
+@pytest.fixture(scope="module")
+def shard_stubs():
+    """
+    Two shards in this process with their public, peer and delivery listeners, one worker thread each, and saves turned off.
+    Yields stubs for the public listeners.
+    """
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(server_proto, "write_users_and_messages", lambda *args: None)
+        servers = []
+        for shard in range(len(PEER_ADDRESSES)):
+            chat_service = ShardedChatService(shard, len(PEER_ADDRESSES), PEER_ADDRESSES, DELIVERY_ADDRESSES, "127.0.0.1", "50060", 1)
+            for servicer, address in ((chat_service, PUBLIC_ADDRESSES[shard]), (chat_service, PEER_ADDRESSES[shard]),
+                                      (ShardDeliveryService(chat_service), DELIVERY_ADDRESSES[shard])):
+                server = grpc.server(futures.ThreadPoolExecutor(max_workers=1))
+                chat_pb2_grpc.add_ChatServiceServicer_to_server(servicer, server)
+                server.add_insecure_port(address)
+                server.start()
+                servers.append(server)
+            chat_service.on_server_start()
+        yield [chat_pb2_grpc.ChatServiceStub(grpc.insecure_channel(address)) for address in PUBLIC_ADDRESSES]
+        for server in servers:
+            server.stop(None)
+
+def username_on_shard(prefix, shard):
+    """Returns a username that the shards assign to the given shard."""
+    return next(f"{prefix}{i}" for i in range(100) if shard_for(f"{prefix}{i}", len(PEER_ADDRESSES)) == shard)
+
+def test_minted_ids_map_to_their_shard():
+    """
+    Test that every minted id hashes back to the shard it was minted for.
+    """
+    for shard in range(4):
+        assert all(shard_for(mint_id(shard, 4), 4) == shard for _ in range(20))
+
+def test_cross_shard_send_and_reads(shard_stubs):
+    """
+    Test that a message between users on different shards can be sent, read, marked and deleted through either shard.
+    """
+    sender_name, receiver_name = username_on_shard("shard_sender", 0), username_on_shard("shard_receiver", 1)
+    sender_uid = shard_stubs[1].LoginPassword(chat_pb2.LoginPasswordRequest(username=sender_name, password="pw")).uid
+    receiver_uid = shard_stubs[0].LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver_name, password="pw")).uid
+    assert shard_for(sender_uid, 2) == 0 and shard_for(receiver_uid, 2) == 1
+
+    response = shard_stubs[1].SendMessage(chat_pb2.SendMessageRequest(sender=sender_uid, receiver_username=receiver_name, text="Hi", timestamp="t"))
+    assert response.success
+
+    received = shard_stubs[0].GetReceivedMessages(chat_pb2.GetMessagesRequest(uid=receiver_uid)).mids
+    sent = shard_stubs[1].GetSentMessages(chat_pb2.GetMessagesRequest(uid=sender_uid)).mids
+    assert list(received) == list(sent) and len(received) == 1
+    messages = shard_stubs[0].GetMessagesByMid(chat_pb2.GetMessagesByMidRequest(mids=received)).messages
+    assert messages[0].text == "Hi" and messages[0].receiver == receiver_uid
+
+    accounts = shard_stubs[0].ListAccounts(chat_pb2.ListAccountsRequest(wildcard="shard_*")).accounts
+    assert set(accounts) == {sender_name, receiver_name}
+    assert shard_stubs[0].MarkMessageRead(chat_pb2.MarkMessageReadRequest(mid=received[0])).success
+    assert shard_stubs[0].DeleteMessages(chat_pb2.DeleteMessagesRequest(uid=sender_uid, mids=sent)).success
+    assert list(shard_stubs[1].GetSentMessages(chat_pb2.GetMessagesRequest(uid=sender_uid)).mids) == []
+
+def test_send_to_unknown_user_fails(shard_stubs):
+    """
+    Test that sending to a username no shard owns fails without touching the sender's mailbox.
+    """
+    sender_name = username_on_shard("shard_lonely", 1)
+    sender_uid = shard_stubs[0].LoginPassword(chat_pb2.LoginPasswordRequest(username=sender_name, password="pw")).uid
+    response = shard_stubs[0].SendMessages(chat_pb2.SendMessagesRequest(sender=sender_uid, receiver_usernames=["shard_nobody"], texts=["Hi"], timestamp="t"))
+    assert not response.success
+    assert list(shard_stubs[0].GetSentMessages(chat_pb2.GetMessagesRequest(uid=sender_uid)).mids) == []
+
+def test_deliver_messages_is_private(shard_stubs):
+    """
+    Test that DeliverMessages, which trusts the sender it is given, is refused on the public and peer listeners.
+    """
+    receiver_name = username_on_shard("shard_forged", 0)
+    shard_stubs[0].LoginPassword(chat_pb2.LoginPasswordRequest(username=receiver_name, password="pw"))
+    forged = chat_pb2.DeliverMessagesRequest(receiver_username=receiver_name, messages=[chat_pb2.MessageData(
+        mid=mint_id(0, 2), sender="someone_else", sender_username="someone_else", receiver_username=receiver_name, text="Forged", timestamp="t")])
+
+    for stub in (shard_stubs[0], chat_pb2_grpc.ChatServiceStub(grpc.insecure_channel(PEER_ADDRESSES[0]))):
+        with pytest.raises(grpc.RpcError) as error:
+            stub.DeliverMessages(forged, timeout=2)
+        assert error.value.code() == grpc.StatusCode.PERMISSION_DENIED
+
+def test_concurrent_cross_shard_sends_do_not_deadlock(shard_stubs):
+    """
+    Test that sends forwarded between shards in both directions at once finish, even with one worker thread per listener.
+    """
+    names = [username_on_shard("shard_busy", shard) for shard in (0, 1)]
+    uids = [shard_stubs[shard].LoginPassword(chat_pb2.LoginPasswordRequest(username=names[shard], password="pw")).uid for shard in (0, 1)]
+
+    def send(i):
+        # Half the sends reach the public listener of a shard that is not the sender's, which forwards them
+        sender = i % 2
+        request = chat_pb2.SendMessageRequest(sender=uids[sender], receiver_username=names[1 - sender], text=f"Busy {i}", timestamp="t")
+        return shard_stubs[(i // 2) % 2].SendMessage(request, timeout=10).success
+
+    with futures.ThreadPoolExecutor(max_workers=8) as threads:
+        assert all(threads.map(send, range(16)))
@@ -0,0 +1,118 @@
+import pytest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from controller.sync import record_mailbox_change, get_mailbox_version, get_mailbox_changes, MAX_MAILBOX_CHANGES
+from controller.messages import send_message, delete_messages, mark_message_read
+from model.user import User
+
+# ---------------- FIXTURES ---------------- #
+
+@pytest.fixture
+def sample_users():
+    """
+    Fixture to provide a sample dictionary of users.
+    """
+    return {
+        "user1": User(username="Alice", password="secure123", uid="user1"),
+        "user2": User(username="Bob", password="pass123", uid="user2"),
+    }
+
+# ---------------- TESTS FOR MAILBOX VERSIONS ---------------- #
+
+def test_mailbox_version_increases(sample_users):
+    """
+    Test that every recorded change bumps the mailbox version.
+    """
+    mailbox_changes = {}
+    assert get_mailbox_version(mailbox_changes, "user2") == 0
+
+    assert record_mailbox_change(mailbox_changes, "user2", "added", "m1") == 1
+    assert record_mailbox_change(mailbox_changes, "user2", "read", "m1") == 2
+    assert get_mailbox_version(mailbox_changes, "user2") == 2
+    assert get_mailbox_version(mailbox_changes, "user1") == 0
+
+def test_controllers_record_changes(sample_users):
+    """
+    Test that send, mark read and delete record changes on the receiver's mailbox.
+    """
+    mailbox_changes = {}
+    messages_dict = {}
+    send_message("user1", "Bob", "Hi", sample_users, messages_dict, timestamp="2025-01-01", mailbox_changes=mailbox_changes)
+    mid = sample_users["user2"].received_messages[0]
+
+    mark_message_read(messages_dict, mid, mailbox_changes=mailbox_changes)
+    mark_message_read(messages_dict, mid, mailbox_changes=mailbox_changes)  # Already read, no new change
+    delete_messages(sample_users, messages_dict, [mid], "user2", mailbox_changes=mailbox_changes)
+
+    assert [change for _, change, _ in mailbox_changes["user2"]["changes"]] == ["added", "read", "removed"]
+    assert "user1" not in mailbox_changes  # Sender's received mailbox is unchanged
+
+# ---------------- TESTS FOR get_mailbox_changes() ---------------- #
+
+def test_get_mailbox_changes_delta(sample_users):
+    """
+    Test that only changes after since_version are returned.
+    """
+    mailbox_changes = {}
+    record_mailbox_change(mailbox_changes, "user2", "added", "m1")
+    record_mailbox_change(mailbox_changes, "user2", "added", "m2")
+    record_mailbox_change(mailbox_changes, "user2", "read", "m1")
+    record_mailbox_change(mailbox_changes, "user2", "removed", "m2")
+    record_mailbox_change(mailbox_changes, "user2", "added", "m3")
+
+    changes = get_mailbox_changes(mailbox_changes, "user2", 2, sample_users)
+
+    assert changes["version"] == 5
+    assert not changes["full_sync"]
+    assert changes["added"] == ["m3"]
+    assert changes["removed"] == ["m2"]
+    assert changes["read"] == ["m1"]
+
+def test_get_mailbox_changes_collapses_added_then_removed(sample_users):
+    """
+    Test that a message added and removed since the client's version is not reported at all.
+    """
+    mailbox_changes = {}
+    record_mailbox_change(mailbox_changes, "user2", "added", "m1")
+    record_mailbox_change(mailbox_changes, "user2", "read", "m1")
+    record_mailbox_change(mailbox_changes, "user2", "removed", "m1")
+
+    changes = get_mailbox_changes(mailbox_changes, "user2", 0, sample_users)
+
+    assert changes["added"] == [] and changes["removed"] == [] and changes["read"] == []
+
+def test_get_mailbox_changes_up_to_date(sample_users):
+    """
+    Test that a client at the current version receives no changes.
+    """
+    mailbox_changes = {}
+    record_mailbox_change(mailbox_changes, "user2", "added", "m1")
+
+    changes = get_mailbox_changes(mailbox_changes, "user2", 1, sample_users)
+
+    assert not changes["full_sync"]
+    assert changes["added"] == []
+
+def test_get_mailbox_changes_full_sync_when_ahead(sample_users):
+    """
+    Test that a version the server never issued falls back to the full mailbox.
+    """
+    sample_users["user2"].received_messages = ["m1", "m2"]
+
+    changes = get_mailbox_changes({}, "user2", 7, sample_users)
+
+    assert changes["full_sync"]
+    assert changes["added"] == ["m1", "m2"]
+
+def test_get_mailbox_changes_full_sync_when_compacted(sample_users):
+    """
+    Test that a version older than the retained changes falls back to the full mailbox.
+    """
+    mailbox_changes = {}
+    for i in range(MAX_MAILBOX_CHANGES + 5):
+        record_mailbox_change(mailbox_changes, "user2", "added", f"m{i}")
+    sample_users["user2"].received_messages = ["m0"]
+
+    assert get_mailbox_changes(mailbox_changes, "user2", 1, sample_users)["full_sync"]
+    assert not get_mailbox_changes(mailbox_changes, "user2", 5, sample_users)["full_sync"]
@@ -4,7 +4,7 @@ import sys
 import uuid
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from utils import (
-    object_to_dict_recursive, dict_to_object_recursive
+    object_to_dict_recursive, dict_to_object_recursive, project_fields
 )
 from model.user import User
 from model.message import Message
@@ -101,3 +101,23 @@ def test_dict_to_object_message():
     assert message.mid == "msg123"
     assert message.timestamp == "2023-01-01T12:00:00"
     assert message.receiver_read is False
+
+# ------------------ FIELD PROJECTION TESTS ------------------ #
+
+def test_project_fields_subset():
+    """
+    Test that only requested fields (and always-kept fields) are returned.
+    """
+    values = {"mid": "m1", "text": "long body", "timestamp": "2025-01-01", "receiver_read": True}
+
+    projected = project_fields(values, ["timestamp", "receiver_read", "unknown"], always=("mid",))
+
+    assert projected == {"mid": "m1", "timestamp": "2025-01-01", "receiver_read": True}
+
+def test_project_fields_empty_means_all():
+    """
+    Test that an empty field list keeps every field.
+    """
+    values = {"mid": "m1", "text": "body"}
+
+    assert project_fields(values, []) == values
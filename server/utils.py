@@ -13,6 +13,28 @@ def dict_to_object_recursive(dct, cls):
         setattr(obj, key, dict_to_object_recursive(value, globals().get(cls.__name__, object)) if isinstance(value, dict) else value)
     return obj
 
+def project_fields(values, fields, always=()):
+    """
+    Keeps only the requested entries of a field dict, so unrequested fields are left unset on the protobuf.
+
+    Parameters:
+    ----------
+    values : dict
+        Field name to value for every field the response can carry.
+    fields : list of str
+        The field names the caller asked for. Empty means every field.
+    always : tuple of str, optional
+        Field names kept regardless of the request (e.g. identifiers).
+
+    Returns:
+    -------
+    dict
+        The subset of values to pass to the protobuf constructor.
+    """
+    if not fields:
+        return values
+    return {name: value for name, value in values.items() if name in fields or name in always}
+
 def protobuf_list_to_object(proto_list, target_class, key_field):
     """
     Converts a list of protobuf objects into a dictionary of custom Python objects.